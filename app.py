@@ -14,6 +14,14 @@ load_dotenv()
 
 from config import Config
 from models import db
+from utils.rerank_queue import rerank_queue
+from utils.view_buffer import view_buffer
+from utils.response_cache import list_cache
+from utils.suggest_index import suggest_index
+from utils.profiler import profiler
+from utils.dashboard import dashboard_snapshot
+from utils.click_pipeline import link_cache, click_queue
+from utils.jobs import job_queue
 from routes import api_bp
 from routes.share import share_bp
 
@@ -24,6 +32,15 @@ def create_app(config_class=Config):
     
     # Initialize extensions
     db.init_app(app)
+    rerank_queue.init_app(app)
+    view_buffer.init_app(app)
+    list_cache.init_app(app)
+    suggest_index.init_app(app)
+    profiler.init_app(app)
+    dashboard_snapshot.init_app(app)
+    link_cache.init_app(app)
+    click_queue.init_app(app)
+    job_queue.init_app(app)
     
     # Enable CORS for frontend with proper configuration
     # IMPORTANT: Cannot use origins='*' with supports_credentials=True (browser security restriction)
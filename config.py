@@ -32,8 +32,91 @@ class Config:
     # Cashback and payout percentages (as float, e.g., 50.0 = 50%)
     CASHBACK_PERCENTAGE = float(os.environ.get('CASHBACK_PERCENTAGE', '50.0'))  # % of commission to user who clicked
     CREATOR_PAYOUT_PERCENTAGE = float(os.environ.get('CREATOR_PAYOUT_PERCENTAGE', '30.0'))  # % of commission to list creator
+    CONVERSION_BATCH_MAX_ROWS = int(os.environ.get('CONVERSION_BATCH_MAX_ROWS', '5000'))  # Rows per POST /conversions/webhook/batch
     # Remaining percentage stays with platform
     
+    # Vote re-ranking
+    # 0 (default) = re-rank inline on every vote. Coalescing is opt-in for long-running
+    # servers only: votes mark their list dirty and a background thread re-ranks each
+    # dirty list once per window. On serverless (Vercel) that thread doesn't run while
+    # an instance is frozen, so re-ranks would be delayed or lost.
+    RERANK_COALESCE_SECONDS = float(os.environ.get('RERANK_COALESCE_SECONDS', '0'))
+    
+    # List view counting
+    # 0 seconds (default) = write every view straight to the database. Buffering is
+    # opt-in for long-running servers only: on serverless (Vercel) buffered views are
+    # lost when an instance is frozen or recycled. When > 0, views are buffered in
+    # memory and written in one batched UPDATE every VIEW_COUNT_FLUSH_SECONDS, or
+    # sooner once VIEW_COUNT_FLUSH_EVENTS views are pending.
+    VIEW_COUNT_FLUSH_SECONDS = float(os.environ.get('VIEW_COUNT_FLUSH_SECONDS', '0'))
+    VIEW_COUNT_FLUSH_EVENTS = int(os.environ.get('VIEW_COUNT_FLUSH_EVENTS', '500'))
+    # A list's views are dropped after this many failed flushes
+    VIEW_COUNT_FLUSH_MAX_RETRIES = int(os.environ.get('VIEW_COUNT_FLUSH_MAX_RETRIES', '3'))
+    
+    # Response cache for GET /lists/<list_id>
+    # 'redis' (shared, needs the redis package), 'memory' (per-process LRU) or 'none'
+    # Defaults to 'redis' when a Redis URL is set, otherwise 'none': a per-process
+    # cache can serve stale lists when several workers or instances are running
+    LIST_CACHE_REDIS_URL = os.environ.get('LIST_CACHE_REDIS_URL') or os.environ.get('REDIS_URL')
+    LIST_CACHE_BACKEND = os.environ.get('LIST_CACHE_BACKEND') or ('redis' if LIST_CACHE_REDIS_URL else 'none')
+    LIST_CACHE_MAX_ENTRIES = int(os.environ.get('LIST_CACHE_MAX_ENTRIES', '1000'))
+    LIST_CACHE_TTL_SECONDS = int(os.environ.get('LIST_CACHE_TTL_SECONDS', '300'))
+    
+    # Trending lists snapshot (rebuilt by `flask refresh-trending`)
+    # Votes lose half their weight every TRENDING_HALF_LIFE_HOURS
+    TRENDING_HALF_LIFE_HOURS = float(os.environ.get('TRENDING_HALF_LIFE_HOURS', '24'))
+    TRENDING_LIST_LIMIT = int(os.environ.get('TRENDING_LIST_LIMIT', '10'))
+    # Rebuild inline if the snapshot is older than this (safety net if the job isn't scheduled)
+    TRENDING_MAX_AGE_SECONDS = int(os.environ.get('TRENDING_MAX_AGE_SECONDS', '900'))
+    
+    # Fuzzy search (GET /search?mode=fuzzy): minimum pg_trgm word similarity, 0-1
+    # Lower = more typo-tolerant but noisier
+    SEARCH_FUZZY_THRESHOLD = float(os.environ.get('SEARCH_FUZZY_THRESHOLD', '0.4'))
+    
+    # Autocomplete (GET /search/suggest) is served from an in-process prefix index;
+    # rebuild it after this many seconds to pick up changes made by other workers (0 = never)
+    SUGGEST_INDEX_MAX_AGE_SECONDS = int(os.environ.get('SUGGEST_INDEX_MAX_AGE_SECONDS', '600'))
+    
+    # Request profiler: SQL count/time, serialization and Python time per request,
+    # reported as Server-Timing headers and at GET /admin/metrics. Off = no overhead.
+    PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', 'false').lower() == 'true'
+    # Also write one JSON log line per request to the votestuff.profiler logger
+    PROFILER_LOG_REQUESTS = os.environ.get('PROFILER_LOG_REQUESTS', 'false').lower() == 'true'
+    
+    # Admin dashboard snapshot: served as is for TTL seconds, then served stale while
+    # one background refresh runs, for up to MAX_STALE more seconds. TTL 0 = no cache.
+    DASHBOARD_CACHE_TTL_SECONDS = int(os.environ.get('DASHBOARD_CACHE_TTL_SECONDS', '60'))
+    DASHBOARD_CACHE_MAX_STALE_SECONDS = int(os.environ.get('DASHBOARD_CACHE_MAX_STALE_SECONDS', '600'))
+    
+    # Affiliate click ingestion
+    # 0 seconds (default) = write every click straight to the database. Buffering is
+    # opt-in for long-running servers only: on serverless (Vercel) queued clicks are
+    # lost when an instance is frozen or recycled. When > 0, clicks are queued in
+    # memory and bulk-inserted (with their counter and rollup updates) every
+    # CLICK_FLUSH_SECONDS, or sooner once CLICK_FLUSH_EVENTS are pending.
+    CLICK_FLUSH_SECONDS = float(os.environ.get('CLICK_FLUSH_SECONDS', '0'))
+    CLICK_FLUSH_EVENTS = int(os.environ.get('CLICK_FLUSH_EVENTS', '500'))
+    # Queued clicks beyond this are written through; a failing flush is retried this many times
+    CLICK_QUEUE_MAX_EVENTS = int(os.environ.get('CLICK_QUEUE_MAX_EVENTS', '10000'))
+    CLICK_FLUSH_MAX_RETRIES = int(os.environ.get('CLICK_FLUSH_MAX_RETRIES', '3'))
+    # How long a product's redirect URLs are cached for click tracking (0 = no cache,
+    # the default). The cache is per process and edits only clear it in the process
+    # that made them, so only enable it on a single long-running instance.
+    CLICK_LINK_CACHE_TTL_SECONDS = int(os.environ.get('CLICK_LINK_CACHE_TTL_SECONDS', '0'))
+    
+    # Background jobs (jobs table, run by `python manage.py run_jobs`)
+    # Worker threads per run_jobs process, and how often an idle worker polls for due jobs
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+    JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', '1'))
+    # Failed jobs are retried up to JOB_MAX_ATTEMPTS times in total, waiting
+    # JOB_BACKOFF_SECONDS, doubled per attempt, capped at JOB_BACKOFF_MAX_SECONDS
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '5'))
+    JOB_BACKOFF_SECONDS = float(os.environ.get('JOB_BACKOFF_SECONDS', '10'))
+    JOB_BACKOFF_MAX_SECONDS = float(os.environ.get('JOB_BACKOFF_MAX_SECONDS', '3600'))
+    # A running job's worker refreshes its lock every third of this timeout; a job
+    # whose lock hasn't been refreshed for this long is assumed lost and requeued
+    JOB_LOCK_TIMEOUT_SECONDS = float(os.environ.get('JOB_LOCK_TIMEOUT_SECONDS', '600'))
+    
     # CORS settings
     # In development, allow common localhost ports; in production, use env var
     # This will be loaded by app.py and used for CORS configuration
@@ -300,6 +300,424 @@ def seed_test_data():
         click.echo(f'\n✗ Error seeding test data: {str(e)}')
         raise
 
+@app.cli.command()
+@click.option('--half-life', default=None, type=float, help='Decay half-life in hours (default: TRENDING_HALF_LIFE_HOURS)')
+def refresh_trending(half_life):
+    """Rebuild the trending lists snapshot (schedule this periodically)"""
+    from utils.trending import refresh_trending as rebuild_snapshot
+    
+    count = rebuild_snapshot(half_life_hours=half_life)
+    click.echo(f'Trending snapshot refreshed with {count} lists')
+
+@app.cli.command()
+@click.option('--limit', default=20, help='Number of lists to benchmark')
+def bench_ranking(limit):
+    """Benchmark list re-ranking: SQL statements and time per list size"""
+    from models.list import List
+    from models.product import Product
+    from sqlalchemy import func
+    from utils.ranking import rank_list
+    from utils.query_counter import count_queries
+    import time
+    
+    # Pick lists with the widest spread of product counts
+    lists = db.session.query(
+        List.id,
+        func.count(Product.id).label('product_count')
+    ).outerjoin(
+        Product, Product.list_id == List.id
+    ).group_by(List.id).order_by(
+        func.count(Product.id).desc()
+    ).limit(limit).all()
+    
+    if not lists:
+        click.echo('No lists found - run seed_test_data first')
+        return
+    
+    click.echo(f'{"products":>10} {"statements":>12} {"ms":>10}')
+    for list_id, product_count in lists:
+        with count_queries() as counter:
+            started = time.perf_counter()
+            rank_list(list_id)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        # Ranking is idempotent, but leave the data exactly as we found it
+        db.session.rollback()
+        click.echo(f'{product_count:>10} {counter.count:>12} {elapsed_ms:>10.2f}')
+
+@app.cli.command()
+@click.option('--threads', default=8, help='Concurrent writers')
+@click.option('--increments', default=100, help='Increments per writer')
+def stress_counters(threads, increments):
+    """Hammer one product's click_count from many threads and check no increment is lost"""
+    from models.product import Product
+    from utils.counters import increment_counters
+    import threading
+    
+    product = Product.query.first()
+    if not product:
+        click.echo('No products found - run seed_test_data first')
+        return
+    product_id = product.id
+    start_count = product.click_count or 0
+    db.session.rollback()
+    
+    errors = []
+    
+    def writer():
+        with app.app_context():
+            try:
+                for _ in range(increments):
+                    increment_counters(Product, product_id, click_count=1)
+                    db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                errors.append(e)
+    
+    workers = [threading.Thread(target=writer) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    
+    expected = threads * increments
+    end_count = db.session.get(Product, product_id).click_count
+    actual = end_count - start_count
+    
+    # Put the counter back where we found it
+    increment_counters(Product, product_id, click_count=-actual)
+    db.session.commit()
+    
+    click.echo(f'Expected +{expected}, got +{actual} ({len(errors)} writer errors)')
+    if errors:
+        click.echo(f'First error: {errors[0]}')
+    if actual != expected or errors:
+        click.echo('✗ Lost increments detected')
+        raise SystemExit(1)
+    click.echo('✓ No increments lost')
+
+@app.cli.command()
+@click.option('--query', '-q', 'queries', multiple=True, help='Query to benchmark (repeatable)')
+@click.option('--runs', default=5, help='Runs per query and mode')
+def bench_search(queries, runs):
+    """Compare search lookups: legacy ilike filter explosion vs full-text vs fuzzy"""
+    from models.list import List
+    from models.product import Product
+    from models.category import Category
+    from models.retailer import Retailer
+    from sqlalchemy import or_, and_
+    from utils import search_engine
+    from utils.query_counter import count_queries
+    import re
+    import time
+    
+    queries = queries or ("mens coat", "men's winter coats", "wireless headphones", "best runing shoes")
+    
+    def legacy_filters(columns, query, variants):
+        # Reconstruction of the pre-full-text /search matching: one ilike per
+        # column for the phrase, plus one per word (and word variant) per column
+        words = [w.strip() for w in re.split(r'[\s\-]+', query.lower()) if w.strip()]
+        filters = []
+        for col in columns:
+            filters.append(col.ilike(f'%{query.lower()}%'))
+            per_word = []
+            for word in words:
+                norm = word.replace("'s", "s").replace("'", "")
+                forms = {norm, word}
+                if variants and norm.endswith('s') and len(norm) > 1:
+                    forms |= {norm[:-1], f"{norm[:-1]}'s"}
+                per_word.append(or_(*[col.ilike(f'%{form}%') for form in sorted(forms)]))
+            filters.append(and_(*per_word))
+        return or_(*filters)
+    
+    def legacy(query):
+        lists = List.query.filter(
+            legacy_filters([List.title, List.description], query, variants=True)
+        ).filter_by(status='approved').all()
+        products = Product.query.join(List, Product.list_id == List.id).filter(
+            legacy_filters([Product.name, Product.description], query, variants=False),
+            List.status == 'approved'
+        ).limit(20).all()
+        categories = Category.query.filter(
+            legacy_filters([Category.name, Category.description], query, variants=False)
+        ).limit(10).all()
+        lists += List.query.filter(
+            List.id.in_([p.list_id for p in products]) | List.category_id.in_([c.id for c in categories])
+        ).filter_by(status='approved').all()
+        retailers = Retailer.query.filter(
+            legacy_filters([Retailer.name, Retailer.description], query, variants=False)
+        ).filter_by(is_active=True).limit(10).all()
+        return len({lst.id for lst in lists}), len(products), len(retailers)
+    
+    def fulltext(query):
+        tsquery = search_engine.parse_query(query)
+        return (
+            len(search_engine.search_lists(tsquery)),
+            len(search_engine.search_products(tsquery)),
+            len(search_engine.search_retailers(tsquery))
+        )
+    
+    def fuzzy(query):
+        search_engine.use_fuzzy_threshold(app.config.get('SEARCH_FUZZY_THRESHOLD', 0.4))
+        return (
+            len(search_engine.fuzzy_search_lists(query)),
+            len(search_engine.fuzzy_search_products(query)),
+            len(search_engine.fuzzy_search_retailers(query))
+        )
+    
+    click.echo(f'{"query":<24} {"mode":<9} {"statements":>10} {"avg ms":>9}  lists/products/retailers')
+    for query in queries:
+        for mode, run in (('legacy', legacy), ('fulltext', fulltext), ('fuzzy', fuzzy)):
+            timings = []
+            for _ in range(runs):
+                with count_queries() as counter:
+                    started = time.perf_counter()
+                    found = run(query)
+                    timings.append((time.perf_counter() - started) * 1000)
+                db.session.rollback()
+            avg_ms = sum(timings) / len(timings)
+            click.echo(f'{query:<24} {mode:<9} {counter.count:>10} {avg_ms:>9.2f}  {"/".join(map(str, found))}')
+
+@app.cli.command()
+@click.option('--query', '-q', 'queries', multiple=True, help='Query to check (repeatable)')
+@click.option('--max-statements', default=12, help='Statement budget per /search request')
+def check_search_queries(queries, max_statements):
+    """Fail if GET /search issues more SQL statements than the budget (N+1 regression check)"""
+    from models.retailer import Retailer
+    from utils.query_counter import count_queries
+    
+    # Default to retailer names so the retailer-products expansion is exercised
+    queries = queries or tuple(
+        name for (name,) in db.session.query(Retailer.name).filter(Retailer.is_active == True).limit(3)
+    ) or ('coat',)
+    db.session.rollback()
+    
+    client = app.test_client()
+    failed = False
+    for query in queries:
+        for mode in ('fulltext', 'fuzzy'):
+            with count_queries() as counter:
+                response = client.get('/api/search', query_string={'q': query, 'mode': mode})
+            data = response.get_json() or {}
+            linked = sum(len(r.get('products', [])) for r in data.get('retailers', []))
+            ok = response.status_code == 200 and counter.count <= max_statements
+            failed = failed or not ok
+            click.echo(
+                f'{"✓" if ok else "✗"} {query!r} ({mode}): {counter.count} statements, '
+                f'{len(data.get("retailers", []))} retailers / {linked} linked products'
+            )
+    
+    if failed:
+        click.echo(f'✗ /search exceeded {max_statements} statements (or failed)')
+        raise SystemExit(1)
+    click.echo(f'✓ /search stays within {max_statements} statements')
+
+@app.cli.command()
+@click.option('--start', default=None, help='First day to rebuild (YYYY-MM-DD, default: beginning of time)')
+@click.option('--end', default=None, help='Last day to rebuild (YYYY-MM-DD, default: today)')
+def backfill_rollups(start, end):
+    """Rebuild the daily analytics rollups from clicks, conversions and votes"""
+    from utils.rollups import backfill_rollups as rebuild_rollups
+    from datetime import date
+    
+    try:
+        start_day = date.fromisoformat(start) if start else None
+        end_day = date.fromisoformat(end) if end else None
+    except ValueError:
+        click.echo('✗ --start/--end must be YYYY-MM-DD')
+        raise SystemExit(1)
+    
+    rows = rebuild_rollups(start_day, end_day)
+    click.echo(f'✓ Rebuilt {rows} rollup rows ({start or "beginning"} to {end or "today"})')
+
+@app.cli.command()
+@click.option('--requests', 'total', default=2000, help='Clicks to send per mode')
+@click.option('--threads', default=8, help='Concurrent clients')
+def bench_clicks(total, threads):
+    """Load-test POST /products/<id>/click: write-through vs queued bulk writer"""
+    from models.product import Product
+    from models.product_link import ProductLink
+    from models.affiliate_click import AffiliateClick
+    from collections import Counter
+    from utils.click_pipeline import link_cache, click_queue, _apply_click_deltas
+    from utils.rollups import record_rollup_batch
+    import threading
+    import time
+    import uuid
+    
+    targets = db.session.query(Product.id, ProductLink.id).outerjoin(
+        ProductLink, ProductLink.product_id == Product.id
+    ).limit(50).all()
+    if not targets:
+        click.echo('No products found - run seed_test_data first')
+        return
+    db.session.rollback()
+    
+    # Tag every benchmark click so it can be removed afterwards
+    session_id = f'bench-clicks-{uuid.uuid4()}'
+    client = app.test_client()
+    saved = (click_queue.interval, link_cache.ttl)
+    
+    def run(interval, ttl):
+        click_queue.interval, link_cache.ttl = interval, ttl
+        errors = []
+        
+        def sender(worker):
+            for i in range(worker, total, threads):
+                product_id, link_id = targets[i % len(targets)]
+                response = client.post(f'/api/products/{product_id}/click', json={
+                    'product_link_id': str(link_id) if link_id else None,
+                    'session_id': session_id
+                })
+                if response.status_code != 200:
+                    errors.append(response.get_json())
+        
+        workers = [threading.Thread(target=sender, args=(n,)) for n in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        # Include the time to drain the queue, so both modes have written everything
+        click_queue.flush()
+        drained = time.perf_counter() - started
+        return elapsed, drained, errors
+    
+    try:
+        click.echo(f'{"mode":<14} {"clicks":>7} {"errors":>7} {"clicks/sec":>11} {"incl. drain":>12}')
+        for mode, interval, ttl in (('write-through', 0, 0), ('queued', saved[0] or 1.0, saved[1] or 300)):
+            elapsed, drained, errors = run(interval, ttl)
+            click.echo(
+                f'{mode:<14} {total:>7} {len(errors):>7} {total / elapsed:>11.0f} {total / drained:>12.0f}'
+            )
+            if errors:
+                click.echo(f'  First error: {errors[0]}')
+    finally:
+        click_queue.interval, link_cache.ttl = saved
+        click_queue.flush()
+        
+        # Remove the benchmark clicks and take them back out of the counters and rollups
+        clicks = db.session.query(
+            AffiliateClick.created_at, AffiliateClick.list_id,
+            AffiliateClick.product_id, AffiliateClick.product_link_id
+        ).filter(AffiliateClick.session_id == session_id).all()
+        _apply_click_deltas(Product, {k: -v for k, v in Counter(c.product_id for c in clicks).items()})
+        _apply_click_deltas(ProductLink, {
+            k: -v for k, v in Counter(c.product_link_id for c in clicks if c.product_link_id).items()
+        })
+        record_rollup_batch(((c.created_at, c.list_id, c.product_id) for c in clicks), clicks=-1)
+        AffiliateClick.query.filter(AffiliateClick.session_id == session_id).delete(synchronize_session=False)
+        db.session.commit()
+        click.echo(f'Removed {len(clicks)} benchmark clicks')
+
+@app.cli.command()
+@click.option('--clicks', 'total', default=10_000_000, help='Synthetic clicks to generate')
+@click.option('--lookups', default=200, help='Conversions to attribute per run')
+def bench_attribution(total, lookups):
+    """Benchmark conversion click attribution with and without the partial attribution index"""
+    from models.product import Product
+    from models.user import User
+    from sqlalchemy import text
+    from sqlalchemy.dialects import postgresql
+    from utils.attribution import match_clicks, latest_click_query
+    import random
+    import time
+    import uuid
+    
+    # Everything below runs in one transaction that is rolled back at the end
+    # (PostgreSQL DDL is transactional), so the synthetic clicks and the
+    # dropped index never persist. The table is locked while it runs.
+    if db.engine.dialect.name != 'postgresql':
+        click.echo('bench_attribution needs PostgreSQL')
+        return
+    products = db.session.query(Product.id, Product.list_id).all()
+    if not products:
+        click.echo('No products found - run seed_test_data first')
+        return
+    users = [user_id for (user_id,) in db.session.query(User.id).limit(1000)]
+    
+    click.echo(f'Generating {total:,} synthetic clicks over 90 days...')
+    started = time.perf_counter()
+    db.session.execute(text("""
+        INSERT INTO affiliate_clicks (id, list_id, product_id, user_id, url, session_id, has_converted, created_at)
+        SELECT gen_random_uuid(), p.list_id, p.id,
+               CASE WHEN g % 3 = 0 THEN u.id END,
+               'https://example.com/bench', 'bench-attribution',
+               g % 10 = 0,
+               (now() AT TIME ZONE 'utc') - random() * interval '90 days'
+        FROM generate_series(1, :total) AS g
+        JOIN (SELECT id, list_id, row_number() OVER (ORDER BY id) - 1 AS k FROM products) AS p
+          ON p.k = g % :products
+        LEFT JOIN (SELECT id, row_number() OVER (ORDER BY id) - 1 AS k FROM users) AS u
+          ON u.k = g % :users
+    """), {'total': total, 'products': len(products), 'users': max(len(users), 1)})
+    db.session.execute(text('ANALYZE affiliate_clicks'))
+    click.echo(f'  done in {time.perf_counter() - started:.1f}s')
+    
+    random.seed(42)
+    keys = [
+        (product.id, product.list_id, random.choice(users) if users and i % 2 else None)
+        for i, product in enumerate(random.choices(products, k=lookups))
+    ]
+    
+    def explain(key):
+        compiled = latest_click_query(*key).statement.compile(dialect=postgresql.dialect())
+        params = {name: str(value) if isinstance(value, uuid.UUID) else value
+                  for name, value in compiled.params.items()}
+        plan = db.session.connection().exec_driver_sql(f'EXPLAIN {compiled}', params).scalars().all()
+        return plan[0] if 'Limit' not in plan[0] else plan[1].strip(' ->')
+    
+    def run(label):
+        started = time.perf_counter()
+        for key in keys:
+            match_clicks([key])
+        single_ms = (time.perf_counter() - started) * 1000 / len(keys)
+        started = time.perf_counter()
+        matched = sum(1 for match in match_clicks(keys) if match)
+        batch_ms = (time.perf_counter() - started) * 1000
+        click.echo(f'{label:<14} {single_ms:>12.2f} {batch_ms:>12.1f} {matched:>8}  {explain(keys[0])}')
+    
+    try:
+        click.echo(f'{"index":<14} {"ms/lookup":>12} {"batch ms":>12} {"matched":>8}  plan')
+        run('partial index')
+        db.session.execute(text('DROP INDEX ix_affiliate_clicks_attribution'))
+        db.session.execute(text('ANALYZE affiliate_clicks'))
+        run('none')
+    finally:
+        db.session.rollback()
+
+@app.cli.command()
+@click.option('--fix', is_flag=True, help='Rebuild user_balances from the ledger when they disagree')
+def reconcile_balances(fix):
+    """Verify user balance summaries against the balance ledger, and the ledger against payouts"""
+    from utils.ledger import reconcile_balances as check_balances
+    
+    balance_mismatches, payout_mismatches = check_balances(fix=fix)
+    
+    for user_id, column, summary, ledger in balance_mismatches[:20]:
+        click.echo(f'✗ user {user_id}: {column} is {summary}, ledger says {ledger}')
+    for payout_id, status, ledger_status in payout_mismatches[:20]:
+        click.echo(f'✗ payout {payout_id}: status {status}, last ledger entry {ledger_status or "missing"}')
+    
+    if balance_mismatches and fix:
+        click.echo(f'Rebuilt user_balances from the ledger ({len(balance_mismatches)} mismatches)')
+    if payout_mismatches or (balance_mismatches and not fix):
+        click.echo(f'✗ {len(balance_mismatches)} balance and {len(payout_mismatches)} payout mismatches')
+        raise SystemExit(1)
+    click.echo('✓ Balances match the ledger')
+
+@app.cli.command()
+@click.option('--workers', default=None, type=int, help='Concurrent worker threads (default: JOB_WORKERS)')
+@click.option('--once', is_flag=True, help='Exit once no job is due instead of polling forever')
+def run_jobs(workers, once):
+    """Run background jobs from the jobs table (run several processes to scale out)"""
+    from utils.jobs import job_queue
+    
+    workers = workers or job_queue.workers
+    click.echo(f'Running jobs with {workers} workers' + (' until the queue is empty' if once else ' (Ctrl+C to stop)'))
+    counts = job_queue.run_workers(concurrency=workers, once=once)
+    click.echo(f"✓ {counts['done']} done, {counts['retried']} retried, {counts['failed']} failed")
+
 if __name__ == '__main__':
     import sys
     if len(sys.argv) > 1:
@@ -314,10 +732,30 @@ if __name__ == '__main__':
                 seed_test_data()
             elif command == 'init_db':
                 init_db()
+            elif command == 'refresh_trending':
+                refresh_trending.main(sys.argv[2:], standalone_mode=False)
+            elif command == 'bench_ranking':
+                bench_ranking.main(sys.argv[2:], standalone_mode=False)
+            elif command == 'stress_counters':
+                stress_counters.main(sys.argv[2:], standalone_mode=False)
+            elif command == 'bench_search':
+                bench_search.main(sys.argv[2:], standalone_mode=False)
+            elif command == 'check_search_queries':
+                check_search_queries.main(sys.argv[2:], standalone_mode=False)
+            elif command == 'backfill_rollups':
+                backfill_rollups.main(sys.argv[2:], standalone_mode=False)
+            elif command == 'bench_clicks':
+                bench_clicks.main(sys.argv[2:], standalone_mode=False)
+            elif command == 'bench_attribution':
+                bench_attribution.main(sys.argv[2:], standalone_mode=False)
+            elif command == 'reconcile_balances':
+                reconcile_balances.main(sys.argv[2:], standalone_mode=False)
+            elif command == 'run_jobs':
+                run_jobs.main(sys.argv[2:], standalone_mode=False)
             else:
                 print(f"Unknown command: {command}")
-                print("Available commands: seed_categories, seed_admin, seed_test_data, init_db")
+                print("Available commands: seed_categories, seed_admin, seed_test_data, init_db, refresh_trending, bench_ranking, stress_counters, bench_search, check_search_queries, backfill_rollups, bench_clicks, bench_attribution, reconcile_balances, run_jobs")
     else:
         print("Usage: python manage.py <command>")
-        print("Available commands: seed_categories, seed_admin, seed_test_data, init_db")
+        print("Available commands: seed_categories, seed_admin, seed_test_data, init_db, refresh_trending, bench_ranking, stress_counters, bench_search, check_search_queries, backfill_rollups, bench_clicks, bench_attribution, reconcile_balances, run_jobs")
 
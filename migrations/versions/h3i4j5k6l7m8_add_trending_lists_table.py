@@ -0,0 +1,37 @@
+"""Add trending_lists snapshot table
+
+Revision ID: h3i4j5k6l7m8
+Revises: 460ec7ecb821
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'h3i4j5k6l7m8'
+down_revision = '460ec7ecb821'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('trending_lists',
+    sa.Column('list_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('refreshed_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['list_id'], ['lists.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('list_id')
+    )
+    with op.batch_alter_table('trending_lists', schema=None) as batch_op:
+        batch_op.create_index('ix_trending_lists_position', ['position'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('trending_lists', schema=None) as batch_op:
+        batch_op.drop_index('ix_trending_lists_position')
+    
+    op.drop_table('trending_lists')
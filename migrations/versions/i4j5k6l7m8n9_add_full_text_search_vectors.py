@@ -0,0 +1,58 @@
+"""Add full-text search vectors with GIN indexes
+
+Adds a generated tsvector column to lists, products, categories and retailers.
+Postgres keeps the column current on every INSERT/UPDATE, so no triggers or
+application hooks are needed. Requires PostgreSQL 12+.
+
+Revision ID: i4j5k6l7m8n9
+Revises: h3i4j5k6l7m8
+Create Date: 2026-10-16 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'i4j5k6l7m8n9'
+down_revision = 'h3i4j5k6l7m8'
+branch_labels = None
+depends_on = None
+
+# table -> column holding the primary text (weight A); description is weight B
+SEARCHABLE_TABLES = {
+    'lists': 'title',
+    'products': 'name',
+    'categories': 'name',
+    'retailers': 'name',
+}
+
+
+def search_vector_expression(primary_column):
+    return (
+        f"setweight(to_tsvector('english', coalesce({primary_column}, '')), 'A') || "
+        f"setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+    )
+
+
+def upgrade():
+    for table, primary_column in SEARCHABLE_TABLES.items():
+        # Adding a STORED generated column computes it for all existing rows
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column(
+                'search_vector',
+                postgresql.TSVECTOR(),
+                sa.Computed(search_vector_expression(primary_column), persisted=True),
+                nullable=True
+            ))
+        op.create_index(
+            f'ix_{table}_search_vector', table, ['search_vector'],
+            unique=False, postgresql_using='gin'
+        )
+
+
+def downgrade():
+    for table in SEARCHABLE_TABLES:
+        op.drop_index(f'ix_{table}_search_vector', table_name=table)
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('search_vector')
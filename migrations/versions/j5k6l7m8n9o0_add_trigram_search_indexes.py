@@ -0,0 +1,43 @@
+"""Add pg_trgm trigram indexes for fuzzy search
+
+Enables the pg_trgm extension and adds GIN trigram indexes on list titles,
+product names and retailer names, so fuzzy (typo-tolerant) search is a
+single indexed lookup per table.
+
+Revision ID: j5k6l7m8n9o0
+Revises: i4j5k6l7m8n9
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'j5k6l7m8n9o0'
+down_revision = 'i4j5k6l7m8n9'
+branch_labels = None
+depends_on = None
+
+# table -> column to index
+TRIGRAM_COLUMNS = {
+    'lists': 'title',
+    'products': 'name',
+    'retailers': 'name',
+}
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table, column in TRIGRAM_COLUMNS.items():
+        op.create_index(
+            f'ix_{table}_{column}_trgm', table, [column],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_ops={column: 'gin_trgm_ops'}
+        )
+
+
+def downgrade():
+    for table, column in TRIGRAM_COLUMNS.items():
+        op.drop_index(f'ix_{table}_{column}_trgm', table_name=table)
+    # The extension is left installed; other objects may depend on it
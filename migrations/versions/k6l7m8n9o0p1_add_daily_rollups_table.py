@@ -0,0 +1,78 @@
+"""Add daily_rollups table and backfill it from the raw event tables
+
+Revision ID: k6l7m8n9o0p1
+Revises: j5k6l7m8n9o0
+Create Date: 2026-10-16 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'k6l7m8n9o0p1'
+down_revision = 'j5k6l7m8n9o0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_rollups',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('list_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('product_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('clicks', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('conversions', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('revenue', sa.Numeric(precision=12, scale=2), nullable=False, server_default='0'),
+    sa.Column('commission', sa.Numeric(precision=12, scale=2), nullable=False, server_default='0'),
+    sa.Column('upvotes', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('downvotes', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['list_id'], ['lists.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('day', 'list_id', 'product_id')
+    )
+    with op.batch_alter_table('daily_rollups', schema=None) as batch_op:
+        batch_op.create_index('ix_daily_rollups_day', ['day'], unique=False)
+        batch_op.create_index('ix_daily_rollups_list_id_day', ['list_id', 'day'], unique=False)
+
+    # Backfill everything recorded so far (same as `python manage.py backfill_rollups`)
+    op.execute("""
+        INSERT INTO daily_rollups (day, list_id, product_id, clicks, updated_at)
+        SELECT created_at::date, list_id, product_id, count(*), now()
+        FROM affiliate_clicks
+        WHERE created_at IS NOT NULL
+        GROUP BY 1, 2, 3
+    """)
+    op.execute("""
+        INSERT INTO daily_rollups (day, list_id, product_id, conversions, revenue, commission, updated_at)
+        SELECT converted_at::date, list_id, product_id, count(*),
+               coalesce(sum(revenue), 0), coalesce(sum(commission), 0), now()
+        FROM conversions
+        WHERE converted_at IS NOT NULL
+        GROUP BY 1, 2, 3
+        ON CONFLICT (day, list_id, product_id) DO UPDATE SET
+            conversions = daily_rollups.conversions + excluded.conversions,
+            revenue = daily_rollups.revenue + excluded.revenue,
+            commission = daily_rollups.commission + excluded.commission
+    """)
+    op.execute("""
+        INSERT INTO daily_rollups (day, list_id, product_id, upvotes, downvotes, updated_at)
+        SELECT created_at::date, list_id, product_id,
+               count(*) FILTER (WHERE vote_type = 'up'),
+               count(*) FILTER (WHERE vote_type = 'down'), now()
+        FROM votes
+        WHERE created_at IS NOT NULL
+        GROUP BY 1, 2, 3
+        ON CONFLICT (day, list_id, product_id) DO UPDATE SET
+            upvotes = daily_rollups.upvotes + excluded.upvotes,
+            downvotes = daily_rollups.downvotes + excluded.downvotes
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('daily_rollups', schema=None) as batch_op:
+        batch_op.drop_index('ix_daily_rollups_list_id_day')
+        batch_op.drop_index('ix_daily_rollups_day')
+    
+    op.drop_table('daily_rollups')
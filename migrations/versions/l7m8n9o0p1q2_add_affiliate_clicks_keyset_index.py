@@ -0,0 +1,25 @@
+"""Add (created_at, id) index on affiliate_clicks for keyset pagination
+
+Revision ID: l7m8n9o0p1q2
+Revises: k6l7m8n9o0p1
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'l7m8n9o0p1q2'
+down_revision = 'k6l7m8n9o0p1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('affiliate_clicks', schema=None) as batch_op:
+        batch_op.create_index('ix_affiliate_clicks_created_at_id', ['created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('affiliate_clicks', schema=None) as batch_op:
+        batch_op.drop_index('ix_affiliate_clicks_created_at_id')
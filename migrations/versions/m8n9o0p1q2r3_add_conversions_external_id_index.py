@@ -0,0 +1,25 @@
+"""Add (network, external_id) index on conversions for webhook de-duplication
+
+Revision ID: m8n9o0p1q2r3
+Revises: l7m8n9o0p1q2
+Create Date: 2026-10-16 15:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'm8n9o0p1q2r3'
+down_revision = 'l7m8n9o0p1q2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('conversions', schema=None) as batch_op:
+        batch_op.create_index('ix_conversions_network_external_id', ['network', 'external_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('conversions', schema=None) as batch_op:
+        batch_op.drop_index('ix_conversions_network_external_id')
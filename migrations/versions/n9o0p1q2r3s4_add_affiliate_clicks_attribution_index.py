@@ -0,0 +1,31 @@
+"""Add partial (product_id, list_id, created_at) index on unconverted affiliate_clicks
+
+Revision ID: n9o0p1q2r3s4
+Revises: m8n9o0p1q2r3
+Create Date: 2026-10-16 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'n9o0p1q2r3s4'
+down_revision = 'm8n9o0p1q2r3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('affiliate_clicks', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_affiliate_clicks_attribution',
+            ['product_id', 'list_id', 'created_at'],
+            unique=False,
+            postgresql_where=sa.text('has_converted = false')
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('affiliate_clicks', schema=None) as batch_op:
+        batch_op.drop_index('ix_affiliate_clicks_attribution')
@@ -0,0 +1,79 @@
+"""Add balance_ledger and user_balances tables and backfill them from payouts
+
+Revision ID: o0p1q2r3s4t5
+Revises: n9o0p1q2r3s4
+Create Date: 2026-10-16 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'o0p1q2r3s4t5'
+down_revision = 'n9o0p1q2r3s4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('balance_ledger',
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('payout_id', postgresql.UUID(as_uuid=True), nullable=True),
+    sa.Column('payout_type', sa.String(length=20), nullable=False),
+    sa.Column('amount', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('from_status', sa.String(length=20), nullable=True),
+    sa.Column('to_status', sa.String(length=20), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['payout_id'], ['payouts.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('balance_ledger', schema=None) as batch_op:
+        batch_op.create_index('ix_balance_ledger_user_id_created_at', ['user_id', 'created_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_balance_ledger_payout_id'), ['payout_id'], unique=False)
+
+    op.create_table('user_balances',
+    sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('cashback_pending', sa.Numeric(precision=12, scale=2), nullable=False, server_default='0'),
+    sa.Column('cashback_earned', sa.Numeric(precision=12, scale=2), nullable=False, server_default='0'),
+    sa.Column('creator_pending', sa.Numeric(precision=12, scale=2), nullable=False, server_default='0'),
+    sa.Column('creator_paid', sa.Numeric(precision=12, scale=2), nullable=False, server_default='0'),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+    # The history before the ledger is unknown: open one entry per existing
+    # payout straight into its current status. gen_random_uuid() is built in
+    # from PostgreSQL 13; on 12 it comes from pgcrypto
+    op.execute('CREATE EXTENSION IF NOT EXISTS pgcrypto')
+    op.execute("""
+        INSERT INTO balance_ledger (id, user_id, payout_id, payout_type, amount, from_status, to_status, created_at)
+        SELECT gen_random_uuid(), user_id, id, payout_type, amount, NULL, status, coalesce(created_at, now())
+        FROM payouts
+        WHERE status IS NOT NULL
+    """)
+    op.execute("""
+        INSERT INTO user_balances (user_id, cashback_pending, cashback_earned, creator_pending, creator_paid, updated_at)
+        SELECT user_id,
+               coalesce(sum(amount) FILTER (WHERE payout_type = 'cashback' AND status IN ('pending', 'processing')), 0),
+               coalesce(sum(amount) FILTER (WHERE payout_type = 'cashback' AND status = 'paid'), 0),
+               coalesce(sum(amount) FILTER (WHERE payout_type = 'creator' AND status IN ('pending', 'processing')), 0),
+               coalesce(sum(amount) FILTER (WHERE payout_type = 'creator' AND status = 'paid'), 0),
+               now()
+        FROM payouts
+        GROUP BY user_id
+    """)
+
+
+def downgrade():
+    # The extension is left installed; other objects may depend on it
+    op.drop_table('user_balances')
+
+    with op.batch_alter_table('balance_ledger', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_balance_ledger_payout_id'))
+        batch_op.drop_index('ix_balance_ledger_user_id_created_at')
+
+    op.drop_table('balance_ledger')
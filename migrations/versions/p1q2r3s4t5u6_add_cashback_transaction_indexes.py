@@ -0,0 +1,35 @@
+"""Add indexes for the cashback transactions listing
+
+Revision ID: p1q2r3s4t5u6
+Revises: o0p1q2r3s4t5
+Create Date: 2026-10-16 19:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'p1q2r3s4t5u6'
+down_revision = 'o0p1q2r3s4t5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('payouts', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_payouts_conversion_id_user_id', ['conversion_id', 'user_id', 'payout_type'], unique=False
+        )
+
+    with op.batch_alter_table('conversions', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_conversions_purchaser_id_created_at', ['purchaser_id', 'created_at'], unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('conversions', schema=None) as batch_op:
+        batch_op.drop_index('ix_conversions_purchaser_id_created_at')
+
+    with op.batch_alter_table('payouts', schema=None) as batch_op:
+        batch_op.drop_index('ix_payouts_conversion_id_user_id')
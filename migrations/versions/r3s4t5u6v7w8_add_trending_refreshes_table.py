@@ -0,0 +1,35 @@
+"""Add trending_refreshes table recording the last trending snapshot rebuild
+
+Revision ID: r3s4t5u6v7w8
+Revises: q2r3s4t5u6v7
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'r3s4t5u6v7w8'
+down_revision = 'q2r3s4t5u6v7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('trending_refreshes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+    sa.Column('list_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("""
+        INSERT INTO trending_refreshes (id, refreshed_at, list_count)
+        SELECT 1, max(refreshed_at), count(*)
+        FROM trending_lists
+        HAVING max(refreshed_at) IS NOT NULL
+    """)
+
+
+def downgrade():
+    op.drop_table('trending_refreshes')
@@ -0,0 +1,42 @@
+"""Make (network, external_id) unique on conversions
+
+Revision ID: s4t5u6v7w8x9
+Revises: r3s4t5u6v7w8
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 's4t5u6v7w8x9'
+down_revision = 'r3s4t5u6v7w8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Duplicates stored before the index existed keep their rows and payouts;
+    # all but the oldest get a distinguishable external_id so the index can
+    # be built
+    op.execute("""
+        UPDATE conversions
+        SET external_id = left(conversions.external_id, 200) || ':dup:' || conversions.id::text
+        FROM (
+            SELECT id, row_number() OVER (
+                PARTITION BY network, external_id ORDER BY created_at, id
+            ) AS position
+            FROM conversions
+            WHERE external_id IS NOT NULL
+        ) AS ranked
+        WHERE ranked.id = conversions.id AND ranked.position > 1
+    """)
+    with op.batch_alter_table('conversions', schema=None) as batch_op:
+        batch_op.drop_index('ix_conversions_network_external_id')
+        batch_op.create_index('ix_conversions_network_external_id', ['network', 'external_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('conversions', schema=None) as batch_op:
+        batch_op.drop_index('ix_conversions_network_external_id')
+        batch_op.create_index('ix_conversions_network_external_id', ['network', 'external_id'], unique=False)
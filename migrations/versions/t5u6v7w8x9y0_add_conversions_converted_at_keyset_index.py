@@ -0,0 +1,25 @@
+"""Add (converted_at, id) index on conversions for keyset pagination
+
+Revision ID: t5u6v7w8x9y0
+Revises: s4t5u6v7w8x9
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 't5u6v7w8x9y0'
+down_revision = 's4t5u6v7w8x9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('conversions', schema=None) as batch_op:
+        batch_op.create_index('ix_conversions_converted_at_id', ['converted_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('conversions', schema=None) as batch_op:
+        batch_op.drop_index('ix_conversions_converted_at_id')
@@ -0,0 +1,46 @@
+"""Add a monotonic sequence column to balance_ledger
+
+Revision ID: u6v7w8x9y0z1
+Revises: t5u6v7w8x9y0
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'u6v7w8x9y0z1'
+down_revision = 't5u6v7w8x9y0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('ALTER TABLE balance_ledger ADD COLUMN sequence bigserial NOT NULL')
+
+    # Number the existing entries in recorded order, a payout's opening entry
+    # before any move sharing its timestamp, and continue the sequence after them
+    op.execute("""
+        UPDATE balance_ledger
+        SET sequence = ordered.position
+        FROM (
+            SELECT id, row_number() OVER (
+                ORDER BY created_at, from_status IS NOT NULL, id
+            ) AS position
+            FROM balance_ledger
+        ) AS ordered
+        WHERE ordered.id = balance_ledger.id
+    """)
+    op.execute("""
+        SELECT setval(pg_get_serial_sequence('balance_ledger', 'sequence'), coalesce(max(sequence), 0) + 1, false)
+        FROM balance_ledger
+    """)
+
+    with op.batch_alter_table('balance_ledger', schema=None) as batch_op:
+        batch_op.create_index('ix_balance_ledger_payout_id_sequence', ['payout_id', 'sequence'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('balance_ledger', schema=None) as batch_op:
+        batch_op.drop_index('ix_balance_ledger_payout_id_sequence')
+        batch_op.drop_column('sequence')
@@ -3,6 +3,7 @@ Database models for VoteStuff
 """
 
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event
 
 # Initialize SQLAlchemy instance
 db = SQLAlchemy()
@@ -21,7 +22,13 @@ __all__ = [
     'AffiliateClick',
     'Conversion',
     'Payout',
-    'ContactSubmission'
+    'ContactSubmission',
+    'TrendingList',
+    'TrendingRefresh',
+    'DailyRollup',
+    'BalanceLedgerEntry',
+    'UserBalance',
+    'Job'
 ]
 
 # Import all models after db is initialized
@@ -37,4 +44,15 @@ from .affiliate_click import AffiliateClick
 from .conversion import Conversion
 from .payout import Payout
 from .contact_submission import ContactSubmission
+from .trending_list import TrendingList, TrendingRefresh
+from .daily_rollup import DailyRollup
+from .balance_ledger import BalanceLedgerEntry, UserBalance
+from .job import Job
 
+
+# Trigram indexes (fuzzy search) need pg_trgm before db.create_all() builds them
+event.listen(
+    db.metadata,
+    'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql')
+)
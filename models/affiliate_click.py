@@ -33,6 +33,17 @@ class AffiliateClick(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     converted_at = db.Column(db.DateTime, nullable=True)
     
+    # Keyset pagination of /analytics/clicks walks (created_at, id) newest first;
+    # conversion attribution (utils/attribution.py) scans a product/list's
+    # unconverted clicks newest first
+    __table_args__ = (
+        db.Index('ix_affiliate_clicks_created_at_id', 'created_at', 'id'),
+        db.Index(
+            'ix_affiliate_clicks_attribution', 'product_id', 'list_id', 'created_at',
+            postgresql_where=db.text('has_converted = false')
+        ),
+    )
+    
     # Relationship
     conversion = db.relationship('Conversion', backref='click', uselist=False, lazy=True)
     
@@ -0,0 +1,83 @@
+"""
+Balance ledger models
+"""
+
+from . import db
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import UUID
+import uuid
+
+class BalanceLedgerEntry(db.Model):
+    """Append-only record of every payout status change (written by utils.ledger)"""
+    __tablename__ = 'balance_ledger'
+    
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    
+    # Foreign keys
+    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    payout_id = db.Column(UUID(as_uuid=True), db.ForeignKey('payouts.id'), nullable=True, index=True)
+    
+    # The move: amount leaves the bucket of from_status and enters the bucket of to_status
+    payout_type = db.Column(db.String(20), nullable=False)  # 'cashback' or 'creator'
+    amount = db.Column(db.Numeric(10, 2), nullable=False)
+    from_status = db.Column(db.String(20), nullable=True)  # None when the payout was created
+    to_status = db.Column(db.String(20), nullable=False)
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    # Write order (bigserial): entries of one transition share a created_at,
+    # so a payout's latest entry is the one with the highest sequence
+    sequence = db.Column(db.BigInteger, db.Sequence('balance_ledger_sequence_seq'), nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_balance_ledger_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_balance_ledger_payout_id_sequence', 'payout_id', 'sequence'),
+    )
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'id': str(self.id),
+            'user_id': str(self.user_id),
+            'payout_id': str(self.payout_id) if self.payout_id else None,
+            'payout_type': self.payout_type,
+            'amount': float(self.amount),
+            'from_status': self.from_status,
+            'to_status': self.to_status,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+    
+    def __repr__(self):
+        return f'<BalanceLedgerEntry {self.payout_type} {self.amount} {self.from_status}->{self.to_status}>'
+
+
+class UserBalance(db.Model):
+    """Per-user payout totals, summed from the balance ledger (maintained by utils.ledger)"""
+    __tablename__ = 'user_balances'
+    
+    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    
+    # Cashback for clicks: pending = pending or processing payouts, earned = paid
+    cashback_pending = db.Column(db.Numeric(12, 2), nullable=False, default=0, server_default='0')
+    cashback_earned = db.Column(db.Numeric(12, 2), nullable=False, default=0, server_default='0')
+    
+    # Creator payouts for lists, same buckets
+    creator_pending = db.Column(db.Numeric(12, 2), nullable=False, default=0, server_default='0')
+    creator_paid = db.Column(db.Numeric(12, 2), nullable=False, default=0, server_default='0')
+    
+    # Timestamps
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'user_id': str(self.user_id),
+            'cashback_pending': float(self.cashback_pending),
+            'cashback_earned': float(self.cashback_earned),
+            'creator_pending': float(self.creator_pending),
+            'creator_paid': float(self.creator_paid)
+        }
+    
+    def __repr__(self):
+        return f'<UserBalance {self.user_id}>'
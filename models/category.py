@@ -4,9 +4,15 @@ Category model
 
 from . import db
 from datetime import datetime
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR
 import uuid
 
+# Full-text search document: name (weight A) + description (weight B)
+SEARCH_VECTOR_EXPRESSION = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+)
+
 class Category(db.Model):
     """Category model for organizing lists"""
     __tablename__ = 'categories'
@@ -22,6 +28,13 @@ class Category(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Full-text search (generated by Postgres, never written by the app)
+    search_vector = db.deferred(db.Column(TSVECTOR, db.Computed(SEARCH_VECTOR_EXPRESSION, persisted=True)))
+    
+    __table_args__ = (
+        db.Index('ix_categories_search_vector', 'search_vector', postgresql_using='gin'),
+    )
+    
     # Relationships
     lists = db.relationship('List', backref='category', lazy=True)
     parent = db.relationship('Category', remote_side=[id], backref='children')
@@ -46,6 +46,16 @@ class Conversion(db.Model):
     approved_at = db.Column(db.DateTime, nullable=True)  # When affiliate approved
     paid_at = db.Column(db.DateTime, nullable=True)  # When commission was received
     
+    # A network reports each conversion once: (network, external_id) is unique,
+    # which also de-duplicates webhook retries racing each other;
+    # a user's cashback transactions are listed by (purchaser_id, created_at);
+    # /analytics/conversions pages by (converted_at, id)
+    __table_args__ = (
+        db.Index('ix_conversions_network_external_id', 'network', 'external_id', unique=True),
+        db.Index('ix_conversions_purchaser_id_created_at', 'purchaser_id', 'created_at'),
+        db.Index('ix_conversions_converted_at_id', 'converted_at', 'id'),
+    )
+    
     # Relationships
     payouts = db.relationship('Payout', backref='conversion', lazy=True)  # Changed to plural for multiple payouts
     purchaser = db.relationship('User', backref='purchases', lazy=True)
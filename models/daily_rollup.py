@@ -0,0 +1,53 @@
+"""
+Daily analytics rollup model
+"""
+
+from . import db
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import UUID
+
+class DailyRollup(db.Model):
+    """Per day x list x product totals of clicks, conversions and votes (maintained by utils.rollups)"""
+    __tablename__ = 'daily_rollups'
+    
+    # Composite key: one row per product per UTC day
+    day = db.Column(db.Date, primary_key=True)
+    list_id = db.Column(UUID(as_uuid=True), db.ForeignKey('lists.id', ondelete='CASCADE'), primary_key=True)
+    product_id = db.Column(UUID(as_uuid=True), db.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    
+    # Clicks (by affiliate_clicks.created_at day)
+    clicks = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    # Conversions (by conversions.converted_at day, all statuses)
+    conversions = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0, server_default='0')
+    commission = db.Column(db.Numeric(12, 2), nullable=False, default=0, server_default='0')
+    
+    # Net vote changes made that day (removing or switching a vote subtracts)
+    upvotes = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    downvotes = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    # Timestamps
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_daily_rollups_day', 'day'),
+        db.Index('ix_daily_rollups_list_id_day', 'list_id', 'day'),
+    )
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'day': self.day.isoformat(),
+            'list_id': str(self.list_id),
+            'product_id': str(self.product_id),
+            'clicks': self.clicks,
+            'conversions': self.conversions,
+            'revenue': float(self.revenue),
+            'commission': float(self.commission),
+            'upvotes': self.upvotes,
+            'downvotes': self.downvotes
+        }
+    
+    def __repr__(self):
+        return f'<DailyRollup {self.day} {self.product_id}>'
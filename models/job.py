@@ -0,0 +1,65 @@
+"""
+Background job model
+"""
+
+from . import db
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import UUID
+import json
+import uuid
+
+class Job(db.Model):
+    """Durable background job, enqueued by the app and run by `manage.py run_jobs` (see utils.jobs)"""
+    __tablename__ = 'jobs'
+
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    # Registered handler name and its keyword arguments (JSON string)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+
+    # Lifecycle: queued -> running -> done, or back to queued (retry) until failed
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Not claimed before this
+
+    # Worker holding the job while running
+    locked_by = db.Column(db.String(100), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+
+    # Outcome
+    result = db.Column(db.Text, nullable=True)  # JSON string of the handler's return value
+    last_error = db.Column(db.Text, nullable=True)
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    # Workers poll for due queued jobs; the partial index holds only those
+    __table_args__ = (
+        db.Index(
+            'ix_jobs_queued_run_at', 'run_at',
+            postgresql_where=db.text("status = 'queued'")
+        ),
+        db.Index('ix_jobs_status', 'status'),
+    )
+
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'id': str(self.id),
+            'name': self.name,
+            'payload': json.loads(self.payload) if self.payload else {},
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_at': self.run_at.isoformat() if self.run_at else None,
+            'result': json.loads(self.result) if self.result else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+    def __repr__(self):
+        return f'<Job {self.name} {self.status}>'
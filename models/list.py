@@ -4,9 +4,15 @@ List model
 
 from . import db
 from datetime import datetime
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR
 import uuid
 
+# Full-text search document: title (weight A) + description (weight B)
+SEARCH_VECTOR_EXPRESSION = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+)
+
 class List(db.Model):
     """List model (listicles)"""
     __tablename__ = 'lists'
@@ -33,10 +39,19 @@ class List(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     approved_at = db.Column(db.DateTime, nullable=True)
     
+    # Full-text search (generated by Postgres, never written by the app)
+    search_vector = db.deferred(db.Column(TSVECTOR, db.Computed(SEARCH_VECTOR_EXPRESSION, persisted=True)))
+    
+    __table_args__ = (
+        db.Index('ix_lists_search_vector', 'search_vector', postgresql_using='gin'),
+        # Trigram index for fuzzy search (requires the pg_trgm extension)
+        db.Index('ix_lists_title_trgm', 'title', postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'}),
+    )
+    
     # Relationships
     # Note: category relationship is defined in Category model with backref='category'
     # Products are automatically ordered by their rank field (1 = highest/best rank)
-    # Rank is calculated by update_list_ranking() based on voting data:
+    # Rank is calculated by rank_list() (utils/ranking.py) based on voting data:
     #   1. Net score (upvotes - downvotes) - PRIMARY
     #   2. Upvote percentage - SECONDARY (breaks ties)
     #   3. Most recent upvote timestamp - TERTIARY (breaks remaining ties)
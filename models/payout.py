@@ -37,6 +37,11 @@ class Payout(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     paid_at = db.Column(db.DateTime, nullable=True)
     
+    # A conversion's payouts, and a user's payout of a given type on it
+    __table_args__ = (
+        db.Index('ix_payouts_conversion_id_user_id', 'conversion_id', 'user_id', 'payout_type'),
+    )
+    
     def to_dict(self):
         """Convert to dictionary"""
         return {
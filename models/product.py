@@ -4,9 +4,15 @@ Product model
 
 from . import db
 from datetime import datetime
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR
 import uuid
 
+# Full-text search document: name (weight A) + description (weight B)
+SEARCH_VECTOR_EXPRESSION = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+)
+
 class Product(db.Model):
     """Product model within lists"""
     __tablename__ = 'products'
@@ -40,6 +46,15 @@ class Product(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Full-text search (generated by Postgres, never written by the app)
+    search_vector = db.deferred(db.Column(TSVECTOR, db.Computed(SEARCH_VECTOR_EXPRESSION, persisted=True)))
+    
+    __table_args__ = (
+        db.Index('ix_products_search_vector', 'search_vector', postgresql_using='gin'),
+        # Trigram index for fuzzy search (requires the pg_trgm extension)
+        db.Index('ix_products_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
+    
     # Relationships
     retailer = db.relationship('Retailer', foreign_keys=[retailer_id], backref='products', lazy=True)
     brand = db.relationship('Retailer', foreign_keys=[brand_id], lazy=True)
@@ -64,7 +79,7 @@ class Product(db.Model):
         
         In ranking: Product A (8) > Product B (5) > Product C (-2)
         
-        This property is used by update_list_ranking() to determine product order.
+        rank_list() (utils/ranking.py) orders products by the same net score, in SQL.
         """
         return self.upvotes - self.downvotes
     
@@ -94,7 +109,7 @@ class Product(db.Model):
         
         Returns 0 if there are no votes yet (to avoid division by zero).
         
-        This property is used by update_list_ranking() as the secondary sorting criterion.
+        rank_list() (utils/ranking.py) uses the same percentage, in SQL, as the secondary sorting criterion.
         """
         total = self.upvotes + self.downvotes
         if total == 0:
@@ -4,9 +4,15 @@ Retailer model for storing affiliate partners and retailers
 
 from . import db
 from datetime import datetime
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR
 import uuid
 
+# Full-text search document: name (weight A) + description (weight B)
+SEARCH_VECTOR_EXPRESSION = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+)
+
 class Retailer(db.Model):
     """Retailer model for affiliate partners"""
     __tablename__ = 'retailers'
@@ -32,6 +38,15 @@ class Retailer(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Full-text search (generated by Postgres, never written by the app)
+    search_vector = db.deferred(db.Column(TSVECTOR, db.Computed(SEARCH_VECTOR_EXPRESSION, persisted=True)))
+    
+    __table_args__ = (
+        db.Index('ix_retailers_search_vector', 'search_vector', postgresql_using='gin'),
+        # Trigram index for fuzzy search (requires the pg_trgm extension)
+        db.Index('ix_retailers_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
+    
     # Relationships
     product_links = db.relationship('ProductLink', backref='retailer', lazy=True)
     
@@ -0,0 +1,46 @@
+"""
+Trending list snapshot model
+"""
+
+from . import db
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import UUID
+import json
+
+class TrendingList(db.Model):
+    """Precomputed trending lists (refreshed periodically by utils.trending)"""
+    __tablename__ = 'trending_lists'
+    
+    # One row per list in the current snapshot
+    list_id = db.Column(UUID(as_uuid=True), db.ForeignKey('lists.id', ondelete='CASCADE'), primary_key=True)
+    
+    # Ordering
+    position = db.Column(db.Integer, nullable=False, index=True)  # 1 = most trending
+    score = db.Column(db.Float, nullable=False, default=0)  # Time-decayed vote score
+    
+    # Serialized list with category, creator and top 4 products (JSON string)
+    payload = db.Column(db.Text, nullable=False)
+    
+    # Timestamps
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        """Return the pre-serialized list payload"""
+        data = json.loads(self.payload)
+        data['trending_score'] = self.score
+        return data
+    
+    def __repr__(self):
+        return f'<TrendingList {self.position}: {self.list_id}>'
+
+
+class TrendingRefresh(db.Model):
+    """When the trending snapshot was last rebuilt (a single row, kept even when the snapshot is empty)"""
+    __tablename__ = 'trending_refreshes'
+    
+    id = db.Column(db.Integer, primary_key=True)  # Always 1
+    refreshed_at = db.Column(db.DateTime, nullable=False)
+    list_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<TrendingRefresh {self.refreshed_at}>'
@@ -39,31 +39,17 @@ class User(db.Model):
     payouts = db.relationship('Payout', backref='user', lazy=True)
     
     def get_cashback_stats(self):
-        """Calculate cashback statistics from conversions and payouts"""
-        from .payout import Payout
+        """Cashback statistics from the user's balance summary (see utils/ledger.py)"""
+        from .balance_ledger import UserBalance
         
-        # Get total cashback earned (from paid cashback payouts)
-        total_cashback_earned = db.session.query(
-            db.func.sum(Payout.amount)
-        ).filter(
-            Payout.user_id == self.id,
-            Payout.payout_type == 'cashback',
-            Payout.status == 'paid'
-        ).scalar() or 0
-        
-        # Get pending cashback (from pending/approved cashback payouts)
-        pending_cashback = db.session.query(
-            db.func.sum(Payout.amount)
-        ).filter(
-            Payout.user_id == self.id,
-            Payout.payout_type == 'cashback',
-            Payout.status.in_(['pending', 'processing'])
-        ).scalar() or 0
+        balance = db.session.get(UserBalance, self.id)
         
         return {
             'current_balance': float(self.cashback_balance) if self.cashback_balance else 0,
-            'total_earned': float(total_cashback_earned) if total_cashback_earned else 0,
-            'pending_amount': float(pending_cashback) if pending_cashback else 0,
+            # Paid cashback payouts
+            'total_earned': float(balance.cashback_earned) if balance else 0,
+            # Pending or processing cashback payouts
+            'pending_amount': float(balance.cashback_pending) if balance else 0,
             'total_paid_out': float(self.total_payout) if self.total_payout else 0
         }
     
@@ -4,10 +4,19 @@ Admin routes
 
 from flask import request, jsonify
 from . import api_bp
-from models import db, List, Product, ProductLink, User, ContactSubmission, Payout, Category, Retailer, AffiliateClick, Conversion, Vote
+from models import db, List, Product, ProductLink, User, ContactSubmission, Payout, Category, Retailer, Job
 from utils.auth_decorators import require_admin
-from datetime import datetime, timedelta
-from sqlalchemy import func, desc
+from utils.response_cache import list_cache, invalidate_creator_lists
+from utils.suggest_index import suggest_index
+from utils.profiler import profiler
+from utils.dashboard import dashboard_snapshot
+from utils.click_pipeline import link_cache
+from utils.jobs import job_queue
+from utils.pagination import page_size, keyset_page
+from datetime import datetime
+from sqlalchemy import desc
+import inspect
+import math
 import uuid
 
 @api_bp.route('/admin/lists/pending', methods=['GET'])
@@ -76,6 +85,8 @@ def admin_update_list(current_user, list_id):
             lst.admin_notes = data['admin_notes']
         
         db.session.commit()
+        list_cache.invalidate(lst.id)
+        suggest_index.sync_list(lst)
         
         return jsonify({
             'message': 'List updated successfully',
@@ -108,6 +119,8 @@ def approve_list(current_user, list_id):
         lst.approved_at = datetime.utcnow()
         
         db.session.commit()
+        list_cache.invalidate(lst.id)
+        suggest_index.sync_list(lst)
         
         return jsonify({
             'message': 'List approved',
@@ -130,6 +143,8 @@ def reject_list(current_user, list_id):
         lst.status = 'rejected'
         lst.admin_notes = data.get('notes')
         db.session.commit()
+        list_cache.invalidate(lst.id)
+        suggest_index.sync_list(lst)
         
         return jsonify({
             'message': 'List rejected',
@@ -183,6 +198,7 @@ def update_product(current_user, product_id):
                 product.brand_id = None
         
         db.session.commit()
+        list_cache.invalidate(product.list_id)
         
         return jsonify({
             'message': 'Product updated successfully',
@@ -233,6 +249,8 @@ def create_product_link(current_user):
         
         db.session.add(new_link)
         db.session.commit()
+        list_cache.invalidate(product.list_id)
+        link_cache.invalidate(product.id)
         
         return jsonify({
             'message': 'Product link created successfully',
@@ -280,6 +298,8 @@ def update_product_link(current_user, link_id):
             link.is_primary = data['is_primary']
         
         db.session.commit()
+        list_cache.invalidate(link.product.list_id)
+        link_cache.invalidate(link.product_id)
         
         return jsonify({
             'message': 'Product link updated successfully',
@@ -298,9 +318,13 @@ def delete_product_link(current_user, link_id):
     """Delete a product link"""
     try:
         link = ProductLink.query.get_or_404(uuid.UUID(link_id))
+        list_id = link.product.list_id
+        product_id = link.product_id
         
         db.session.delete(link)
         db.session.commit()
+        list_cache.invalidate(list_id)
+        link_cache.invalidate(product_id)
         
         return jsonify({
             'message': 'Product link deleted successfully'
@@ -378,6 +402,7 @@ def update_user_admin_status(current_user, user_id):
             user.is_admin = bool(data['is_admin'])
         
         db.session.commit()
+        invalidate_creator_lists(user.id)
         
         return jsonify({
             'message': 'User updated successfully',
@@ -398,113 +423,44 @@ def update_user_admin_status(current_user, user_id):
 @api_bp.route('/admin/analytics/dashboard', methods=['GET'])
 @require_admin
 def get_dashboard_analytics(current_user):
-    """Get comprehensive dashboard analytics"""
+    """Get comprehensive dashboard analytics (see utils/dashboard.py)
+    
+    Served from a snapshot that is refreshed in the background once it is older
+    than DASHBOARD_CACHE_TTL_SECONDS; the Age header says how old it is.
+    Pass ?refresh=true to recompute it now.
+    """
     try:
-        # Date range for trends (last 30 days)
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        
-        # Total counts
-        total_users = User.query.count()
-        total_lists = List.query.count()
-        pending_lists = List.query.filter_by(status='pending').count()
-        approved_lists = List.query.filter_by(status='approved').count()
-        rejected_lists = List.query.filter_by(status='rejected').count()
-        total_votes = Vote.query.count()
-        total_clicks = AffiliateClick.query.count()
-        total_conversions = Conversion.query.count()
-        
-        # Revenue stats
-        revenue_data = db.session.query(
-            func.sum(Conversion.revenue),
-            func.sum(Conversion.commission)
-        ).first()
-        
-        total_revenue = float(revenue_data[0]) if revenue_data[0] else 0
-        total_commission = float(revenue_data[1]) if revenue_data[1] else 0
-        
-        # Recent trends (last 30 days)
-        recent_users = User.query.filter(User.created_at >= thirty_days_ago).count()
-        recent_lists = List.query.filter(List.created_at >= thirty_days_ago).count()
-        recent_clicks = AffiliateClick.query.filter(AffiliateClick.created_at >= thirty_days_ago).count()
-        recent_conversions = Conversion.query.filter(Conversion.converted_at >= thirty_days_ago).count()
-        
-        # Top performing lists (by clicks)
-        top_lists = db.session.query(
-            List.id,
-            List.title,
-            List.slug,
-            func.count(AffiliateClick.id).label('click_count')
-        ).join(
-            AffiliateClick, List.id == AffiliateClick.list_id
-        ).group_by(
-            List.id, List.title, List.slug
-        ).order_by(
-            desc('click_count')
-        ).limit(10).all()
-        
-        top_lists_data = [{
-            'id': str(lst.id),
-            'title': lst.title,
-            'slug': lst.slug,
-            'clicks': lst.click_count
-        } for lst in top_lists]
-        
-        # Recent conversions
-        recent_conversions_query = Conversion.query.order_by(desc(Conversion.converted_at)).limit(10).all()
-        recent_conversions_data = [conv.to_dict() for conv in recent_conversions_query]
-        
-        # Daily clicks and conversions for the last 30 days
-        daily_stats = []
-        for i in range(30):
-            day = datetime.utcnow() - timedelta(days=i)
-            day_start = day.replace(hour=0, minute=0, second=0, microsecond=0)
-            day_end = day_start + timedelta(days=1)
-            
-            day_clicks = AffiliateClick.query.filter(
-                AffiliateClick.created_at >= day_start,
-                AffiliateClick.created_at < day_end
-            ).count()
-            
-            day_conversions = Conversion.query.filter(
-                Conversion.converted_at >= day_start,
-                Conversion.converted_at < day_end
-            ).count()
-            
-            daily_stats.append({
-                'date': day_start.strftime('%Y-%m-%d'),
-                'clicks': day_clicks,
-                'conversions': day_conversions
-            })
-        
-        daily_stats.reverse()  # Oldest to newest
-        
-        return jsonify({
-            'totals': {
-                'users': total_users,
-                'lists': total_lists,
-                'pending_lists': pending_lists,
-                'approved_lists': approved_lists,
-                'rejected_lists': rejected_lists,
-                'votes': total_votes,
-                'clicks': total_clicks,
-                'conversions': total_conversions,
-                'revenue': total_revenue,
-                'commission': total_commission
-            },
-            'recent_trends': {
-                'users': recent_users,
-                'lists': recent_lists,
-                'clicks': recent_clicks,
-                'conversions': recent_conversions
-            },
-            'top_lists': top_lists_data,
-            'recent_conversions': recent_conversions_data,
-            'daily_stats': daily_stats
-        })
+        force = request.args.get('refresh', 'false').lower() == 'true'
+        payload, age = dashboard_snapshot.get(force=force)
+        response = jsonify(payload)
+        response.headers['Age'] = str(int(age))
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@api_bp.route('/admin/cache/stats', methods=['GET'])
+@require_admin
+def get_cache_stats(current_user):
+    """Get response cache hit/miss counters for this worker process"""
+    return jsonify({
+        'list_cache': list_cache.stats()
+    })
+
+
+@api_bp.route('/admin/metrics', methods=['GET'])
+@require_admin
+def get_metrics(current_user):
+    """Get per-route latency histograms and SQL counts for this worker process
+    
+    Requires PROFILER_ENABLED. Pass ?reset=true to clear the counters after reading.
+    """
+    metrics = profiler.metrics()
+    if request.args.get('reset', 'false').lower() == 'true':
+        profiler.reset()
+    return jsonify(metrics)
+
+
 @api_bp.route('/admin/contact-submissions', methods=['GET'])
 @require_admin
 def get_contact_submissions(current_user):
@@ -526,3 +482,74 @@ def get_payouts(current_user):
         'payouts': [payout.to_dict() for payout in payouts]
     })
 
+
+@api_bp.route('/admin/jobs', methods=['GET'])
+@require_admin
+def get_jobs(current_user):
+    """List background jobs, newest first (?status=queued|running|done|failed, ?limit=, ?cursor=)"""
+    query = Job.query
+    status = request.args.get('status')
+    if status:
+        query = query.filter(Job.status == status)
+    
+    try:
+        jobs, next_cursor = keyset_page(
+            query, Job.created_at, Job.id,
+            cursor=request.args.get('cursor'), limit=page_size(request.args.get('limit'))
+        )
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor or limit'}), 400
+    
+    return jsonify({
+        'jobs': [job.to_dict() for job in jobs],
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None
+    })
+
+
+# Longest delay a job may be queued with (one day)
+MAX_JOB_DELAY_SECONDS = 24 * 60 * 60
+
+
+@api_bp.route('/admin/jobs', methods=['POST'])
+@require_admin
+def enqueue_job(current_user):
+    """Queue a background job for `python manage.py run_jobs`
+    
+    Expected payload: {"name": "refresh_trending", "payload": {...}, "delay": seconds}
+    """
+    data = request.get_json() or {}
+    name = data.get('name')
+    if name not in job_queue.handlers:
+        return jsonify({'error': f"name must be one of: {', '.join(sorted(job_queue.handlers))}"}), 400
+    payload = data.get('payload') or {}
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'payload must be an object'}), 400
+    # Reject payloads the handler can't be called with now, not after every retry
+    try:
+        inspect.signature(job_queue.handlers[name]).bind(**payload)
+    except TypeError as e:
+        return jsonify({'error': f'Invalid payload for {name}: {e}'}), 400
+    try:
+        delay = max(float(data.get('delay') or 0), 0)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'delay must be a number of seconds'}), 400
+    if not math.isfinite(delay) or delay > MAX_JOB_DELAY_SECONDS:
+        return jsonify({'error': f'delay must be at most {MAX_JOB_DELAY_SECONDS} seconds'}), 400
+    
+    job = job_queue.enqueue(name, payload, delay=delay)
+    db.session.commit()
+    return jsonify(job.to_dict()), 202
+
+
+@api_bp.route('/admin/jobs/<job_id>', methods=['GET'])
+@require_admin
+def get_job(current_user, job_id):
+    """Get a background job's status, attempts, result or last error"""
+    try:
+        job = db.session.get(Job, uuid.UUID(job_id))
+    except ValueError:
+        return jsonify({'error': 'Invalid job ID'}), 400
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
@@ -4,15 +4,37 @@ Analytics routes
 
 from flask import request, jsonify
 from . import api_bp
-from models import db, AffiliateClick, Conversion, Payout
-from sqlalchemy import desc
+from models import db, AffiliateClick, Conversion
+from sqlalchemy import desc, func, cast, Date
+from utils.rollups import daily_totals
+from utils.pagination import page_size, keyset_page, stream_export, STREAM_BATCH_SIZE
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import uuid
+
+CLICK_EXPORT_FIELDS = [
+    'id', 'list_id', 'product_id', 'product_link_id', 'user_id',
+    'url', 'has_converted', 'created_at', 'converted_at'
+]
 
 @api_bp.route('/analytics/clicks', methods=['GET'])
 def get_click_analytics():
-    """Get click analytics"""
+    """Get click analytics
+    
+    JSON (default): one page of clicks, newest first. Pass the returned
+    next_cursor as ?cursor= for the next page; ?limit= sets the page size
+    (default 100, max 1000). ?include_total=true adds a COUNT of all matches.
+    
+    ?format=ndjson or ?format=csv streams every matching click instead, read
+    from a server-side cursor in batches so memory stays flat at any size.
+    """
     # TODO: Add authentication and authorization checks
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
+    export_format = request.args.get('format', 'json')
+    
+    if export_format not in ('json', 'ndjson', 'csv'):
+        return jsonify({'error': "format must be 'json', 'ndjson' or 'csv'"}), 400
     
     query = AffiliateClick.query
     
@@ -22,26 +44,175 @@ def get_click_analytics():
             AffiliateClick.created_at <= end_date
         )
     
-    clicks = query.order_by(desc(AffiliateClick.created_at)).all()
+    if export_format != 'json':
+        rows = db.session.scalars(
+            query.order_by(desc(AffiliateClick.created_at), desc(AffiliateClick.id))
+            .statement.execution_options(yield_per=STREAM_BATCH_SIZE)
+        )
+        return stream_export(rows, AffiliateClick.to_dict, CLICK_EXPORT_FIELDS, export_format, 'clicks')
     
-    return jsonify({
+    try:
+        limit = page_size(request.args.get('limit'))
+        clicks, next_cursor = keyset_page(
+            query, AffiliateClick.created_at, AffiliateClick.id,
+            cursor=request.args.get('cursor'), limit=limit
+        )
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor or limit'}), 400
+    
+    result = {
         'clicks': [click.to_dict() for click in clicks],
-        'total': len(clicks)
-    })
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None
+    }
+    if request.args.get('include_total', 'false').lower() == 'true':
+        result['total'] = query.order_by(None).count()
+    
+    return jsonify(result)
+
+# group_by dimension -> SQL expression
+CONVERSION_DIMENSIONS = {
+    'network': Conversion.network,
+    'status': Conversion.status,
+    'list': Conversion.list_id,
+    'day': cast(Conversion.converted_at, Date),
+    'currency': Conversion.currency,
+}
+
+
+def _money(value):
+    """Exact decimal string for a SUM result (JSON numbers would round through float)"""
+    return str((value if value is not None else Decimal('0')).quantize(Decimal('0.01')))
+
+
+def _dimension_value(value):
+    if isinstance(value, (uuid.UUID, date)):
+        return str(value)
+    return value
+
 
 @api_bp.route('/analytics/conversions', methods=['GET'])
 def get_conversion_analytics():
-    """Get conversion analytics"""
+    """Get conversion analytics
+    
+    Totals are summed in SQL and returned as exact decimal strings, per
+    currency in 'totals_by_currency'. The top-level total_revenue /
+    total_commission are only included when every matching conversion shares
+    one currency.
+    
+    Query params:
+    - start_date / end_date: filter on converted_at (ISO date or datetime)
+    - group_by: comma-separated dimensions - network, status, list, day, currency -
+      adds a 'groups' breakdown with count/revenue/commission per combination
+    - limit / cursor: page through the conversions themselves, newest first
+    """
     # TODO: Add authentication and authorization checks
-    conversions = Conversion.query.order_by(desc(Conversion.converted_at)).all()
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
     
-    total_revenue = sum(float(conv.revenue) if conv.revenue else 0 for conv in conversions)
-    total_commission = sum(float(conv.commission) if conv.commission else 0 for conv in conversions)
+    group_by = [name.strip() for name in request.args.get('group_by', '').split(',') if name.strip()]
+    unknown = [name for name in group_by if name not in CONVERSION_DIMENSIONS]
+    if unknown:
+        return jsonify({
+            'error': f"Unknown group_by: {', '.join(unknown)}. Use: {', '.join(CONVERSION_DIMENSIONS)}"
+        }), 400
     
-    return jsonify({
+    filters = []
+    if start_date:
+        filters.append(Conversion.converted_at >= start_date)
+    if end_date:
+        filters.append(Conversion.converted_at <= end_date)
+    
+    try:
+        limit = page_size(request.args.get('limit'))
+        conversions, next_cursor = keyset_page(
+            Conversion.query.filter(*filters), Conversion.converted_at, Conversion.id,
+            cursor=request.args.get('cursor'), limit=limit
+        )
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor or limit'}), 400
+    
+    currency_totals = db.session.query(
+        Conversion.currency,
+        func.count(Conversion.id).label('count'),
+        func.sum(Conversion.revenue).label('revenue'),
+        func.sum(Conversion.commission).label('commission')
+    ).filter(*filters).group_by(Conversion.currency).order_by(Conversion.currency).all()
+    
+    result = {
         'conversions': [conv.to_dict() for conv in conversions],
-        'total_revenue': total_revenue,
-        'total_commission': total_commission,
-        'count': len(conversions)
-    })
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None,
+        'totals_by_currency': [{
+            'currency': row.currency,
+            'count': row.count,
+            'revenue': _money(row.revenue),
+            'commission': _money(row.commission)
+        } for row in currency_totals],
+        'count': sum(row.count for row in currency_totals)
+    }
+    # Amounts in different currencies can't be added up
+    if len(currency_totals) <= 1:
+        only = currency_totals[0] if currency_totals else None
+        result['currency'] = only.currency if only else None
+        result['total_revenue'] = _money(only.revenue if only else None)
+        result['total_commission'] = _money(only.commission if only else None)
+    
+    if group_by:
+        dimensions = [CONVERSION_DIMENSIONS[name].label(name) for name in group_by]
+        rows = db.session.query(
+            *dimensions,
+            func.count(Conversion.id).label('count'),
+            func.sum(Conversion.revenue).label('revenue'),
+            func.sum(Conversion.commission).label('commission')
+        ).filter(*filters).group_by(*dimensions).order_by(*dimensions).all()
+        
+        result['groups'] = [{
+            **{name: _dimension_value(getattr(row, name)) for name in group_by},
+            'count': row.count,
+            'revenue': _money(row.revenue),
+            'commission': _money(row.commission)
+        } for row in rows]
+    
+    return jsonify(result)
 
+@api_bp.route('/analytics/daily', methods=['GET'])
+def get_daily_analytics():
+    """Get per-day clicks, conversions, revenue and votes from the daily rollups
+    
+    Query params: start_date / end_date (YYYY-MM-DD, default: last 30 days),
+    list_id and product_id to narrow to one list or product.
+    """
+    # TODO: Add authentication and authorization checks
+    try:
+        end_day = date.fromisoformat(request.args['end_date']) if request.args.get('end_date') else datetime.utcnow().date()
+        start_day = date.fromisoformat(request.args['start_date']) if request.args.get('start_date') else end_day - timedelta(days=29)
+    except ValueError:
+        return jsonify({'error': 'start_date and end_date must be YYYY-MM-DD'}), 400
+    
+    try:
+        list_id = uuid.UUID(request.args['list_id']) if request.args.get('list_id') else None
+        product_id = uuid.UUID(request.args['product_id']) if request.args.get('product_id') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid list_id or product_id'}), 400
+    
+    rows = daily_totals(start_day, end_day, list_id=list_id, product_id=product_id)
+    days = [{
+        'date': row.day.isoformat(),
+        'clicks': row.clicks,
+        'conversions': row.conversions,
+        'revenue': float(row.revenue),
+        'commission': float(row.commission),
+        'upvotes': row.upvotes,
+        'downvotes': row.downvotes
+    } for row in rows]
+    
+    return jsonify({
+        'days': days,
+        'totals': {
+            key: sum(day[key] for day in days)
+            for key in ('clicks', 'conversions', 'revenue', 'commission', 'upvotes', 'downvotes')
+        },
+        'start_date': start_day.isoformat(),
+        'end_date': end_day.isoformat()
+    })
@@ -2,15 +2,24 @@
 Conversion and cashback routes
 """
 
-from flask import request, jsonify
+from flask import request, jsonify, current_app
 from . import api_bp
 from models import (
     db, Conversion, AffiliateClick, 
     User, Product, List, Payout
 )
-from datetime import datetime, timedelta
+from datetime import datetime
 from decimal import Decimal
+from sqlalchemy.exc import IntegrityError
 from config import Config
+from utils.rollups import record_rollup
+from utils.conversion_ingest import ingest_conversions
+from utils.attribution import match_clicks, mark_converted
+from utils.ledger import record_payout_changes
+from utils.settlement import transition_conversions, TRANSITIONS
+from utils.auth_decorators import require_admin
+from utils.jobs import job_queue
+import json
 import uuid
 
 # Configuration for cashback and creator payout percentages
@@ -115,37 +124,20 @@ def conversion_webhook():
         # Try to get click from webhook click_id
         if click_id:
             try:
-                click = AffiliateClick.query.get(uuid.UUID(click_id))
+                click = db.session.query(AffiliateClick.id, AffiliateClick.user_id).filter(
+                    AffiliateClick.id == uuid.UUID(click_id)
+                ).first()
             except ValueError:
                 pass
         
-        # If no click_id provided, try to match by product/list and purchaser/time window
+        # If no click_id provided, match the most recent unconverted click on
+        # this product/list (by the purchaser, if known) within the attribution window
         if not click:
-            # Look for recent clicks on this product/list
-            # Match by purchaser_id if available, otherwise by time window
-            
-            query = AffiliateClick.query.filter(
-                AffiliateClick.product_id == product_id,
-                AffiliateClick.list_id == list_id,
-                AffiliateClick.has_converted == False
-            )
-            
-            # If we have purchaser_id, try to match clicks by that user
-            if purchaser_id:
-                query = query.filter(AffiliateClick.user_id == purchaser_id)
-            
-            # Only look at clicks within last 30 days (affiliate windows vary)
-            time_window = datetime.utcnow() - timedelta(days=30)
-            query = query.filter(AffiliateClick.created_at >= time_window)
-            
-            # Get most recent matching click
-            click = query.order_by(AffiliateClick.created_at.desc()).first()
+            click = match_clicks([(product_id, list_id, purchaser_id)])[0]
         
         # Get clicker user_id from click (for cashback attribution)
         if click:
             clicker_user_id = click.user_id
-            # Mark click as converted
-            click.has_converted = True
         
         # Parse timestamps
         converted_at_str = data.get('converted_at')
@@ -156,9 +148,9 @@ def conversion_webhook():
             except (ValueError, AttributeError):
                 pass
         
-        # Mark click conversion timestamp if we found one
+        # Mark click as converted, with its conversion timestamp
         if click:
-            click.converted_at = converted_at
+            mark_converted({click.id: converted_at})
         
         # Create conversion record - this is the PURCHASE event
         conversion = Conversion(
@@ -187,6 +179,7 @@ def conversion_webhook():
         
         # Create cashback payout for the user who clicked (clicker gets cashback)
         # This is the attribution - the clicker gets rewarded, not necessarily the purchaser
+        cashback_payout = creator_payout = None
         if clicker_user_id:
             cashback_payout = Payout(
                 id=uuid.uuid4(),
@@ -219,6 +212,18 @@ def conversion_webhook():
             
             db.session.add(creator_payout)
         
+        # Open the new payouts in the users' balance ledger
+        record_payout_changes(
+            (payout.id, payout.user_id, payout.payout_type, payout.amount, None, payout.status)
+            for payout in (cashback_payout, creator_payout) if payout is not None
+        )
+        
+        # Add the purchase to the analytics rollup for its conversion day
+        record_rollup(
+            converted_at, list_id, product_id,
+            conversions=1, revenue=conversion.revenue, commission=conversion.commission
+        )
+        
         db.session.commit()
         
         return jsonify({
@@ -230,37 +235,92 @@ def conversion_webhook():
             'creator_payout_amount': float(creator_payout_amount) if lst.creator_id else None
         }), 201
         
+    except IntegrityError:
+        # A retry of the same conversion committed first: (network, external_id) is unique
+        db.session.rollback()
+        existing_conversion = Conversion.query.filter_by(external_id=external_id, network=network).first()
+        if existing_conversion is None:
+            return jsonify({'error': 'Conversion could not be stored'}), 409
+        return jsonify({
+            'message': 'Conversion already processed',
+            'conversion_id': str(existing_conversion.id)
+        }), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
+
+@api_bp.route('/conversions/webhook/batch', methods=['POST'])
+def conversion_webhook_batch():
+    """
+    Bulk version of the conversion webhook for affiliate network reports
+    
+    The body is a JSON array of webhook payloads (same fields as
+    /conversions/webhook), or NDJSON (Content-Type: application/x-ndjson) with
+    one payload per line. Rows are processed with the same rules as the
+    single webhook, using set-based lookups and bulk inserts
+    (see utils/conversion_ingest.py), all in one transaction.
+    
+    Returns a result per row, in input order:
+    {"index": 0, "status": "created|duplicate|error", "conversion_id": ..., "error": ...}
+    """
+    try:
+        if request.mimetype in ('application/x-ndjson', 'application/ndjson'):
+            try:
+                payload = [
+                    json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip()
+                ]
+            except ValueError as e:
+                return jsonify({'error': f'Invalid NDJSON: {e}'}), 400
+        else:
+            payload = request.get_json(silent=True)
+        
+        if not isinstance(payload, list) or not payload:
+            return jsonify({'error': 'Body must be a non-empty JSON array or NDJSON'}), 400
+        
+        max_rows = current_app.config.get('CONVERSION_BATCH_MAX_ROWS', 5000)
+        if len(payload) > max_rows:
+            return jsonify({'error': f'At most {max_rows} rows per batch'}), 413
+        
+        results = ingest_conversions(
+            payload,
+            cashback_percentage=DEFAULT_CASHBACK_PERCENTAGE,
+            creator_payout_percentage=DEFAULT_CREATOR_PAYOUT_PERCENTAGE
+        )
+        
+        counts = {status: 0 for status in ('created', 'duplicate', 'error')}
+        for result in results:
+            counts[result['status']] += 1
+        
+        return jsonify({
+            'message': f"Processed {len(results)} conversions",
+            **counts,
+            'results': results
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @api_bp.route('/conversions/<conversion_id>/approve', methods=['POST'])
 def approve_conversion(conversion_id):
     """
     Mark conversion as approved by affiliate network
     Updates conversion status and related payout statuses
+    Only pending conversions can be approved (see TRANSITIONS)
     """
     try:
-        conversion = Conversion.query.get_or_404(uuid.UUID(conversion_id))
-        
-        # Update conversion status
-        conversion.status = 'approved'
-        conversion.approved_at = datetime.utcnow()
-        
-        # Update related payouts to 'processing' (they're approved but not yet paid)
-        payouts = Payout.query.filter_by(
-            conversion_id=conversion.id,
-            status='pending'
-        ).all()
-        
-        for payout in payouts:
-            payout.status = 'processing'
-        
-        db.session.commit()
+        result = transition_conversions('approved', conversion_ids=[uuid.UUID(conversion_id)])
+        if result['not_found']:
+            return jsonify({'error': 'Conversion not found'}), 404
+        if result['invalid']:
+            return jsonify({'error': 'Conversion cannot be approved from its current status'}), 409
+        if result['unchanged']:
+            return jsonify({'message': 'Conversion already approved, 0 payouts updated'}), 200
         
         return jsonify({
-            'message': f'Conversion approved, {len(payouts)} payouts updated'
+            'message': f"Conversion approved, {result['payouts']} payouts updated"
         }), 200
         
     except ValueError:
@@ -276,49 +336,168 @@ def mark_conversion_paid(conversion_id):
     Mark conversion as paid (commission received from retailer)
     Updates conversion status to 'paid' and updates user balances
     Also processes creator payouts
+    Only pending or approved conversions can be paid (see TRANSITIONS)
     """
     try:
-        conversion = Conversion.query.get_or_404(uuid.UUID(conversion_id))
+        result = transition_conversions('paid', conversion_ids=[uuid.UUID(conversion_id)])
+        if result['not_found']:
+            return jsonify({'error': 'Conversion not found'}), 404
+        if result['invalid']:
+            return jsonify({'error': 'Conversion cannot be marked as paid from its current status'}), 409
+        if result['unchanged']:
+            return jsonify({'message': 'Conversion already paid', 'total_cashback_paid': 0.0}), 200
         
-        # Update conversion status
-        conversion.status = 'paid'
-        conversion.paid_at = datetime.utcnow()
+        return jsonify({
+            'message': f"Conversion marked as paid, {result['payouts']} payouts processed",
+            'total_cashback_paid': float(result['cashback'])
+        }), 200
         
-        # Update all payouts for this conversion
-        payouts = Payout.query.filter_by(
-            conversion_id=conversion.id,
-            status='processing'
-        ).all()
+    except ValueError:
+        return jsonify({'error': 'Invalid conversion ID'}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+def _queued(job):
+    """Commit an enqueued job and answer 202 with where to follow it"""
+    db.session.commit()
+    return jsonify({
+        'message': f'Queued as job {job.id}',
+        'job_id': str(job.id),
+        'status_url': f'/api/admin/jobs/{job.id}'
+    }), 202
+
+
+@api_bp.route('/conversions/paid', methods=['POST'])
+@require_admin
+def mark_conversions_paid(current_user):
+    """
+    Mark a batch of conversions as paid, e.g. when reconciling a network's
+    monthly payment
+    
+    Expected payload: {"conversion_ids": ["uuid", ...]}
+    
+    Same effect as /conversions/<id>/paid for each id, in a few set-based
+    statements (see utils/settlement.py): ids already paid are reported as
+    already_paid and ids whose status can't be paid (cancelled) as invalid.
+    With "async": true the batch is queued as a settle_conversions job
+    instead and 202 is returned with its job_id (see utils/jobs.py).
+    """
+    try:
+        data = request.get_json() or {}
+        conversion_ids = data.get('conversion_ids')
+        if not isinstance(conversion_ids, list) or not conversion_ids:
+            return jsonify({'error': 'conversion_ids must be a non-empty array'}), 400
         
-        paid_count = 0
-        total_cashback_paid = Decimal('0')
+        max_rows = current_app.config.get('CONVERSION_BATCH_MAX_ROWS', 5000)
+        if len(conversion_ids) > max_rows:
+            return jsonify({'error': f'At most {max_rows} conversion ids per batch'}), 413
         
-        for payout in payouts:
-            payout.status = 'paid'
-            payout.paid_at = datetime.utcnow()
-            
-            # Update user balance based on payout type
-            user = User.query.get(payout.user_id)
-            if user:
-                if payout.payout_type == 'cashback':
-                    # Update cashback balance
-                    user.cashback_balance = (user.cashback_balance or Decimal('0')) + payout.amount
-                    total_cashback_paid += payout.amount
-                elif payout.payout_type == 'creator':
-                    # Update creator's total payout
-                    user.total_payout = (user.total_payout or Decimal('0')) + payout.amount
-            
-            paid_count += 1
+        try:
+            conversion_ids = [uuid.UUID(str(conversion_id)) for conversion_id in conversion_ids]
+        except ValueError:
+            return jsonify({'error': 'Invalid conversion ID'}), 400
         
-        db.session.commit()
+        if data.get('async'):
+            return _queued(job_queue.enqueue('settle_conversions', {'conversion_ids': conversion_ids}))
+        
+        result = transition_conversions('paid', conversion_ids=conversion_ids)
         
         return jsonify({
-            'message': f'Conversion marked as paid, {paid_count} payouts processed',
-            'total_cashback_paid': float(total_cashback_paid)
+            'message': f"{len(result['transitioned'])} conversions marked as paid, {result['payouts']} payouts processed",
+            'paid_conversion_ids': [str(conversion_id) for conversion_id in result['transitioned']],
+            'already_paid': [str(conversion_id) for conversion_id in result['unchanged']],
+            'invalid': [str(conversion_id) for conversion_id in result['invalid']],
+            'not_found': result['not_found'],
+            'users_credited': result['users'],
+            'total_cashback_paid': float(result['cashback']),
+            'total_creator_paid': float(result['creator'])
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@api_bp.route('/conversions/transitions', methods=['POST'])
+@require_admin
+def transition_conversions_bulk(current_user):
+    """
+    Move a batch of conversions to a new lifecycle status, e.g. when
+    reconciling a network's statement
+    
+    Expected payload:
+    {
+        "status": "approved|paid|cancelled",
+        "conversion_ids": ["uuid", ...],  # and/or
+        "network": "impact",
+        "external_ids": ["network_conversion_id", ...]
+    }
+    
+    Payouts follow the conversion (approved: pending -> processing; paid:
+    processing -> paid with balances credited; cancelled: pending/processing
+    -> failed). Everything is applied in one transaction with set-based
+    statements (see utils/settlement.py). With "async": true the batch is
+    queued as a transition_conversions job instead and 202 is returned with
+    its job_id.
+    """
+    try:
+        data = request.get_json() or {}
+        target = data.get('status')
+        if target not in TRANSITIONS:
+            return jsonify({'error': f"status must be one of: {', '.join(TRANSITIONS)}"}), 400
+        
+        conversion_ids = data.get('conversion_ids') or []
+        external_ids = data.get('external_ids') or []
+        network = data.get('network')
+        if not isinstance(conversion_ids, list) or not isinstance(external_ids, list):
+            return jsonify({'error': 'conversion_ids and external_ids must be arrays'}), 400
+        if external_ids and not network:
+            return jsonify({'error': 'network is required with external_ids'}), 400
+        if not conversion_ids and not external_ids:
+            return jsonify({'error': 'Provide conversion_ids or network and external_ids'}), 400
+        
+        max_rows = current_app.config.get('CONVERSION_BATCH_MAX_ROWS', 5000)
+        if len(conversion_ids) + len(external_ids) > max_rows:
+            return jsonify({'error': f'At most {max_rows} conversions per batch'}), 413
+        
+        try:
+            conversion_ids = [uuid.UUID(str(conversion_id)) for conversion_id in conversion_ids]
+        except ValueError:
+            return jsonify({'error': 'Invalid conversion ID'}), 400
+        
+        if data.get('async'):
+            return _queued(job_queue.enqueue('transition_conversions', {
+                'status': target,
+                'conversion_ids': conversion_ids,
+                'network': network,
+                'external_ids': external_ids
+            }))
+        
+        result = transition_conversions(
+            target,
+            conversion_ids=conversion_ids,
+            network=network,
+            external_ids=[str(external_id) for external_id in external_ids]
+        )
+        
+        return jsonify({
+            'status': target,
+            'counts': {
+                outcome: len(result[outcome])
+                for outcome in ('transitioned', 'unchanged', 'invalid', 'not_found')
+            },
+            'transitioned': [str(conversion_id) for conversion_id in result['transitioned']],
+            'unchanged': [str(conversion_id) for conversion_id in result['unchanged']],
+            'invalid': [str(conversion_id) for conversion_id in result['invalid']],
+            'not_found': result['not_found'],
+            'payouts_updated': result['payouts'],
+            'users_credited': result['users'],
+            'total_cashback_paid': float(result['cashback']),
+            'total_creator_paid': float(result['creator'])
         }), 200
         
-    except ValueError:
-        return jsonify({'error': 'Invalid conversion ID'}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
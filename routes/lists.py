@@ -7,6 +7,10 @@ from . import api_bp
 from models import db, List, Product, Category
 from sqlalchemy import desc, or_
 from sqlalchemy.orm import joinedload
+from utils.view_buffer import view_buffer
+from utils.response_cache import list_cache
+from utils.suggest_index import suggest_index
+from utils.click_pipeline import link_cache
 import uuid
 
 # Cache for category tree to avoid reloading on every request
@@ -127,33 +131,53 @@ def get_lists():
 
 @api_bp.route('/lists/<list_id>', methods=['GET'])
 def get_list(list_id):
-    """Get single list with products"""
+    """
+    Get single list with products
+    
+    The serialized list is served from list_cache when possible. Entries are
+    invalidated whenever votes, edits or approvals touch the list.
+    """
     try:
         from sqlalchemy.orm import joinedload
         from models.product_link import ProductLink
         from models.retailer import Retailer
         
-        lst = List.query.options(
-            joinedload(List.products).joinedload(Product.retailer),
-            joinedload(List.products).joinedload(Product.brand),
-            joinedload(List.products).joinedload(Product.product_links).joinedload(ProductLink.retailer)
-        ).get_or_404(uuid.UUID(list_id))
+        list_uuid = uuid.UUID(list_id)
         
-        # Increment view count (analytics tracking)
-        lst.view_count += 1
-        db.session.commit()
+        # Read the version before loading so a concurrent change can't be cached as current
+        cache_version = list_cache.version(list_uuid)
+        cached = list_cache.get(list_uuid, cache_version)
         
-        list_data = lst.to_dict()
-        # Products are returned in the order defined by their relationship
-        # The Product model relationship includes: order_by='Product.rank'
-        # This means products are automatically sorted by their rank field (1, 2, 3, etc.)
-        # which was calculated by update_list_ranking() based on votes.
-        # Rank 1 = highest (best net score + upvote %), Rank 2 = second, etc.
-        list_data['products'] = [product.to_dict() for product in lst.products]
-        if lst.creator:
-            list_data['creator'] = lst.creator.to_dict()
-        if lst.category:
-            list_data['category'] = lst.category.to_dict()
+        if cached is not None:
+            list_data = dict(cached)
+        else:
+            lst = List.query.options(
+                joinedload(List.products).joinedload(Product.retailer),
+                joinedload(List.products).joinedload(Product.brand),
+                joinedload(List.products).joinedload(Product.product_links).joinedload(ProductLink.retailer)
+            ).get_or_404(list_uuid)
+            
+            list_data = lst.to_dict()
+            # Products are returned in the order defined by their relationship
+            # The Product model relationship includes: order_by='Product.rank'
+            # This means products are automatically sorted by their rank field (1, 2, 3, etc.)
+            # which was calculated by rank_list() (utils/ranking.py) based on votes.
+            # Rank 1 = highest (best net score + upvote %), Rank 2 = second, etc.
+            list_data['products'] = [product.to_dict() for product in lst.products]
+            if lst.creator:
+                list_data['creator'] = lst.creator.to_dict()
+            if lst.category:
+                list_data['category'] = lst.category.to_dict()
+            
+            # view_count changes on every read, so it is never cached
+            list_data.pop('view_count', None)
+            list_cache.set(list_uuid, list_data, cache_version)
+            list_data = dict(list_data)
+        
+        # Record the view (analytics tracking) and report the count including
+        # it. With VIEW_COUNT_FLUSH_SECONDS > 0 views are buffered in memory and
+        # flushed in batches, so this read does not open a write transaction.
+        list_data['view_count'] = view_buffer.record(list_uuid) or 0
         
         return jsonify(list_data)
     except ValueError:
@@ -226,6 +250,7 @@ def create_list():
         
         # Create products with their links
         created_products = []
+        created_retailers = []
         for idx, product_data in enumerate(products_data):
             if not product_data.get('name') or not product_data.get('affiliate_url'):
                 continue  # Skip invalid products
@@ -293,6 +318,7 @@ def create_list():
                         )
                         db.session.add(retailer)
                         db.session.flush()
+                        created_retailers.append(retailer)
                 
                 # Set primary retailer from first link
                 if link_idx == 0 and not primary_retailer:
@@ -318,6 +344,8 @@ def create_list():
         
         # Commit everything
         db.session.commit()
+        for retailer in created_retailers:
+            suggest_index.sync_retailer(retailer)
         
         # Return the created list with products
         list_dict = new_list.to_dict()
@@ -352,6 +380,8 @@ def update_list(list_id):
     try:
         lst = List.query.get_or_404(uuid.UUID(list_id))
         data = request.get_json()
+        created_retailers = []
+        deleted_product_ids = []
         
         # TODO: Add authentication check to ensure user is the creator
         
@@ -386,6 +416,7 @@ def update_list(list_id):
             
             # Delete existing products (cascade will handle product_links)
             for product in lst.products:
+                deleted_product_ids.append(product.id)
                 db.session.delete(product)
             
             # Create new products
@@ -463,6 +494,7 @@ def update_list(list_id):
                             )
                             db.session.add(retailer)
                             db.session.flush()
+                            created_retailers.append(retailer)
                     
                     # Set primary retailer from first link
                     if link_idx == 0 and not primary_retailer:
@@ -487,6 +519,12 @@ def update_list(list_id):
                 created_products.append(product)
         
         db.session.commit()
+        list_cache.invalidate(lst.id)
+        for product_id in deleted_product_ids:
+            link_cache.invalidate(product_id)
+        suggest_index.sync_list(lst)
+        for retailer in created_retailers:
+            suggest_index.sync_retailer(retailer)
         
         # Return updated list
         list_dict = lst.to_dict()
@@ -509,52 +547,36 @@ def update_list(list_id):
 
 @api_bp.route('/lists/trending', methods=['GET'])
 def get_trending_lists():
-    """Get trending lists based on recent votes"""
-    from sqlalchemy.orm import joinedload
-    from models.product_link import ProductLink
+    """
+    Get trending lists based on recent votes
     
-    query = List.query.options(
-        joinedload(List.category),
-        joinedload(List.creator),
-        joinedload(List.products).joinedload(Product.brand),
-        joinedload(List.products).joinedload(Product.product_links).joinedload(ProductLink.retailer)
-    ).filter_by(status='approved')
-    query = query.order_by(desc(List.total_votes))
+    Served from the trending_lists snapshot (see utils/trending.py), which
+    scores lists by time-decayed vote activity and stores each list already
+    serialized with its top 4 products. The snapshot is rebuilt by
+    `flask refresh-trending`; if it is missing or older than
+    TRENDING_MAX_AGE_SECONDS it is rebuilt inline as a fallback, by one
+    request at a time (the others keep serving the current rows).
+    """
+    from datetime import datetime, timedelta
+    from flask import current_app
+    from models.trending_list import TrendingList
+    from utils.trending import refresh_trending, last_refreshed_at
     
-    # Get top 10
-    trending = query.limit(10).all()
+    max_age = timedelta(seconds=current_app.config.get('TRENDING_MAX_AGE_SECONDS', 900))
+    refreshed_at = last_refreshed_at()
+    if refreshed_at is None or datetime.utcnow() - refreshed_at > max_age:
+        # Only one request rebuilds; the others (and this one, if the rebuild
+        # fails) serve the snapshot as it is
+        try:
+            refresh_trending(wait=False, max_age=max_age)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error refreshing trending lists: {e}")
     
-    # Build response with category, creator, and top 4 products data
-    lists_data = []
-    for lst in trending:
-        list_dict = lst.to_dict()
-        if lst.category:
-            list_dict['category'] = lst.category.to_dict()
-        if lst.creator:
-            list_dict['creator'] = lst.creator.to_dict()
-        
-        # Get the top 4 ranked products for this list
-        top_products = []
-        if lst.products:
-            # Products are already ordered by rank due to the relationship definition
-            # Get products with ranks 1-4
-            for product in lst.products:
-                if product.rank and product.rank <= 4:
-                    product_dict = product.to_dict()
-                    # Add retailer from first product link if available
-                    if product.product_links and len(product.product_links) > 0:
-                        first_link = product.product_links[0]
-                        if first_link.retailer:
-                            product_dict['retailer'] = first_link.retailer.to_dict()
-                    top_products.append(product_dict)
-                    if len(top_products) >= 4:
-                        break
-        
-        list_dict['top_products'] = top_products
-        
-        lists_data.append(list_dict)
+    entries = TrendingList.query.order_by(TrendingList.position).all()
     
     return jsonify({
-        'lists': lists_data
+        'lists': [entry.to_dict() for entry in entries],
+        'refreshed_at': entries[0].refreshed_at.isoformat() if entries and entries[0].refreshed_at else None
     })
 
@@ -2,10 +2,11 @@
 Product routes
 """
 
-from flask import request, jsonify
+from flask import request, jsonify, redirect
 from . import api_bp
-from models import db, Product, List, ProductLink, AffiliateClick
-from datetime import datetime
+from models import db, Product, List
+from utils.response_cache import list_cache
+from utils.click_pipeline import link_cache, click_queue, new_click, LinkMismatch
 import uuid
 
 @api_bp.route('/products/<product_id>', methods=['GET'])
@@ -40,6 +41,7 @@ def add_product(list_id):
         )
         db.session.add(new_product)
         db.session.commit()
+        list_cache.invalidate(lst.id)
         
         return jsonify({
             'message': 'Product added successfully',
@@ -51,26 +53,45 @@ def add_product(list_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def _queue_click(product_id, targets, product_link_id, url, user_id=None, session_id=None):
+    """Queue a click for the background bulk writer and return its id"""
+    click = new_click(
+        product_id=product_id,
+        list_id=targets['list_id'],
+        url=url,
+        product_link_id=product_link_id,
+        user_id=user_id,
+        session_id=session_id,
+        ip_address=request.remote_addr,
+        user_agent=request.headers.get('User-Agent', ''),
+        referrer=request.headers.get('Referer', '')
+    )
+    click_queue.record(click)
+    return click['id']
+
 @api_bp.route('/products/<product_id>/click', methods=['POST'])
 def track_click(product_id):
-    """Track affiliate click and return tracking URL"""
+    """
+    Track affiliate click and return tracking URL.
+
+    The redirect target comes from the link cache. By default the click is
+    inserted before answering; with CLICK_FLUSH_SECONDS > 0 it is queued for
+    the background bulk writer instead (see utils/click_pipeline.py) and this
+    does no database writes of its own.
+    """
     try:
-        product = Product.query.get_or_404(uuid.UUID(product_id))
+        product_id = uuid.UUID(product_id)
         data = request.get_json() or {}
         
         # Get product_link_id if provided (for ProductLink tracking)
         product_link_id = data.get('product_link_id')
         if product_link_id:
             try:
-                product_link = ProductLink.query.get(uuid.UUID(product_link_id))
-                if product_link and product_link.product_id != product.id:
-                    return jsonify({'error': 'Product link does not match product'}), 400
-                url_to_track = product_link.url if product_link else product.affiliate_url
+                product_link_id = uuid.UUID(product_link_id)
             except ValueError:
                 return jsonify({'error': 'Invalid product_link_id'}), 400
         else:
-            product_link = None
-            url_to_track = product.affiliate_url
+            product_link_id = None
         
         # Get user info (optional - can be guest)
         user_id = data.get('user_id')
@@ -80,50 +101,82 @@ def track_click(product_id):
             except ValueError:
                 return jsonify({'error': 'Invalid user_id'}), 400
         
-        # Get session_id (for anonymous users)
-        session_id = data.get('session_id')
-        
-        # Get tracking info from request headers
-        ip_address = request.remote_addr
-        user_agent = request.headers.get('User-Agent', '')
-        referrer = request.headers.get('Referer', '')
+        resolved = link_cache.resolve(product_id, product_link_id)
+        if resolved is None:
+            return jsonify({'error': 'Product not found'}), 404
+        targets, product_link_id, url_to_track = resolved
         
-        # Create affiliate click record
-        click = AffiliateClick(
-            id=uuid.uuid4(),
-            list_id=product.list_id,
-            product_id=product.id,
-            product_link_id=product_link.id if product_link else None,
-            user_id=user_id,
-            url=url_to_track,
-            session_id=session_id,
-            ip_address=ip_address,
-            user_agent=user_agent,
-            referrer=referrer,
-            created_at=datetime.utcnow()
+        # Queue the click; counters and rollups are updated when it is written
+        click_id = _queue_click(
+            product_id, targets, product_link_id, url_to_track,
+            user_id=user_id, session_id=data.get('session_id')
         )
         
-        db.session.add(click)
-        
-        # Increment click count on product link if exists
-        if product_link:
-            product_link.click_count = (product_link.click_count or 0) + 1
-        
-        # Increment click count on product
-        product.click_count = (product.click_count or 0) + 1
-        
-        db.session.commit()
-        
         # Return click ID and URL for frontend to redirect
         return jsonify({
-            'click_id': str(click.id),
+            'click_id': str(click_id),
             'url': url_to_track,
             'message': 'Click tracked'
         }), 200
         
+    except LinkMismatch:
+        return jsonify({'error': 'Product link does not match product'}), 400
     except ValueError:
         return jsonify({'error': 'Invalid product ID'}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@api_bp.route('/go/<product_id>', methods=['GET'])
+@api_bp.route('/go/<product_id>/<link_id>', methods=['GET'])
+def go_to_product(product_id, link_id=None):
+    """
+    Record an affiliate click and 302 straight to the retailer.
+
+    Without a link_id the shopper goes to the product's primary link (or its
+    affiliate URL). Optional ?session_id= and ?user_id= attribute the click.
+    One round trip instead of POST /products/<id>/click plus a client-side
+    redirect.
+    """
+    try:
+        product_id = uuid.UUID(product_id)
+    except ValueError:
+        return jsonify({'error': 'Invalid product ID'}), 400
+    try:
+        product_link_id = uuid.UUID(link_id) if link_id else None
+    except ValueError:
+        return jsonify({'error': 'Invalid link ID'}), 400
+    try:
+        user_id = uuid.UUID(request.args['user_id']) if request.args.get('user_id') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid user_id'}), 400
+    
+    try:
+        resolved = link_cache.resolve(product_id, product_link_id, use_primary=True)
+        if resolved is None:
+            return jsonify({'error': 'Product not found'}), 404
+        targets, product_link_id, url = resolved
+        if not url:
+            return jsonify({'error': 'Product has no affiliate URL'}), 404
+    except LinkMismatch:
+        return jsonify({'error': 'Product link does not match product'}), 400
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error resolving link for product {product_id}: {e}")
+        return jsonify({'error': 'Failed to resolve product link'}), 500
+    
+    # A click we fail to record must not keep the shopper from the retailer
+    try:
+        _queue_click(
+            product_id, targets, product_link_id, url,
+            user_id=user_id, session_id=request.args.get('session_id')
+        )
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error recording click for product {product_id}: {e}")
+    
+    response = redirect(url, code=302)
+    # Every visit must reach us to be counted
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
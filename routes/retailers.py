@@ -6,6 +6,7 @@ from flask import request, jsonify
 from . import api_bp
 from models import db
 from models.retailer import Retailer
+from utils.suggest_index import suggest_index
 import uuid
 import re
 
@@ -87,6 +88,7 @@ def create_retailer():
     
     db.session.add(retailer)
     db.session.commit()
+    suggest_index.sync_retailer(retailer)
     
     return jsonify({
         'message': 'Retailer created successfully',
@@ -2,13 +2,34 @@
 Search routes
 """
 
-from flask import request, jsonify
+from flask import request, jsonify, current_app
 from . import api_bp
-from models import db, List, Product, Category
-from models.retailer import Retailer
-from models.product_link import ProductLink
-from sqlalchemy import or_, and_
-import re
+from utils.search_engine import (
+    parse_query, search_lists, search_products,
+    search_categories, search_retailers,
+    use_fuzzy_threshold, fuzzy_search_lists, fuzzy_search_products,
+    fuzzy_search_categories, fuzzy_search_retailers,
+    retailer_products, category_list_counts
+)
+from utils.suggest_index import suggest_index
+
+@api_bp.route('/search/suggest', methods=['GET'])
+def search_suggest():
+    """Search-as-you-type suggestions for list titles, categories and retailers.
+    
+    Served from the in-memory prefix index (utils/suggest_index.py) - no
+    database queries. Matches any word in the title/name that starts with the
+    typed prefix: "coa" suggests "Best Men's Coats".
+    """
+    query = request.args.get('q', '').strip()
+    try:
+        limit = min(max(int(request.args.get('limit', 5)), 1), 20)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    
+    suggestions = suggest_index.suggest(query, limit=limit)
+    suggestions['query'] = query
+    return jsonify(suggestions)
 
 @api_bp.route('/search', methods=['GET'])
 def search():
@@ -19,228 +40,54 @@ def search():
     - If searching for a category, show lists in that category
     - Also show direct matches on list titles/descriptions
     
-    The search uses flexible word matching:
-    - Exact phrase match (e.g., "mens coat" matches "mens coat...")
-    - Word-by-word match (e.g., "mens coat" matches "best men's coats")
-    - All query words must appear somewhere in the title/description
+    Matching uses Postgres full-text search (see utils/search_engine.py):
+    - Every query word must appear in the title/description (in any order)
+    - English stemming folds plurals and possessives ("mens coat" matches "best men's coats")
+    - Quoted phrases and -exclusions are supported
+    - Results are ordered by ts_rank relevance, then by popularity
+    
+    With ?mode=fuzzy, titles and names are matched by pg_trgm word similarity
+    instead, which also tolerates typos and partial words.
     """
     query = request.args.get('q', '').strip()
+    mode = request.args.get('mode', 'fulltext')
     
     if not query:
         return jsonify({'error': 'Search query required'}), 400
-    
-    # Normalize query to lowercase
-    query_lower = query.lower()
-    
-    # Split into words (split on spaces and hyphens)
-    # This handles "mens coat" -> ["mens", "coat"]
-    query_words = [w.strip() for w in re.split(r'[\s\-]+', query_lower) if w.strip()]
-    
-    # Normalize words: remove apostrophes for better matching
-    # "mens" and "men's" both become "mens" for matching purposes
-    normalized_query_words = []
-    for word in query_words:
-        # Remove apostrophes and the 's' that follows
-        normalized = word.replace("'s", "s").replace("'", "")
-        normalized_query_words.append(normalized)
-    
-    # Create patterns: exact phrase AND word-by-word matching
-    exact_phrase_pattern = f'%{query_lower}%'
-    
-    # Build filters: match exact phrase OR (all words appear in title/description)
-    # For word-by-word: all words must appear (AND logic)
-    title_filters = [List.title.ilike(exact_phrase_pattern)]
-    desc_filters = []
-    
-    if len(normalized_query_words) > 1:
-        # Word-by-word matching: all words must appear
-        # For each word, check multiple variations to handle apostrophes
-        # e.g., "mens" should match "mens", "men's", or "men"
-        word_title_conditions = []
-        for i, norm_word in enumerate(normalized_query_words):
-            orig_word = query_words[i]
-            # Build variations to check - handle apostrophes in both query and database
-            word_variations = [norm_word, orig_word]  # Always check both normalized and original
-            
-            # If word ends with "s", also check without it (e.g., "mens" -> "men")
-            # This helps match "mens" with "men's" in database
-            if norm_word.endswith('s') and len(norm_word) > 1:
-                base_word = norm_word[:-1]  # Remove final 's'
-                word_variations.append(base_word)
-                word_variations.append(f"{base_word}'s")  # Check possessive form
-            
-            # Remove duplicates while preserving order
-            seen = set()
-            unique_variations = []
-            for var in word_variations:
-                if var not in seen:
-                    seen.add(var)
-                    unique_variations.append(var)
-            
-            # Create OR filter for this word's variations
-            word_or_filters = [List.title.ilike(f'%{var}%') for var in unique_variations]
-            if word_or_filters:
-                word_title_conditions.append(or_(*word_or_filters))
+    if mode not in ('fulltext', 'fuzzy'):
+        return jsonify({'error': "mode must be 'fulltext' or 'fuzzy'"}), 400
+    
+    if mode == 'fuzzy':
+        use_fuzzy_threshold(current_app.config.get('SEARCH_FUZZY_THRESHOLD', 0.4))
+        sorted_lists = fuzzy_search_lists(query, limit=15)
+        products = fuzzy_search_products(query, limit=10)
+        categories = fuzzy_search_categories(query, limit=10)
+        retailers = fuzzy_search_retailers(query, limit=10)
+    else:
+        tsquery = parse_query(query)
         
-        # All words must appear (AND logic)
-        if word_title_conditions:
-            title_filters.append(and_(*word_title_conditions))
-        
-        # Same for description
-        word_desc_conditions = []
-        for i, norm_word in enumerate(normalized_query_words):
-            orig_word = query_words[i]
-            word_variations = [norm_word, orig_word]
-            
-            # If word ends with "s", also check without it
-            if norm_word.endswith('s') and len(norm_word) > 1:
-                base_word = norm_word[:-1]
-                word_variations.append(base_word)
-                word_variations.append(f"{base_word}'s")
-            
-            # Remove duplicates
-            seen = set()
-            unique_variations = []
-            for var in word_variations:
-                if var not in seen:
-                    seen.add(var)
-                    unique_variations.append(var)
-            
-            word_or_filters = [List.description.ilike(f'%{var}%') for var in unique_variations]
-            if word_or_filters:
-                word_desc_conditions.append(or_(*word_or_filters))
-        
-        if word_desc_conditions:
-            desc_filters.append(and_(*word_desc_conditions))
-    
-    # Also handle single word case
-    if len(normalized_query_words) == 1:
-        word_pattern = f'%{normalized_query_words[0]}%'
-        title_filters.append(List.title.ilike(word_pattern))
-        desc_filters.append(List.description.ilike(word_pattern))
-    
-    # Add exact phrase match for description
-    desc_filters.append(List.description.ilike(exact_phrase_pattern))
-    
-    # Search lists by title/description
-    lists_by_title = List.query.filter(
-        or_(
-            *title_filters,
-            *desc_filters
-        )
-    ).filter_by(status='approved').all()
-    
-    # Search products - same flexible matching
-    exact_phrase_pattern = f'%{query_lower}%'
-    product_name_filters = [Product.name.ilike(exact_phrase_pattern)]
-    product_desc_filters = [Product.description.ilike(exact_phrase_pattern)]
-    
-    if len(normalized_query_words) > 1:
-        word_name_filters = [Product.name.ilike(f'%{word}%') for word in normalized_query_words]
-        if word_name_filters:
-            product_name_filters.append(and_(*word_name_filters))
+        # Lists matching on their own text, through a product, or through their category
+        sorted_lists = search_lists(tsquery, limit=15)
         
-        word_desc_filters = [Product.description.ilike(f'%{word}%') for word in normalized_query_words]
-        if word_desc_filters:
-            product_desc_filters.append(and_(*word_desc_filters))
-    elif len(normalized_query_words) == 1:
-        word_pattern = f'%{normalized_query_words[0]}%'
-        product_name_filters.append(Product.name.ilike(word_pattern))
-        product_desc_filters.append(Product.description.ilike(word_pattern))
-    
-    products = Product.query.join(
-        List, Product.list_id == List.id
-    ).filter(
-        or_(
-            *product_name_filters,
-            *product_desc_filters
-        )
-    ).filter(
-        List.status == 'approved'  # Only products from approved lists
-    ).limit(20).all()
-    
-    # Get lists that contain matching products
-    product_list_ids = [prod.list_id for prod in products]
-    lists_by_products = List.query.filter(
-        List.id.in_(product_list_ids)
-    ).filter_by(status='approved').all()
-    
-    # Search categories - same flexible matching
-    exact_phrase_pattern = f'%{query_lower}%'
-    category_name_filters = [Category.name.ilike(exact_phrase_pattern)]
-    category_desc_filters = [Category.description.ilike(exact_phrase_pattern)]
-    
-    if len(normalized_query_words) > 1:
-        word_name_filters = [Category.name.ilike(f'%{word}%') for word in normalized_query_words]
-        if word_name_filters:
-            category_name_filters.append(and_(*word_name_filters))
+        # Products from approved lists
+        products = search_products(tsquery, limit=10)
         
-        word_desc_filters = [Category.description.ilike(f'%{word}%') for word in normalized_query_words]
-        if word_desc_filters:
-            category_desc_filters.append(and_(*word_desc_filters))
-    elif len(normalized_query_words) == 1:
-        word_pattern = f'%{normalized_query_words[0]}%'
-        category_name_filters.append(Category.name.ilike(word_pattern))
-        category_desc_filters.append(Category.description.ilike(word_pattern))
-    
-    categories = Category.query.filter(
-        or_(
-            *category_name_filters,
-            *category_desc_filters
-        )
-    ).limit(10).all()
-    
-    # Get lists in matching categories
-    category_ids = [cat.id for cat in categories]
-    lists_by_category = List.query.filter(
-        List.category_id.in_(category_ids)
-    ).filter_by(status='approved').all()
-    
-    # Search retailers - same flexible matching
-    exact_phrase_pattern = f'%{query_lower}%'
-    retailer_name_filters = [Retailer.name.ilike(exact_phrase_pattern)]
-    retailer_desc_filters = [Retailer.description.ilike(exact_phrase_pattern)]
-    
-    if len(normalized_query_words) > 1:
-        word_name_filters = [Retailer.name.ilike(f'%{word}%') for word in normalized_query_words]
-        if word_name_filters:
-            retailer_name_filters.append(and_(*word_name_filters))
+        # Categories
+        categories = search_categories(tsquery, limit=10)
         
-        word_desc_filters = [Retailer.description.ilike(f'%{word}%') for word in normalized_query_words]
-        if word_desc_filters:
-            retailer_desc_filters.append(and_(*word_desc_filters))
-    elif len(normalized_query_words) == 1:
-        word_pattern = f'%{normalized_query_words[0]}%'
-        retailer_name_filters.append(Retailer.name.ilike(word_pattern))
-        retailer_desc_filters.append(Retailer.description.ilike(word_pattern))
+        # Retailers
+        retailers = search_retailers(tsquery, limit=10)
     
-    retailers = Retailer.query.filter(
-        or_(
-            *retailer_name_filters,
-            *retailer_desc_filters
-        )
-    ).filter_by(is_active=True).limit(10).all()
+    # Products linked to each retailer - one windowed query for all of them
+    products_by_retailer = retailer_products([retailer.id for retailer in retailers], per_retailer=10)
     
-    # For each retailer, get products that have product_links to that retailer
     retailers_with_products = []
     for retailer in retailers:
         retailer_dict = retailer.to_dict()
         
-        # Get products that have product_links to this retailer
-        # Join ProductLink with Product and List, filter by retailer_id and list status
-        retailer_products = db.session.query(Product).join(
-            ProductLink, Product.id == ProductLink.product_id
-        ).join(
-            List, Product.list_id == List.id
-        ).filter(
-            ProductLink.retailer_id == retailer.id
-        ).filter(
-            List.status == 'approved'  # Only products from approved lists
-        ).distinct().limit(10).all()
-        
         # Format products with their list info
         products_with_lists = []
-        for prod in retailer_products:
+        for prod in products_by_retailer.get(retailer.id, []):
             product_dict = prod.to_dict()
             # Include basic list info
             if prod.list:
@@ -254,24 +101,12 @@ def search():
         retailer_dict['products'] = products_with_lists
         retailers_with_products.append(retailer_dict)
     
-    # Combine all lists, removing duplicates
-    all_lists = {}
-    for lst in lists_by_title + lists_by_products + lists_by_category:
-        all_lists[str(lst.id)] = lst
-    
-    # Limit to top 15 lists (prioritize those matching multiple criteria)
-    # Sort by: lists matching title first, then by view_count/total_votes
-    sorted_lists = sorted(
-        all_lists.values(),
-        key=lambda x: (
-            str(x.id) not in [str(l.id) for l in lists_by_title],  # Title matches first
-            -(x.view_count + x.total_votes)  # Then by popularity
-        )
-    )[:15]
+    # Approved list counts for all matched categories in one GROUP BY
+    category_counts = category_list_counts(categories)
     
     # For each product, include its list info (only if list is approved)
     products_with_lists = []
-    for prod in products[:10]:  # Limit products displayed
+    for prod in products:
         # Double-check that the product's list is approved (defensive check)
         if prod.list and prod.list.status == 'approved':
             product_dict = prod.to_dict()
@@ -286,8 +121,9 @@ def search():
     return jsonify({
         'lists': [lst.to_dict() for lst in sorted_lists],
         'products': products_with_lists,
-        'categories': [cat.to_dict() for cat in categories],
+        'categories': [cat.to_dict(count_dict=category_counts) for cat in categories],
         'retailers': retailers_with_products,
-        'query': query
+        'query': query,
+        'mode': mode
     })
 
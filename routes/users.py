@@ -4,10 +4,12 @@ User routes
 
 from flask import request, jsonify
 from . import api_bp
-from models import db, User, List, Payout, Conversion
-from sqlalchemy import desc, or_
-from datetime import datetime
+from models import db, User, Payout, Conversion
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import aliased
 import uuid
+from utils.pagination import page_size, keyset_page
+from utils.response_cache import invalidate_creator_lists
 
 @api_bp.route('/users/<user_id>', methods=['GET'])
 def get_user(user_id):
@@ -41,6 +43,8 @@ def update_user(user_id):
             user.profile_picture = data.get('profile_picture')
         
         db.session.commit()
+        # The creator's profile is embedded in their cached lists
+        invalidate_creator_lists(user.id)
         
         return jsonify({
             'message': 'Profile updated',
@@ -63,79 +67,82 @@ def get_cashback_stats(user_id):
     except ValueError:
         return jsonify({'error': 'Invalid user ID'}), 400
 
+def _cashback_transactions(user_id):
+    """
+    Query of (Conversion, cashback Payout or None) for the conversions a user
+    purchased or earned cashback on (they clicked), in one statement: the
+    user's cashback payout is LEFT JOINed and the payout side of the filter
+    is an EXISTS, so the cost doesn't grow with the user's payout count.
+    """
+    def payout_of_user(payout):
+        return and_(
+            payout.conversion_id == Conversion.id,
+            payout.user_id == user_id,
+            payout.payout_type == 'cashback'
+        )
+    
+    # Aliased so the EXISTS correlates with conversions, not the joined payout
+    has_payout = aliased(Payout)
+    return db.session.query(Conversion, Payout).outerjoin(Payout, payout_of_user(Payout)).filter(
+        or_(
+            Conversion.purchaser_id == user_id,
+            db.session.query(has_payout.id).filter(payout_of_user(has_payout)).exists()
+        )
+    )
+
+
+def _transaction_dict(conversion, cashback_payout):
+    conv_dict = conversion.to_dict()
+    if cashback_payout:
+        conv_dict['cashback_payout'] = cashback_payout.to_dict()
+    return conv_dict
+
+
 @api_bp.route('/users/<user_id>/cashback/transactions', methods=['GET'])
 def get_cashback_transactions(user_id):
-    """Get user cashback transaction history (from conversions they made)"""
+    """Get user cashback transaction history (from conversions they made)
+    
+    One page of transactions, newest first. Pass the returned next_cursor as
+    ?cursor= for the next page; ?limit= sets the page size (default 50, max
+    1000). ?include_total=true adds a COUNT of all matches. ?offset= is no
+    longer supported and is rejected.
+    """
+    if request.args.get('offset') is not None:
+        return jsonify({'error': 'offset is not supported; page with cursor'}), 400
+    
     try:
         user = User.query.get_or_404(uuid.UUID(user_id))
-        
-        # Get query parameters
-        status = request.args.get('status')  # Filter by conversion status: pending, approved, paid, cancelled
-        limit = request.args.get('limit', type=int, default=50)
-        offset = request.args.get('offset', type=int, default=0)
-        
-        # Build query - get conversions where this user purchased OR clicked (for cashback)
-        # We check both purchaser_id and payouts to find all relevant conversions
-        
-        # Get conversions where user is purchaser
-        purchaser_conversions = Conversion.query.filter_by(purchaser_id=user.id)
-        
-        # Get conversions where user has cashback payouts (they clicked)
-        cashback_payouts = Payout.query.filter_by(
-            user_id=user.id,
-            payout_type='cashback'
-        ).all()
-        cashback_conversion_ids = [p.conversion_id for p in cashback_payouts if p.conversion_id]
-        
-        # Combine both queries
-        if cashback_conversion_ids:
-            query = Conversion.query.filter(
-                or_(
-                    Conversion.purchaser_id == user.id,
-                    Conversion.id.in_(cashback_conversion_ids)
-                )
-            )
-        else:
-            query = purchaser_conversions
-        
+    except ValueError:
+        return jsonify({'error': 'Invalid user ID'}), 400
+    
+    status = request.args.get('status')  # Filter by conversion status: pending, approved, paid, cancelled
+    
+    try:
+        query = _cashback_transactions(user.id)
         if status:
-            query = query.filter_by(status=status)
+            query = query.filter(Conversion.status == status)
         
-        # Order by created_at descending (most recent first)
-        query = query.order_by(desc(Conversion.created_at))
-        
-        # Get total count before pagination
-        total = query.count()
-        
-        # Apply pagination
-        conversions = query.limit(limit).offset(offset).all()
-        
-        # Get related payouts for each conversion
-        conversion_data = []
-        for conv in conversions:
-            conv_dict = conv.to_dict()
-            
-            # Get the cashback payout for this conversion
-            cashback_payout = Payout.query.filter_by(
-                conversion_id=conv.id,
-                payout_type='cashback',
-                user_id=user.id
-            ).first()
-            
-            if cashback_payout:
-                conv_dict['cashback_payout'] = cashback_payout.to_dict()
-            
-            conversion_data.append(conv_dict)
+        try:
+            limit = page_size(request.args.get('limit'), default=50)
+            transactions, next_cursor = keyset_page(
+                query, Conversion.created_at, Conversion.id,
+                cursor=request.args.get('cursor'), limit=limit
+            )
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor or limit'}), 400
         
-        return jsonify({
-            'transactions': conversion_data,
-            'total': total,
+        result = {
+            'transactions': [_transaction_dict(conv, payout) for conv, payout in transactions],
             'limit': limit,
-            'offset': offset
-        })
-    except ValueError:
-        return jsonify({'error': 'Invalid user ID'}), 400
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
+        }
+        if request.args.get('include_total', 'false').lower() == 'true':
+            result['total'] = query.with_entities(Conversion.id).order_by(None).count()
+        
+        return jsonify(result)
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @api_bp.route('/users/<user_id>/cashback/transactions/<transaction_id>', methods=['GET'])
@@ -145,30 +152,12 @@ def get_cashback_transaction(user_id, transaction_id):
         user = User.query.get_or_404(uuid.UUID(user_id))
         conversion_id = uuid.UUID(transaction_id)
         
-        # Check if user is purchaser or has cashback payout for this conversion
-        conversion = Conversion.query.filter(
-            (Conversion.id == conversion_id) & (
-                (Conversion.purchaser_id == user.id) |
-                (Conversion.id.in_(
-                    db.session.query(Payout.conversion_id).filter_by(
-                        user_id=user.id,
-                        payout_type='cashback'
-                    )
-                ))
-            )
-        ).first_or_404()
-        
-        conv_dict = conversion.to_dict()
-        
-        # Get the cashback payout for this conversion
-        cashback_payout = Payout.query.filter_by(
-            conversion_id=conversion.id,
-            payout_type='cashback',
-            user_id=user.id
-        ).first()
+        # Only conversions the user purchased or has a cashback payout on
+        transaction = _cashback_transactions(user.id).filter(Conversion.id == conversion_id).first()
+        if transaction is None:
+            return jsonify({'error': 'Transaction not found'}), 404
         
-        if cashback_payout:
-            conv_dict['cashback_payout'] = cashback_payout.to_dict()
+        conv_dict = _transaction_dict(*transaction)
         
         return jsonify(conv_dict)
     except ValueError:
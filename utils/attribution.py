@@ -0,0 +1,150 @@
+"""
+Click attribution for conversions
+
+A conversion that arrives without a usable click_id is attributed to the most
+recent unconverted click on the same product and list within
+ATTRIBUTION_WINDOW, limited to the purchaser's own clicks when the purchaser
+is known. Both the single and the batch conversion webhooks use
+match_clicks() for this.
+
+The lookups are served by ix_affiliate_clicks_attribution, a partial index on
+(product_id, list_id, created_at) over unconverted clicks only: converted
+clicks never match again, so they are left out of the index entirely and each
+lookup is a short backward range scan of one product/list, batches included
+(one CROSS JOIN LATERAL probe per key).
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, values, column, or_, true, Integer
+from sqlalchemy.dialects.postgresql import UUID
+from models import db, AffiliateClick
+
+ATTRIBUTION_WINDOW = timedelta(days=30)
+
+_NEWEST_FIRST = (AffiliateClick.created_at.desc(), AffiliateClick.id.desc())
+
+
+def _unconverted_since(since):
+    # Must imply the attribution index predicate (has_converted = false)
+    return [AffiliateClick.has_converted == False, AffiliateClick.created_at >= since]
+
+
+def match_clicks(keys, since=None, exclude=()):
+    """
+    Attribute a batch of conversions to clicks.
+
+    keys is a list of (product_id, list_id, purchaser_id or None). Returns a
+    list of the same length with a (id, user_id) click row or None for each
+    key. Keys are matched in order and each click is matched at most once,
+    so later keys get the next most recent click, just as if the
+    conversions had been processed one at a time. Clicks in `exclude` (e.g.
+    ones referenced explicitly elsewhere in the batch) are never matched.
+    """
+    if not keys:
+        return []
+    since = since or datetime.utcnow() - ATTRIBUTION_WINDOW
+    exclude = set(exclude)
+
+    if len(keys) == 1:
+        return [latest_click_query(*keys[0], since=since, exclude=exclude).first()]
+
+    by_pair, by_user = _candidates(keys, since, spare=len(exclude))
+    matches = []
+    for product_id, list_id, user_id in keys:
+        if user_id:
+            candidates = by_user.get((product_id, list_id, user_id), [])
+        else:
+            candidates = by_pair.get((product_id, list_id), [])
+        click = next((click for click in candidates if click.id not in exclude), None)
+        if click is not None:
+            exclude.add(click.id)
+        matches.append(click)
+    return matches
+
+
+def latest_click_query(product_id, list_id, user_id=None, since=None, exclude=()):
+    """Query for the (id, user_id) of the click one conversion would be attributed to"""
+    since = since or datetime.utcnow() - ATTRIBUTION_WINDOW
+    query = db.session.query(AffiliateClick.id, AffiliateClick.user_id).filter(
+        AffiliateClick.product_id == product_id,
+        AffiliateClick.list_id == list_id,
+        *_unconverted_since(since)
+    )
+    if user_id:
+        query = query.filter(AffiliateClick.user_id == user_id)
+    if exclude:
+        query = query.filter(AffiliateClick.id.notin_(exclude))
+    return query.order_by(*_NEWEST_FIRST).limit(1)
+
+
+def _candidates(keys, since, spare):
+    """
+    The unconverted clicks any key could be matched to, newest first, per
+    (product_id, list_id) and per (product_id, list_id, user_id).
+
+    Each key only needs as many clicks as there are keys that could claim
+    them, so every distinct pair and purchaser is one LATERAL probe of
+    ix_affiliate_clicks_attribution that stops after that many rows.
+    """
+    # Keys on the same product/list compete for the same clicks (and may lose
+    # some to excluded ones), so every key of a pair may need up to that many
+    demand = defaultdict(lambda: spare)
+    for product_id, list_id, _ in keys:
+        demand[(product_id, list_id)] += 1
+
+    probes = {(product_id, list_id, user_id) for product_id, list_id, user_id in keys if user_id}
+    probes.update((product_id, list_id, None) for product_id, list_id in demand)
+    lookups = values(
+        column('product_id', UUID(as_uuid=True)),
+        column('list_id', UUID(as_uuid=True)),
+        column('user_id', UUID(as_uuid=True)),
+        column('demand', Integer),
+        name='attribution_keys'
+    ).data([(*probe, demand[probe[:2]]) for probe in probes])
+
+    latest = (
+        select(AffiliateClick.id, AffiliateClick.user_id, AffiliateClick.created_at)
+        .where(
+            AffiliateClick.product_id == lookups.c.product_id,
+            AffiliateClick.list_id == lookups.c.list_id,
+            or_(lookups.c.user_id.is_(None), AffiliateClick.user_id == lookups.c.user_id),
+            *_unconverted_since(since)
+        )
+        .order_by(*_NEWEST_FIRST)
+        .limit(lookups.c.demand)
+        .lateral('latest')
+    )
+    clicks = db.session.execute(
+        select(
+            lookups.c.product_id,
+            lookups.c.list_id,
+            lookups.c.user_id.label('key_user_id'),
+            latest.c.id,
+            latest.c.user_id
+        )
+        .select_from(lookups.join(latest, true()))
+        .order_by(latest.c.created_at.desc(), latest.c.id.desc())
+    ).all()
+
+    by_pair = defaultdict(list)
+    by_user = defaultdict(list)
+    for click in clicks:
+        if click.key_user_id:
+            by_user[(click.product_id, click.list_id, click.key_user_id)].append(click)
+        else:
+            by_pair[(click.product_id, click.list_id)].append(click)
+    return by_pair, by_user
+
+
+def mark_converted(converted_at_by_click):
+    """
+    Flag clicks as converted ({click_id: converted_at}) in one executemany
+    UPDATE by primary key. Does not commit.
+    """
+    if not converted_at_by_click:
+        return
+    db.session.execute(update(AffiliateClick), [
+        {'id': click_id, 'has_converted': True, 'converted_at': converted_at}
+        for click_id, converted_at in converted_at_by_click.items()
+    ])
@@ -0,0 +1,322 @@
+"""
+Fast-path affiliate click pipeline
+
+POST /products/<id>/click used to load the product and link, insert the click,
+bump two counters and commit before answering. Now (for it and the
+GET /go/<id> redirect):
+
+1. The redirect URL comes from link_cache: two small queries for the
+   product -> (list, affiliate URL, link URLs, primary link) targets. With
+   CLICK_LINK_CACHE_TTL_SECONDS > 0 they are kept in an in-process map and
+   only re-read on a miss. Edits invalidate it only in the process that made
+   them, so the default of 0 (no cache) is the safe setting with several
+   instances or on serverless.
+2. The click is appended to click_queue and the response returns at once.
+3. A background writer drains the queue every CLICK_FLUSH_SECONDS (or sooner
+   once CLICK_FLUSH_EVENTS are pending): one executemany INSERT for all clicks,
+   then one UPDATE ... FROM (VALUES ...) per counter table with the summed
+   deltas, and one upsert into the daily rollups - all in one transaction.
+
+Buffering is opt-in: the default flush interval of 0 writes every click
+through synchronously, which is the only safe setting on serverless hosts
+(Vercel) where instances are frozen or recycled without running the writer
+thread or the exit flush. A click written through that the database rejects
+(e.g. an unknown user_id) raises to the route, so the client gets an error
+rather than a click_id that was never stored. Clicks still queued at
+interpreter exit are flushed. In the background flush a rejected click is
+dropped on its own; a batch that keeps failing is retried at most
+CLICK_FLUSH_MAX_RETRIES times, and once CLICK_QUEUE_MAX_EVENTS are pending
+further clicks are written through instead of queued.
+"""
+
+import atexit
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import insert, update, values, column, func, Integer
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.exc import DBAPIError, OperationalError
+from models import db, Product, ProductLink, AffiliateClick
+from utils.rollups import record_rollup_batch
+
+
+class LinkMismatch(Exception):
+    """A click named a product link that belongs to a different product"""
+
+
+class LinkCache:
+    """product_id -> {'list_id', 'affiliate_url', 'links', 'primary_link_id'} with TTL"""
+
+    def __init__(self, app=None):
+        self.ttl = 0.0
+        self._entries = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = float(app.config.get('CLICK_LINK_CACHE_TTL_SECONDS', 0) or 0)
+        app.extensions['link_cache'] = self
+
+    def get(self, product_id):
+        """Cached redirect targets for a product, or None if it doesn't exist"""
+        with self._lock:
+            entry = self._entries.get(product_id)
+        if entry is not None and time.monotonic() - entry[1] <= self.ttl:
+            return entry[0]
+
+        product = db.session.query(
+            Product.list_id, Product.affiliate_url
+        ).filter(Product.id == product_id).first()
+        if product is None:
+            return None
+        links = db.session.query(ProductLink.id, ProductLink.url, ProductLink.is_primary).filter(
+            ProductLink.product_id == product_id
+        ).all()
+        targets = {
+            'list_id': product.list_id,
+            'affiliate_url': product.affiliate_url,
+            'links': {link.id: link.url for link in links},
+            'primary_link_id': next((link.id for link in links if link.is_primary), None)
+        }
+        if self.ttl:
+            with self._lock:
+                self._entries[product_id] = (targets, time.monotonic())
+        return targets
+
+    def resolve(self, product_id, product_link_id=None, use_primary=False):
+        """
+        (targets, product_link_id, url) for a click on a product, or None if
+        the product doesn't exist.
+
+        Without a product_link_id the click goes to the product's affiliate
+        URL, or with use_primary to its primary link when it has one. An
+        unknown link id also falls back to the affiliate URL. Raises
+        LinkMismatch if the link belongs to another product.
+        """
+        targets = self.get(product_id)
+        if targets is None:
+            return None
+        if product_link_id is None and use_primary:
+            product_link_id = targets['primary_link_id']
+        if product_link_id is None:
+            return targets, None, targets['affiliate_url']
+
+        url = targets['links'].get(product_link_id)
+        if url is None:
+            # Not one of this product's cached links: look it up
+            product_link = db.session.get(ProductLink, product_link_id)
+            if product_link and product_link.product_id != product_id:
+                raise LinkMismatch(product_link_id)
+            if product_link is None:
+                return targets, None, targets['affiliate_url']
+            self.invalidate(product_id)  # Added since the product was cached
+            url = product_link.url
+        return targets, product_link_id, url
+
+    def invalidate(self, product_id):
+        """Forget a product after its URL or links change"""
+        with self._lock:
+            self._entries.pop(product_id, None)
+
+
+class ClickQueue:
+    """In-process buffer of click events drained by a background bulk writer"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.interval = 0.0
+        self.max_events = 0
+        self.max_pending = 0
+        self.max_retries = 0
+        self._pending = []
+        self._attempts = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read flush thresholds from config and register shutdown flush"""
+        self.app = app
+        self.interval = float(app.config.get('CLICK_FLUSH_SECONDS', 0) or 0)
+        self.max_events = int(app.config.get('CLICK_FLUSH_EVENTS', 0) or 0)
+        self.max_pending = int(app.config.get('CLICK_QUEUE_MAX_EVENTS', 10000) or 0)
+        self.max_retries = int(app.config.get('CLICK_FLUSH_MAX_RETRIES', 3) or 0)
+        app.extensions['click_queue'] = self
+        atexit.register(self._flush_in_context)
+
+    @property
+    def is_buffered(self):
+        """A flush interval of 0 disables buffering and writes every click through"""
+        return self.interval > 0
+
+    def record(self, click):
+        """
+        Queue one click (a dict of AffiliateClick column values, including
+        its id) for insertion. When written through, it is inserted and
+        committed before returning and database errors propagate.
+        """
+        with self._lock:
+            # Queue full (the writer is failing or falling behind): write
+            # through so memory stays bounded
+            write_through = not self.is_buffered or (
+                self.max_pending and len(self._pending) >= self.max_pending
+            )
+            if not write_through:
+                self._pending.append(click)
+                self._ensure_worker()
+            threshold_reached = self.max_events and len(self._pending) >= self.max_events
+        if write_through:
+            self._insert([click])
+            return
+        if threshold_reached:
+            self._wakeup.set()
+
+    def flush(self):
+        """
+        Write every queued click. Must be called inside an app context.
+        On failure (e.g. the database is unreachable) the clicks are put back
+        for the next flush, up to max_retries times each.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+        try:
+            written = self._write(pending)
+        except Exception as e:
+            db.session.rollback()
+            retry = []
+            with self._lock:
+                for click in pending:
+                    attempts = self._attempts.get(click['id'], 0) + 1
+                    if attempts > self.max_retries:
+                        self._attempts.pop(click['id'], None)
+                    else:
+                        self._attempts[click['id']] = attempts
+                        retry.append(click)
+                self._pending[:0] = retry
+            print(f"Error flushing clicks ({len(pending) - len(retry)} dropped after retries): {e}")
+            return 0
+        with self._lock:
+            for click in pending:
+                self._attempts.pop(click['id'], None)
+        return written
+
+    def _write(self, clicks):
+        """Insert clicks; rows the database rejects are dropped. Returns the count written."""
+        try:
+            self._insert(clicks)
+            return len(clicks)
+        except OperationalError:
+            # Connection-level failure, not a bad row: let flush() retry
+            raise
+        except DBAPIError:
+            # One bad row (a product or link deleted while its clicks were
+            # queued, an over-long value) fails the batch; write the rest
+            # one by one and drop the rejects
+            db.session.rollback()
+            if len(clicks) == 1:
+                print(f"Dropping click {clicks[0]['id']} rejected by the database")
+                return 0
+        written = 0
+        for click in clicks:
+            try:
+                self._insert([click])
+                written += 1
+            except OperationalError:
+                raise
+            except DBAPIError as e:
+                db.session.rollback()
+                print(f"Dropping click {click['id']} rejected by the database: {e.orig}")
+        return written
+
+    def _insert(self, clicks):
+        # executemany: one INSERT statement, one parameter set per click
+        db.session.execute(insert(AffiliateClick), clicks)
+
+        product_deltas = Counter(click['product_id'] for click in clicks)
+        link_deltas = Counter(click['product_link_id'] for click in clicks if click['product_link_id'])
+        _apply_click_deltas(Product, product_deltas)
+        _apply_click_deltas(ProductLink, link_deltas)
+
+        record_rollup_batch(
+            ((click['created_at'], click['list_id'], click['product_id']) for click in clicks),
+            clicks=1
+        )
+        db.session.commit()
+
+    def _ensure_worker(self):
+        # Caller holds self._lock
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(
+                target=self._run, name='click-writer', daemon=True
+            )
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            # Wake on the interval, or early when the event threshold is hit
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self._flush_in_context()
+
+    def _flush_in_context(self):
+        if self.app is None:
+            return
+        with self.app.app_context():
+            self.flush()
+
+
+def _apply_click_deltas(model, deltas):
+    """click_count += delta for many rows in one UPDATE ... FROM (VALUES ...)"""
+    if not deltas:
+        return
+    rows = values(
+        column('id', UUID(as_uuid=True)),
+        column('delta', Integer),
+        name='click_deltas'
+    ).data(list(deltas.items()))
+    db.session.execute(
+        update(model)
+        .where(model.id == rows.c.id)
+        .values(click_count=func.coalesce(model.click_count, 0) + rows.c.delta)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _clip(value, column_name):
+    """Truncate a free-form request value to its AffiliateClick column length"""
+    if value is None:
+        return None
+    return str(value)[:AffiliateClick.__table__.c[column_name].type.length]
+
+
+def new_click(product_id, list_id, url, product_link_id=None, user_id=None,
+              session_id=None, ip_address=None, user_agent=None, referrer=None):
+    """
+    Column values for one AffiliateClick row, with its id assigned up front.
+    Header and query values are truncated to fit their columns.
+    """
+    return {
+        'id': uuid.uuid4(),
+        'list_id': list_id,
+        'product_id': product_id,
+        'product_link_id': product_link_id,
+        'user_id': user_id,
+        'url': url,
+        'session_id': _clip(session_id, 'session_id'),
+        'ip_address': _clip(ip_address, 'ip_address'),
+        'user_agent': _clip(user_agent, 'user_agent'),
+        'referrer': _clip(referrer, 'referrer'),
+        'has_converted': False,
+        'created_at': datetime.utcnow()
+    }
+
+
+link_cache = LinkCache()
+click_queue = ClickQueue()
@@ -0,0 +1,299 @@
+"""
+Bulk conversion ingestion
+
+POST /conversions/webhook handles one conversion per call, with a handful of
+queries each. Affiliate networks deliver nightly reports of thousands of rows,
+so POST /conversions/webhook/batch runs the same rules over a whole report
+with a fixed number of statements:
+
+1. one query for (network, external_id) pairs that were already processed
+2. one query each for the products, lists, purchasers (by id or email) and
+   explicitly referenced clicks
+3. one windowed query for attribution candidates (utils/attribution.py)
+4. one executemany INSERT ... ON CONFLICT DO NOTHING RETURNING for the
+   conversions
+5. one executemany INSERT for the payouts, the balance ledger entries for
+   them, one bulk UPDATE for the attributed clicks and one rollup upsert
+
+All of it happens in a single transaction. (network, external_id) is unique,
+so when a network retries a report that is still being ingested, the rows the
+first delivery inserted since step 1 conflict and are reported as duplicates
+instead of being inserted (and paid) twice. Each row gets its own result, in
+input order; a row that doesn't fit the conversion columns is an error
+before anything is written.
+"""
+
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+import uuid
+from sqlalchemy import insert, tuple_, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models import db, Conversion, AffiliateClick, User, Product, List, Payout
+from utils.attribution import match_clicks, mark_converted
+from utils.ledger import record_payout_changes
+from utils.rollups import record_rollups
+
+class RowError(Exception):
+    """A batch row that can't be ingested; the message goes into its result"""
+
+
+def _parse_uuid(value):
+    try:
+        return uuid.UUID(str(value)) if value else None
+    except ValueError:
+        return None
+
+
+def _parse_amount(value, column, name):
+    """Decimal for a money/rate field, checked to fit its NUMERIC(precision, scale) column"""
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        raise RowError(f'{name} must be a number')
+    if not amount.is_finite():
+        raise RowError(f'{name} must be a finite number')
+    bound = Decimal(10) ** (column.type.precision - column.type.scale)
+    if abs(amount) >= bound or abs(amount.quantize(Decimal(1).scaleb(-column.type.scale))) >= bound:
+        raise RowError(f'{name} must be less than {bound} in absolute value')
+    return amount
+
+
+def _parse_text(value, column, name):
+    """String for a text field, checked to fit its VARCHAR column"""
+    value = str(value)
+    if len(value) > column.type.length:
+        raise RowError(f'{name} must be at most {column.type.length} characters')
+    return value
+
+
+def _parse_row(data):
+    """Validate one webhook row the way conversion_webhook does"""
+    if not isinstance(data, dict):
+        raise RowError('Row must be an object')
+
+    external_id = data.get('external_id')
+    revenue = data.get('revenue')
+    commission = data.get('commission')
+    if not external_id or revenue is None or commission is None:
+        raise RowError('Missing required fields: external_id, revenue, commission')
+
+    if not data.get('product_id') or not data.get('list_id'):
+        raise RowError('Missing product_id or list_id')
+    product_id = _parse_uuid(data['product_id'])
+    list_id = _parse_uuid(data['list_id'])
+    if not product_id or not list_id:
+        raise RowError('Invalid product_id or list_id format')
+
+    revenue = _parse_amount(revenue, Conversion.revenue, 'revenue')
+    commission = _parse_amount(commission, Conversion.commission, 'commission')
+    commission_rate = _parse_amount(data.get('commission_rate', 0), Conversion.commission_rate, 'commission_rate')
+
+    converted_at = datetime.utcnow()
+    if data.get('converted_at'):
+        try:
+            converted_at = datetime.fromisoformat(data['converted_at'].replace('Z', '+00:00'))
+        except (ValueError, AttributeError):
+            pass
+
+    return {
+        'external_id': _parse_text(external_id, Conversion.external_id, 'external_id'),
+        'network': _parse_text(data.get('network', 'unknown'), Conversion.network, 'network'),
+        'revenue': revenue,
+        'commission': commission,
+        'commission_rate': commission_rate,
+        'currency': _parse_text(data.get('currency', 'USD'), Conversion.currency, 'currency'),
+        'converted_at': converted_at,
+        'product_id': product_id,
+        'list_id': list_id,
+        'purchaser_id': _parse_uuid(data.get('purchaser_id')),
+        'purchaser_email': data.get('purchaser_email'),
+        'click_id': _parse_uuid(data.get('click_id'))
+    }
+
+
+def _existing_conversions(rows):
+    """(network, external_id) -> id of conversions already stored"""
+    keys = {(row['network'], row['external_id']) for row in rows}
+    if not keys:
+        return {}
+    found = db.session.query(
+        Conversion.network, Conversion.external_id, Conversion.id
+    ).filter(
+        tuple_(Conversion.network, Conversion.external_id).in_(keys)
+    ).all()
+    existing = {}
+    for network, external_id, conversion_id in found:
+        existing.setdefault((network, external_id), conversion_id)
+    return existing
+
+
+def _insert_conversions(rows, cashback_percentage, creator_payout_percentage):
+    """
+    Insert the rows' conversions in one executemany INSERT ... ON CONFLICT
+    (network, external_id) DO NOTHING. Returns the ids actually inserted.
+    """
+    if not rows:
+        return set()
+    stmt = pg_insert(Conversion).on_conflict_do_nothing(
+        index_elements=['network', 'external_id']
+    ).returning(Conversion.id)
+    return set(db.session.execute(stmt, [
+        {
+            'id': row['id'],
+            'click_id': row['click'].id if row['click'] else None,
+            'list_id': row['list_id'],
+            'product_id': row['product_id'],
+            'purchaser_id': row['purchaser_id'],
+            'revenue': row['revenue'],
+            'commission': row['commission'],
+            'commission_rate': row['commission_rate'],
+            'currency': row['currency'],
+            'network': row['network'],
+            'external_id': row['external_id'],
+            'converted_at': row['converted_at'],
+            'status': 'pending',
+            'cashback_percentage': cashback_percentage,
+            'creator_payout_percentage': creator_payout_percentage
+        }
+        for row in rows
+    ]).scalars())
+
+
+def ingest_conversions(payload, cashback_percentage, creator_payout_percentage):
+    """
+    Ingest a list of webhook rows and commit. Returns one result dict per
+    row, in input order, with 'status' of 'created', 'duplicate' or 'error'.
+    """
+    results = [None] * len(payload)
+    rows = []
+    for index, data in enumerate(payload):
+        try:
+            row = _parse_row(data)
+        except RowError as e:
+            results[index] = {'index': index, 'status': 'error', 'error': str(e)}
+            continue
+        row['index'] = index
+        rows.append(row)
+
+    # 1. Set-based lookups
+    existing = _existing_conversions(rows)
+    product_ids = {row['product_id'] for row in rows}
+    list_ids = {row['list_id'] for row in rows}
+    purchaser_ids = {row['purchaser_id'] for row in rows if row['purchaser_id']}
+    emails = {row['purchaser_email'] for row in rows if row['purchaser_email']}
+    click_ids = {row['click_id'] for row in rows if row['click_id']}
+
+    known_products = {pid for (pid,) in db.session.query(Product.id).filter(Product.id.in_(product_ids))} \
+        if product_ids else set()
+    list_creators = dict(db.session.query(List.id, List.creator_id).filter(List.id.in_(list_ids))) \
+        if list_ids else {}
+    # Purchasers by id and by email in one query; an id with no user is
+    # treated as missing (it would violate the foreign key on insert)
+    known_users = db.session.query(User.id, User.email).filter(
+        or_(User.id.in_(purchaser_ids), User.email.in_(emails))
+    ).all() if purchaser_ids or emails else []
+    known_user_ids = {user.id for user in known_users}
+    users_by_email = {user.email: user.id for user in known_users}
+    referenced_clicks = {
+        click.id: click for click in db.session.query(
+            AffiliateClick.id, AffiliateClick.user_id
+        ).filter(AffiliateClick.id.in_(click_ids))
+    } if click_ids else {}
+
+    # 2. Duplicates (against stored conversions and earlier rows) and missing
+    #    products/lists, in input order
+    valid = []
+    for row in rows:
+        key = (row['network'], row['external_id'])
+        if key in existing:
+            results[row['index']] = {
+                'index': row['index'],
+                'status': 'duplicate',
+                'conversion_id': str(existing[key])
+            }
+            continue
+        if row['product_id'] not in known_products or row['list_id'] not in list_creators:
+            results[row['index']] = {
+                'index': row['index'], 'status': 'error', 'error': 'Product or list not found'
+            }
+            continue
+        row['id'] = existing[key] = uuid.uuid4()
+        if row['purchaser_id'] not in known_user_ids:
+            row['purchaser_id'] = users_by_email.get(row['purchaser_email'])
+        row['click'] = referenced_clicks.get(row['click_id'])
+        valid.append(row)
+
+    # 3. Attribution for rows without a known click, in input order
+    unmatched = [row for row in valid if row['click'] is None]
+    matches = match_clicks(
+        [(row['product_id'], row['list_id'], row['purchaser_id']) for row in unmatched],
+        exclude={row['click'].id for row in valid if row['click'] is not None}
+    )
+    for row, click in zip(unmatched, matches):
+        row['click'] = click
+
+    # 4. Conversions. Rows a concurrent delivery inserted since step 1
+    #    conflict on (network, external_id) and become duplicates
+    inserted = _insert_conversions(valid, cashback_percentage, creator_payout_percentage)
+    raced = [row for row in valid if row['id'] not in inserted]
+    if raced:
+        stored = _existing_conversions(raced)
+        for row in raced:
+            conversion_id = stored.get((row['network'], row['external_id']))
+            results[row['index']] = {
+                'index': row['index'],
+                'status': 'duplicate',
+                'conversion_id': str(conversion_id) if conversion_id else None
+            }
+        valid = [row for row in valid if row['id'] in inserted]
+
+    # 5. Payouts, attributed clicks and rollups of the inserted conversions
+    payouts, converted_clicks, rollups = [], {}, []
+    for row in valid:
+        click = row['click']
+        clicker_user_id = click.user_id if click else None
+        if click:
+            converted_clicks[click.id] = row['converted_at']
+
+        cashback_amount = (row['commission'] * cashback_percentage) / Decimal('100')
+        creator_payout_amount = (row['commission'] * creator_payout_percentage) / Decimal('100')
+        creator_id = list_creators[row['list_id']]
+        for user_id, payout_type, amount in (
+            (clicker_user_id, 'cashback', cashback_amount),
+            (creator_id, 'creator', creator_payout_amount)
+        ):
+            if user_id:
+                payouts.append({
+                    'id': uuid.uuid4(),
+                    'user_id': user_id,
+                    'list_id': row['list_id'],
+                    'conversion_id': row['id'],
+                    'payout_type': payout_type,
+                    'amount': amount,
+                    'status': 'pending',
+                    'currency': row['currency']
+                })
+
+        rollups.append((row['converted_at'], row['list_id'], row['product_id'], {
+            'conversions': 1, 'revenue': row['revenue'], 'commission': row['commission']
+        }))
+        results[row['index']] = {
+            'index': row['index'],
+            'status': 'created',
+            'conversion_id': str(row['id']),
+            'purchaser_id': str(row['purchaser_id']) if row['purchaser_id'] else None,
+            'clicker_user_id': str(clicker_user_id) if clicker_user_id else None,
+            'cashback_amount': float(cashback_amount) if clicker_user_id else None,
+            'creator_payout_amount': float(creator_payout_amount) if creator_id else None
+        }
+
+    if payouts:
+        db.session.execute(insert(Payout), payouts)
+        record_payout_changes(
+            (payout['id'], payout['user_id'], payout['payout_type'], payout['amount'], None, payout['status'])
+            for payout in payouts
+        )
+    mark_converted(converted_clicks)
+    record_rollups(rollups)
+    db.session.commit()
+    return results
@@ -0,0 +1,57 @@
+"""
+Atomic counter updates
+
+Counters such as votes, clicks and views are bumped with a single
+`UPDATE ... SET col = col + delta ... RETURNING col` statement instead of a
+read-modify-write on an ORM-loaded row, so concurrent requests never lose
+increments and the row lock is held only for the one statement.
+"""
+
+from sqlalchemy import update, func
+from sqlalchemy.orm.attributes import set_committed_value
+from models import db
+
+
+def increment_counters(model, pk, **deltas):
+    """
+    Atomically add deltas to integer counter columns of one row.
+
+    Args:
+        model: Model class (must have an `id` primary key)
+        pk: Primary key of the row to update
+        **deltas: column_name=delta pairs, e.g. upvotes=1, downvotes=-1
+
+    Returns:
+        dict: The new column values as returned by the database, or None if
+              the row does not exist. Zero deltas are skipped.
+
+    Any instance of the row already loaded in the session is updated in place
+    with the returned values, so callers can keep using it without a refresh.
+    Does not commit; the caller owns the transaction.
+    """
+    columns = {name: delta for name, delta in deltas.items() if delta}
+    if not columns:
+        return {}
+
+    stmt = update(model).where(
+        model.id == pk
+    ).values({
+        name: func.coalesce(getattr(model, name), 0) + delta
+        for name, delta in columns.items()
+    }).returning(
+        *[getattr(model, name) for name in columns]
+    ).execution_options(synchronize_session=False)
+
+    row = db.session.execute(stmt).first()
+    if row is None:
+        return None
+
+    new_values = dict(zip(columns, row))
+
+    # Keep any loaded instance in sync without issuing another SELECT
+    instance = db.session.identity_map.get(db.session.identity_key(model, pk))
+    if instance is not None:
+        for name, value in new_values.items():
+            set_committed_value(instance, name, value)
+
+    return new_values
@@ -0,0 +1,149 @@
+"""
+Admin dashboard analytics
+
+Builds the GET /admin/analytics/dashboard payload in four queries:
+- every total and 30-day trend, as one SELECT of per-table aggregates using
+  COUNT(*) FILTER (WHERE ...) instead of a COUNT query per number
+- the daily clicks/conversions series, as generate_series() LEFT JOINed to a
+  GROUP BY day instead of two COUNT queries per day
+- the top lists by clicks
+- the most recent conversions
+
+Click, conversion and vote figures come from the daily_rollups table (see
+utils/rollups.py) rather than the raw event tables, so 30-day trends are
+counted in whole UTC days.
+"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import func, desc, select, true, cast, Date
+from models import db, User, List, Conversion, DailyRollup
+from utils.snapshot_cache import SnapshotCache
+
+TREND_DAYS = 30
+
+
+def _totals(since):
+    """All dashboard counters in one round trip"""
+    users = select(
+        func.count().label('users'),
+        func.count().filter(User.created_at >= since).label('recent_users')
+    ).select_from(User).subquery()
+
+    lists = select(
+        func.count().label('lists'),
+        func.count().filter(List.status == 'pending').label('pending_lists'),
+        func.count().filter(List.status == 'approved').label('approved_lists'),
+        func.count().filter(List.status == 'rejected').label('rejected_lists'),
+        func.count().filter(List.created_at >= since).label('recent_lists')
+    ).select_from(List).subquery()
+
+    since_day = since.date()
+    rollups = select(
+        func.coalesce(func.sum(DailyRollup.upvotes + DailyRollup.downvotes), 0).label('votes'),
+        func.coalesce(func.sum(DailyRollup.clicks), 0).label('clicks'),
+        func.coalesce(func.sum(DailyRollup.clicks).filter(DailyRollup.day >= since_day), 0).label('recent_clicks'),
+        func.coalesce(func.sum(DailyRollup.conversions), 0).label('conversions'),
+        func.coalesce(
+            func.sum(DailyRollup.conversions).filter(DailyRollup.day >= since_day), 0
+        ).label('recent_conversions'),
+        func.sum(DailyRollup.revenue).label('revenue'),
+        func.sum(DailyRollup.commission).label('commission')
+    ).select_from(DailyRollup).subquery()
+
+    # Each subquery is a single row, so joining them ON true is just a row merge
+    row = db.session.execute(
+        select(users, lists, rollups)
+        .select_from(users)
+        .join(lists, true())
+        .join(rollups, true())
+    ).mappings().one()
+    return row
+
+
+def _daily_stats(days, now):
+    """Clicks and conversions per UTC day for the last `days` days, oldest first"""
+    last_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    first_day = last_day - timedelta(days=days - 1)
+
+    calendar = select(
+        func.generate_series(first_day, last_day, timedelta(days=1)).label('day')
+    ).subquery()
+
+    daily = select(
+        DailyRollup.day,
+        func.sum(DailyRollup.clicks).label('clicks'),
+        func.sum(DailyRollup.conversions).label('conversions')
+    ).where(DailyRollup.day >= first_day.date()).group_by(DailyRollup.day).subquery()
+
+    rows = db.session.execute(
+        select(
+            calendar.c.day,
+            func.coalesce(daily.c.clicks, 0),
+            func.coalesce(daily.c.conversions, 0)
+        ).select_from(calendar)
+        .outerjoin(daily, daily.c.day == cast(calendar.c.day, Date))
+        .order_by(calendar.c.day)
+    ).all()
+
+    return [{
+        'date': day.strftime('%Y-%m-%d'),
+        'clicks': clicks,
+        'conversions': conversions
+    } for day, clicks, conversions in rows]
+
+
+def build_dashboard():
+    """Compute the full dashboard payload"""
+    now = datetime.utcnow()
+    totals = _totals(now - timedelta(days=TREND_DAYS))
+
+    # Top performing lists (by clicks)
+    top_lists = db.session.query(
+        List.id,
+        List.title,
+        List.slug,
+        func.sum(DailyRollup.clicks).label('click_count')
+    ).join(
+        DailyRollup, List.id == DailyRollup.list_id
+    ).group_by(
+        List.id, List.title, List.slug
+    ).having(
+        func.sum(DailyRollup.clicks) > 0
+    ).order_by(
+        desc('click_count')
+    ).limit(10).all()
+
+    recent_conversions = Conversion.query.order_by(desc(Conversion.converted_at)).limit(10).all()
+
+    return {
+        'totals': {
+            'users': totals['users'],
+            'lists': totals['lists'],
+            'pending_lists': totals['pending_lists'],
+            'approved_lists': totals['approved_lists'],
+            'rejected_lists': totals['rejected_lists'],
+            'votes': totals['votes'],
+            'clicks': totals['clicks'],
+            'conversions': totals['conversions'],
+            'revenue': float(totals['revenue']) if totals['revenue'] else 0,
+            'commission': float(totals['commission']) if totals['commission'] else 0
+        },
+        'recent_trends': {
+            'users': totals['recent_users'],
+            'lists': totals['recent_lists'],
+            'clicks': totals['recent_clicks'],
+            'conversions': totals['recent_conversions']
+        },
+        'top_lists': [{
+            'id': str(lst.id),
+            'title': lst.title,
+            'slug': lst.slug,
+            'clicks': lst.click_count
+        } for lst in top_lists],
+        'recent_conversions': [conv.to_dict() for conv in recent_conversions],
+        'daily_stats': _daily_stats(TREND_DAYS, now)
+    }
+
+
+# Last computed dashboard, served stale-while-revalidate (DASHBOARD_CACHE_* config)
+dashboard_snapshot = SnapshotCache('dashboard', build_dashboard, 'DASHBOARD_CACHE')
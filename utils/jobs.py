@@ -0,0 +1,344 @@
+"""
+Durable background jobs
+
+Heavy work (bulk settlement, trending and rollup rebuilds) can be enqueued
+instead of run inside the request. Jobs are rows in the jobs table: they are
+enqueued in the caller's transaction, survive restarts and need no broker.
+`python manage.py run_jobs` runs the workers:
+
+- claim: one UPDATE ... WHERE id IN (SELECT ... FOR UPDATE SKIP LOCKED)
+  RETURNING, so concurrent workers (threads or processes) never claim the
+  same job and never wait on each other's row locks
+- run: the handler registered under the job's name is called with the JSON
+  payload as keyword arguments; its return value is stored as the result
+- retry: a failed attempt is queued again after JOB_BACKOFF_SECONDS,
+  doubling per attempt up to JOB_BACKOFF_MAX_SECONDS, until max_attempts;
+  then the job stays failed with the error
+- heartbeat: while the handler runs, a side thread refreshes the job's
+  locked_at every third of JOB_LOCK_TIMEOUT_SECONDS, so a long job (e.g. a
+  full backfill_rollups) is never mistaken for a lost one
+- recovery: a running job whose locked_at is older than
+  JOB_LOCK_TIMEOUT_SECONDS (its worker died) is queued again, or failed if
+  out of attempts
+
+Handlers register with @job_queue.handler('name'). A worker can die after a
+handler commits but before the job is marked done, so handlers must be safe
+to run twice (the built-in ones below are).
+"""
+
+from datetime import datetime, timedelta, date
+import json
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+from sqlalchemy import select, update, case
+from models import db, Job
+from utils.settlement import transition_conversions
+from utils.trending import refresh_trending
+from utils.rollups import backfill_rollups
+
+# Longest error text kept on a job
+MAX_ERROR_LENGTH = 2000
+
+
+class JobQueue:
+    """Registry of job handlers plus enqueue, claim and worker loop over the jobs table"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.handlers = {}
+        self.workers = 2
+        self.poll_interval = 1.0
+        self.max_attempts = 5
+        self.backoff = 10.0
+        self.backoff_max = 3600.0
+        self.lock_timeout = 600.0
+        self._counts_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read worker and retry settings from config"""
+        self.app = app
+        self.workers = int(app.config.get('JOB_WORKERS', 2) or 1)
+        self.poll_interval = float(app.config.get('JOB_POLL_SECONDS', 1.0))
+        self.max_attempts = int(app.config.get('JOB_MAX_ATTEMPTS', 5))
+        self.backoff = float(app.config.get('JOB_BACKOFF_SECONDS', 10))
+        self.backoff_max = float(app.config.get('JOB_BACKOFF_MAX_SECONDS', 3600))
+        self.lock_timeout = float(app.config.get('JOB_LOCK_TIMEOUT_SECONDS', 600))
+        app.extensions['job_queue'] = self
+
+    def handler(self, name):
+        """Decorator registering a function as the handler for jobs named `name`"""
+        def register(func):
+            self.handlers[name] = func
+            return func
+        return register
+
+    def enqueue(self, name, payload=None, delay=0, max_attempts=None):
+        """
+        Add a job to the session and return it. The job is committed with the
+        caller's transaction, so it only exists if the caller's work does.
+        """
+        if name not in self.handlers:
+            raise ValueError(f'Unknown job: {name}')
+        now = datetime.utcnow()
+        job = Job(
+            id=uuid.uuid4(),
+            name=name,
+            payload=json.dumps(payload or {}, default=str),
+            status='queued',
+            attempts=0,
+            max_attempts=max_attempts or self.max_attempts,
+            run_at=now + timedelta(seconds=delay),
+            created_at=now
+        )
+        db.session.add(job)
+        return job
+
+    def backoff_delay(self, attempts):
+        """Seconds to wait before retrying a job that has failed `attempts` times"""
+        return min(self.backoff * 2 ** (attempts - 1), self.backoff_max)
+
+    def claim(self, worker_id, limit=1):
+        """
+        Lock up to `limit` due jobs for this worker, oldest first, and commit.
+        Returns the (id, name, payload, attempts, max_attempts) rows claimed.
+        """
+        now = datetime.utcnow()
+        due = (
+            select(Job.id)
+            .where(Job.status == 'queued', Job.run_at <= now)
+            .order_by(Job.run_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        claimed = db.session.execute(
+            update(Job)
+            .where(Job.id.in_(due))
+            .values(status='running', attempts=Job.attempts + 1, locked_by=worker_id, locked_at=now)
+            .returning(Job.id, Job.name, Job.payload, Job.attempts, Job.max_attempts)
+            .execution_options(synchronize_session=False)
+        ).all()
+        db.session.commit()
+        return claimed
+
+    def run(self, job, worker_id):
+        """Run one claimed job and record its outcome. Returns 'done', 'retried' or 'failed'."""
+        finished = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat, args=(job, worker_id, finished),
+            name=f'job-heartbeat-{job.id}', daemon=True
+        )
+        heartbeat.start()
+        error = None
+        try:
+            handler = self.handlers.get(job.name)
+            if handler is None:
+                raise LookupError(f'No handler registered for job {job.name}')
+            result = handler(**json.loads(job.payload or '{}'))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            error = e
+        finally:
+            finished.set()
+            heartbeat.join()
+        if error is not None:
+            return self._record_failure(job, worker_id, error)
+
+        self._finish(job, worker_id, status='done', result=json.dumps(result, default=str),
+                     last_error=None, finished_at=datetime.utcnow())
+        return 'done'
+
+    def _heartbeat(self, job, worker_id, finished):
+        # Runs in its own thread, so in its own app context and session: the
+        # handler's transaction is never committed or blocked by the refresh
+        with self.app.app_context():
+            while not finished.wait(self.lock_timeout / 3):
+                try:
+                    db.session.execute(
+                        update(Job)
+                        .where(Job.id == job.id, Job.status == 'running', Job.locked_by == worker_id)
+                        .values(locked_at=datetime.utcnow())
+                        .execution_options(synchronize_session=False)
+                    )
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Job {job.name} {job.id} heartbeat failed: {e}")
+
+    def _record_failure(self, job, worker_id, error):
+        message = f'{type(error).__name__}: {error}'[:MAX_ERROR_LENGTH]
+        if job.attempts >= job.max_attempts:
+            print(f"Job {job.name} {job.id} failed after {job.attempts} attempts: {message}")
+            self._finish(job, worker_id, status='failed', last_error=message, finished_at=datetime.utcnow())
+            return 'failed'
+
+        delay = self.backoff_delay(job.attempts)
+        print(f"Job {job.name} {job.id} attempt {job.attempts} failed, retrying in {delay:g}s: {message}")
+        self._finish(job, worker_id, status='queued', last_error=message,
+                     run_at=datetime.utcnow() + timedelta(seconds=delay))
+        return 'retried'
+
+    def _finish(self, job, worker_id, **values):
+        # Only while this worker still holds the job: after a lock timeout it
+        # may have been requeued and claimed by another worker
+        db.session.execute(
+            update(Job)
+            .where(Job.id == job.id, Job.status == 'running', Job.locked_by == worker_id)
+            .values(locked_by=None, locked_at=None, **values)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+    def requeue_stale(self):
+        """
+        Queue again (or fail, when out of attempts) the jobs whose worker
+        has held them longer than the lock timeout. Commits. Returns the count.
+        """
+        now = datetime.utcnow()
+        out_of_attempts = Job.attempts >= Job.max_attempts
+        stale = db.session.execute(
+            update(Job)
+            .where(Job.status == 'running', Job.locked_at < now - timedelta(seconds=self.lock_timeout))
+            .values(
+                status=case((out_of_attempts, 'failed'), else_='queued'),
+                finished_at=case((out_of_attempts, now), else_=None),
+                last_error='Worker lost: lock timed out',
+                locked_by=None,
+                locked_at=None,
+                run_at=now
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return stale.rowcount
+
+    def work(self, worker_id, stop, counts, once=False):
+        """
+        Claim and run jobs one at a time until `stop` is set, or with `once`
+        until no job is due. Outcomes are tallied into `counts`.
+        """
+        with self.app.app_context():
+            while not stop.is_set():
+                try:
+                    claimed = self.claim(worker_id)
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Job worker {worker_id} could not claim jobs: {e}")
+                    claimed = []
+                if not claimed:
+                    if once:
+                        return
+                    stop.wait(self.poll_interval)
+                    continue
+                for job in claimed:
+                    outcome = self.run(job, worker_id)
+                    with self._counts_lock:
+                        counts[outcome] += 1
+
+    def run_workers(self, concurrency=None, once=False):
+        """
+        Run `concurrency` worker threads (default JOB_WORKERS) until SIGINT or
+        SIGTERM, or with `once` until the queue has no due jobs. A running job
+        is finished before its worker stops. Returns the outcome counts.
+        """
+        concurrency = concurrency or self.workers
+        stop = threading.Event()
+        counts = {'done': 0, 'retried': 0, 'failed': 0}
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+
+        with self.app.app_context():
+            self.requeue_stale()
+
+        threads = [
+            threading.Thread(
+                target=self.work, args=(f'{prefix}:{index}', stop, counts, once),
+                name=f'job-worker-{index}', daemon=True
+            )
+            for index in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+
+        # Check for jobs abandoned by dead workers about once a minute
+        checked_at = time.monotonic()
+        try:
+            while not stop.is_set() and any(thread.is_alive() for thread in threads):
+                stop.wait(self.poll_interval)
+                if time.monotonic() - checked_at >= min(self.lock_timeout, 60):
+                    with self.app.app_context():
+                        self.requeue_stale()
+                    checked_at = time.monotonic()
+        except KeyboardInterrupt:
+            stop.set()
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return counts
+
+
+job_queue = JobQueue()
+
+
+# Built-in jobs. Each returns a JSON-serializable summary stored as the result.
+
+@job_queue.handler('settle_conversions')
+def settle_conversions_job(conversion_ids):
+    """Mark conversions paid and credit balances (conversions already paid are left unchanged, so reruns are no-ops)"""
+    result = transition_conversions(
+        'paid', conversion_ids=[uuid.UUID(str(conversion_id)) for conversion_id in conversion_ids]
+    )
+    return {
+        'paid_conversion_ids': [str(conversion_id) for conversion_id in result['transitioned']],
+        'already_paid': [str(conversion_id) for conversion_id in result['unchanged']],
+        'invalid': [str(conversion_id) for conversion_id in result['invalid']],
+        'not_found': result['not_found'],
+        'payouts_processed': result['payouts'],
+        'users_credited': result['users'],
+        'total_cashback_paid': str(result['cashback']),
+        'total_creator_paid': str(result['creator'])
+    }
+
+
+@job_queue.handler('transition_conversions')
+def transition_conversions_job(status, conversion_ids=(), network=None, external_ids=()):
+    """Move conversions to a lifecycle status (conversions already there are left unchanged)"""
+    result = transition_conversions(
+        status,
+        conversion_ids=[uuid.UUID(str(conversion_id)) for conversion_id in conversion_ids],
+        network=network,
+        external_ids=[str(external_id) for external_id in external_ids]
+    )
+    return {
+        'status': status,
+        'transitioned': [str(conversion_id) for conversion_id in result['transitioned']],
+        'unchanged': [str(conversion_id) for conversion_id in result['unchanged']],
+        'invalid': [str(conversion_id) for conversion_id in result['invalid']],
+        'not_found': result['not_found'],
+        'payouts_updated': result['payouts'],
+        'users_credited': result['users'],
+        'total_cashback_paid': str(result['cashback']),
+        'total_creator_paid': str(result['creator'])
+    }
+
+
+@job_queue.handler('refresh_trending')
+def refresh_trending_job(half_life_hours=None):
+    """Rebuild the trending lists snapshot"""
+    return {'lists': refresh_trending(half_life_hours=half_life_hours)}
+
+
+@job_queue.handler('backfill_rollups')
+def backfill_rollups_job(start=None, end=None):
+    """Rebuild daily rollups for [start, end] (YYYY-MM-DD strings, None = unbounded)"""
+    start_day = date.fromisoformat(start) if start else None
+    end_day = date.fromisoformat(end) if end else None
+    return {'rows': backfill_rollups(start_day, end_day)}
@@ -0,0 +1,177 @@
+"""
+Payout balance ledger
+
+Every payout status change (creation included) appends a balance_ledger
+entry: amount moves out of the bucket of the old status and into the bucket
+of the new one. user_balances keeps each user's bucket totals, updated in the
+same transaction as the entries, so GET /users/<id>/cashback/stats is a
+primary-key lookup instead of SUM queries over payouts.
+
+Buckets, per payout type (cashback / creator):
+- pending or processing -> <type>_pending
+- paid                  -> cashback_earned / creator_paid
+- failed                -> none (the amount just leaves pending)
+
+Payout status must only change through move_payouts() or, for new payouts,
+record_payout_changes(). `python manage.py reconcile_balances` re-sums the
+ledger and compares it with user_balances and with the payouts themselves.
+"""
+
+from collections import Counter
+from datetime import datetime
+import uuid
+from sqlalchemy import insert as core_insert, update, select, func, case, literal, union_all, and_
+from sqlalchemy.dialects.postgresql import insert
+from models import db, Payout, BalanceLedgerEntry, UserBalance
+
+BALANCE_COLUMNS = ('cashback_pending', 'cashback_earned', 'creator_pending', 'creator_paid')
+
+
+def _bucket(payout_type, status):
+    """user_balances column a payout's amount counts towards, or None"""
+    if status in ('pending', 'processing'):
+        return f'{payout_type}_pending'
+    if status == 'paid':
+        return 'cashback_earned' if payout_type == 'cashback' else 'creator_paid'
+    return None
+
+
+def record_payout_changes(changes):
+    """
+    Append ledger entries for payout status changes and apply them to the
+    users' balances. changes is an iterable of (payout_id, user_id,
+    payout_type, amount, from_status, to_status); from_status is None for a
+    new payout. Does not commit.
+    """
+    now = datetime.utcnow()
+    entries = []
+    deltas = {}
+    for payout_id, user_id, payout_type, amount, from_status, to_status in changes:
+        entries.append({
+            'id': uuid.uuid4(),
+            'user_id': user_id,
+            'payout_id': payout_id,
+            'payout_type': payout_type,
+            'amount': amount,
+            'from_status': from_status,
+            'to_status': to_status,
+            'created_at': now
+        })
+        user_deltas = deltas.setdefault(user_id, Counter())
+        for status, sign in ((from_status, -1), (to_status, 1)):
+            column = _bucket(payout_type, status)
+            if column:
+                user_deltas[column] += sign * amount
+    if not entries:
+        return
+
+    db.session.execute(core_insert(BalanceLedgerEntry), entries)
+
+    columns = sorted({column for user_deltas in deltas.values() for column in user_deltas})
+    if not columns:
+        return
+    stmt = insert(UserBalance).values([
+        {'user_id': user_id, 'updated_at': now, **{column: user_deltas.get(column, 0) for column in columns}}
+        for user_id, user_deltas in deltas.items()
+    ])
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['user_id'],
+        set_={
+            **{column: getattr(UserBalance, column) + stmt.excluded[column] for column in columns},
+            'updated_at': now
+        }
+    ))
+
+
+def move_payouts(conversion_ids, from_status, to_status, **values):
+    """
+    Move the conversions' payouts in from_status to to_status (plus any
+    extra column values) in one UPDATE ... RETURNING, and record the moves
+    in the ledger. Returns the (id, user_id, payout_type, amount) rows
+    moved. Does not commit.
+    """
+    if not conversion_ids:
+        return []
+    moved = db.session.execute(
+        update(Payout)
+        .where(Payout.conversion_id.in_(conversion_ids), Payout.status == from_status)
+        .values(status=to_status, **values)
+        .returning(Payout.id, Payout.user_id, Payout.payout_type, Payout.amount)
+        .execution_options(synchronize_session=False)
+    ).all()
+    record_payout_changes(
+        (payout.id, payout.user_id, payout.payout_type, payout.amount, from_status, to_status)
+        for payout in moved
+    )
+    return moved
+
+
+def _ledger_totals():
+    """Per-user bucket totals re-summed from the ledger"""
+    signed = []
+    for status_column, sign in ((BalanceLedgerEntry.from_status, -1), (BalanceLedgerEntry.to_status, 1)):
+        signed.append(select(
+            BalanceLedgerEntry.user_id,
+            BalanceLedgerEntry.payout_type,
+            status_column.label('status'),
+            (BalanceLedgerEntry.amount * literal(sign)).label('amount')
+        ).where(status_column.isnot(None)))
+    moves = union_all(*signed).subquery()
+
+    sums = []
+    for column in BALANCE_COLUMNS:
+        payout_type = column.split('_')[0]
+        statuses = ('pending', 'processing') if column.endswith('_pending') else ('paid',)
+        sums.append(func.coalesce(func.sum(case(
+            (and_(moves.c.payout_type == payout_type, moves.c.status.in_(statuses)), moves.c.amount)
+        )), 0).label(column))
+    return select(moves.c.user_id, *sums).group_by(moves.c.user_id)
+
+
+def reconcile_balances(fix=False):
+    """
+    Compare user_balances with the ledger, and the ledger with the payouts.
+
+    Returns (balance_mismatches, payout_mismatches): lists of
+    (user_id, column, summary value, ledger value) and of
+    (payout_id, payout status, last ledger status). With fix=True,
+    user_balances is rebuilt from the ledger (and committed).
+    """
+    ledger = {row.user_id: row for row in db.session.execute(_ledger_totals())}
+    summaries = {row.user_id: row for row in UserBalance.query.all()}
+
+    balance_mismatches = []
+    for user_id in ledger.keys() | summaries.keys():
+        for column in BALANCE_COLUMNS:
+            expected = getattr(ledger.get(user_id), column, 0) or 0
+            actual = getattr(summaries.get(user_id), column, 0) or 0
+            if expected != actual:
+                balance_mismatches.append((user_id, column, actual, expected))
+
+    # Every payout's newest ledger entry must end in its current status
+    latest = select(
+        BalanceLedgerEntry.payout_id,
+        BalanceLedgerEntry.to_status,
+        func.row_number().over(
+            partition_by=BalanceLedgerEntry.payout_id,
+            order_by=BalanceLedgerEntry.sequence.desc()
+        ).label('position')
+    ).where(BalanceLedgerEntry.payout_id.isnot(None)).subquery()
+    payout_mismatches = db.session.execute(
+        select(Payout.id, Payout.status, latest.c.to_status)
+        .outerjoin(latest, (latest.c.payout_id == Payout.id) & (latest.c.position == 1))
+        .where(latest.c.to_status.is_distinct_from(Payout.status))
+    ).all()
+
+    if fix and balance_mismatches:
+        now = datetime.utcnow()
+        db.session.query(UserBalance).delete(synchronize_session=False)
+        rows = [
+            {'user_id': user_id, 'updated_at': now, **{column: getattr(row, column) for column in BALANCE_COLUMNS}}
+            for user_id, row in ledger.items()
+        ]
+        if rows:
+            db.session.execute(core_insert(UserBalance), rows)
+        db.session.commit()
+
+    return balance_mismatches, [tuple(row) for row in payout_mismatches]
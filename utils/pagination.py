@@ -0,0 +1,126 @@
+"""
+Keyset (cursor) pagination and streaming export helpers
+
+Keyset pagination continues from the last row seen - WHERE (created_at, id) <
+(:last_created_at, :last_id) - so every page costs the same index range scan,
+unlike OFFSET which re-reads every skipped row. Cursors are opaque url-safe
+tokens encoding the sort key of the last row on the page.
+
+Timestamps may be NULL. Postgres sorts those first under DESC (a backward scan
+of the (created_at, id) index), so they make up the first pages, ordered by id,
+and a cursor taken on one of them carries a null timestamp.
+"""
+
+import base64
+import csv
+import io
+import json
+import uuid
+from datetime import datetime
+from flask import Response, stream_with_context
+from sqlalchemy import tuple_, or_, and_
+from sqlalchemy.engine import Row
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Rows fetched per round trip from the server-side cursor when streaming
+STREAM_BATCH_SIZE = 1000
+
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor token that wasn't produced by encode_cursor()"""
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Parse a ?limit= value, clamped to [1, maximum]"""
+    if value in (None, ''):
+        return default
+    return min(max(int(value), 1), maximum)
+
+
+def encode_cursor(created_at, row_id):
+    raw = json.dumps([created_at.isoformat() if created_at is not None else None, str(row_id)])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return (created_at, id) from a cursor token; created_at may be None"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if created_at is not None:
+            created_at = datetime.fromisoformat(created_at)
+        return created_at, uuid.UUID(row_id)
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def keyset_page(query, timestamp_column, id_column, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    One page of `query`, newest first, continuing after `cursor`.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page. For a
+    query of several entities (e.g. query(Conversion, Payout)) the sort key
+    is read from the first one.
+    """
+    if cursor:
+        after_timestamp, after_id = decode_cursor(cursor)
+        if after_timestamp is None:
+            # Rest of the NULL-timestamp rows, then every dated one
+            query = query.filter(or_(
+                and_(timestamp_column.is_(None), id_column < after_id),
+                timestamp_column.isnot(None)
+            ))
+        else:
+            # NULL timestamps compare as NULL here, and they came first anyway
+            query = query.filter(tuple_(timestamp_column, id_column) < tuple_(after_timestamp, after_id))
+
+    # Fetch one extra row to know whether another page exists
+    rows = query.order_by(
+        timestamp_column.desc().nulls_first(), id_column.desc()
+    ).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    if isinstance(last, Row):
+        last = last[0]
+    return rows, encode_cursor(
+        getattr(last, timestamp_column.key), getattr(last, id_column.key)
+    )
+
+
+def stream_export(rows, serialize, fieldnames, export_format, filename):
+    """
+    Stream rows as NDJSON or CSV without holding them in memory.
+
+    `rows` should be a lazily fetched iterable (e.g. a query executed with
+    yield_per) and `serialize` turns one row into a dict.
+    """
+    def generate_ndjson():
+        for row in rows:
+            yield json.dumps(serialize(row)) + '\n'
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(serialize(row))
+            # Flush the buffer every row so memory stays flat
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    if export_format == 'csv':
+        body, mimetype = generate_csv(), 'text/csv'
+    else:
+        body, mimetype = generate_ndjson(), 'application/x-ndjson'
+
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
@@ -0,0 +1,194 @@
+"""
+Request profiler
+
+When PROFILER_ENABLED is set, every request records:
+- the number of SQL statements and the time spent in them (SQLAlchemy
+  before/after_cursor_execute events)
+- the time spent encoding the JSON response
+- the remaining Python time (total - db - serialization)
+
+Each response gets a Server-Timing header (visible in browser dev tools) and
+per-route latency histograms are kept in memory for GET /admin/metrics. With
+PROFILER_LOG_REQUESTS, a JSON line per request also goes to the
+`votestuff.profiler` logger.
+
+When disabled nothing is registered, so it adds no overhead.
+"""
+
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from flask import g, request, has_request_context
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from models import db
+
+logger = logging.getLogger('votestuff.profiler')
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class ProfilingJSONProvider(DefaultJSONProvider):
+    """Default JSON provider that also times response encoding"""
+
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            profile = _current_profile()
+            if profile is not None:
+                profile['serialize_ms'] += (time.perf_counter() - started) * 1000
+
+
+def _current_profile():
+    if not has_request_context():
+        return None  # Background workers (re-rank queue, view flusher) aren't profiled
+    return g.get('_profile')
+
+
+class RouteStats:
+    """Latency histogram and SQL totals for one route"""
+
+    def __init__(self):
+        self.count = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total_ms = 0.0
+        self.db_ms = 0.0
+        self.serialize_ms = 0.0
+        self.statements = 0
+        self.max_statements = 0
+        self.max_ms = 0.0
+
+    def record(self, profile, total_ms):
+        self.count += 1
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, total_ms)] += 1
+        self.total_ms += total_ms
+        self.db_ms += profile['db_ms']
+        self.serialize_ms += profile['serialize_ms']
+        self.statements += profile['statements']
+        self.max_statements = max(self.max_statements, profile['statements'])
+        self.max_ms = max(self.max_ms, total_ms)
+
+    def to_dict(self):
+        count = self.count or 1
+        bounds = [f'le_{bound}ms' for bound in LATENCY_BUCKETS_MS] + ['gt_5000ms']
+        return {
+            'requests': self.count,
+            'avg_ms': round(self.total_ms / count, 2),
+            'max_ms': round(self.max_ms, 2),
+            'avg_db_ms': round(self.db_ms / count, 2),
+            'avg_serialize_ms': round(self.serialize_ms / count, 2),
+            'avg_statements': round(self.statements / count, 2),
+            'max_statements': self.max_statements,
+            'latency_histogram': dict(zip(bounds, self.buckets))
+        }
+
+
+class RequestProfiler:
+    """Per-request SQL/serialization/Python timing with per-route aggregates"""
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.log_requests = False
+        self._routes = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get('PROFILER_ENABLED'))
+        self.log_requests = bool(app.config.get('PROFILER_LOG_REQUESTS'))
+        app.extensions['profiler'] = self
+        if not self.enabled:
+            return
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(engine, 'handle_error', self._handle_error)
+
+        if self.log_requests and not logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+
+        app.json = ProfilingJSONProvider(app)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    def _start_request(self):
+        g._profile = {
+            'started': time.perf_counter(),
+            'statements': 0,
+            'db_ms': 0.0,
+            'serialize_ms': 0.0
+        }
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('profiler_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['profiler_started'].pop()
+        profile = _current_profile()
+        if profile is not None:
+            profile['statements'] += 1
+            profile['db_ms'] += (time.perf_counter() - started) * 1000
+
+    def _handle_error(self, exception_context):
+        # A failed statement never reaches after_cursor_execute
+        conn = exception_context.connection
+        if conn is not None and conn.info.get('profiler_started'):
+            conn.info['profiler_started'].pop()
+
+    def _finish_request(self, response):
+        profile = g.pop('_profile', None)
+        if profile is None:
+            return response
+
+        total_ms = (time.perf_counter() - profile['started']) * 1000
+        python_ms = max(total_ms - profile['db_ms'] - profile['serialize_ms'], 0.0)
+        response.headers['Server-Timing'] = ', '.join([
+            f'db;dur={profile["db_ms"]:.2f};desc="{profile["statements"]} queries"',
+            f'serialize;dur={profile["serialize_ms"]:.2f}',
+            f'app;dur={python_ms:.2f}',
+            f'total;dur={total_ms:.2f}'
+        ])
+
+        route = f'{request.method} {request.url_rule.rule if request.url_rule else "<unmatched>"}'
+        with self._lock:
+            self._routes.setdefault(route, RouteStats()).record(profile, total_ms)
+
+        if self.log_requests:
+            logger.info(json.dumps({
+                'route': route,
+                'path': request.path,
+                'status': response.status_code,
+                'statements': profile['statements'],
+                'db_ms': round(profile['db_ms'], 2),
+                'serialize_ms': round(profile['serialize_ms'], 2),
+                'python_ms': round(python_ms, 2),
+                'total_ms': round(total_ms, 2)
+            }))
+        return response
+
+    def metrics(self):
+        """Per-route aggregates for this worker process, slowest average first"""
+        with self._lock:
+            routes = {route: stats.to_dict() for route, stats in self._routes.items()}
+        return {
+            'enabled': self.enabled,
+            'routes': dict(sorted(routes.items(), key=lambda item: -item[1]['avg_ms']))
+        }
+
+    def reset(self):
+        with self._lock:
+            self._routes = {}
+
+
+profiler = RequestProfiler()
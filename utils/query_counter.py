@@ -0,0 +1,43 @@
+"""
+SQL statement counting helper
+
+Used by the benchmark CLI commands in manage.py to show how many round trips
+a code path makes against the database.
+"""
+
+from contextlib import contextmanager
+from sqlalchemy import event
+from models import db
+
+
+class QueryCounter:
+    """Accumulates the SQL statements executed while it is active"""
+    
+    def __init__(self):
+        self.statements = []
+    
+    @property
+    def count(self):
+        return len(self.statements)
+    
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+@contextmanager
+def count_queries(engine=None):
+    """
+    Count SQL statements sent to the database inside a `with` block.
+    
+    Usage:
+        with count_queries() as counter:
+            rank_list(list_id)
+        print(counter.count)
+    """
+    engine = engine or db.engine
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter._on_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter._on_execute)
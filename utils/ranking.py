@@ -0,0 +1,112 @@
+"""
+Product ranking engine for lists
+
+Ranks every product in a list with a constant number of SQL statements,
+regardless of how many products the list contains.
+"""
+
+from sqlalchemy import select, update, func, case, literal, inspect
+from models import db, Product, Vote, List
+import uuid
+
+
+def _ranked_products_subquery(list_id):
+    """
+    Build a subquery that yields (product_id, rank) for every product in a list.
+
+    Ranking priority (same rules documented on the List/Product models):
+    1. Net score (upvotes - downvotes), descending
+    2. Upvote percentage, descending
+    3. Most recent upvote timestamp, descending (products with no upvotes last)
+
+    The latest upvote per product comes from a single grouped aggregate over
+    the votes table, so the whole list is scored in one pass.
+    """
+    upvotes = func.coalesce(Product.upvotes, 0)
+    downvotes = func.coalesce(Product.downvotes, 0)
+    total = upvotes + downvotes
+
+    net_score = upvotes - downvotes
+    upvote_percentage = case(
+        (total == 0, literal(0.0)),
+        else_=(upvotes * 100.0) / total
+    )
+
+    # Most recent upvote per product - one GROUP BY for the whole list
+    latest_upvotes = select(
+        Vote.product_id.label('product_id'),
+        func.max(Vote.created_at).label('last_upvote_at')
+    ).where(
+        Vote.list_id == list_id,
+        Vote.vote_type == 'up'
+    ).group_by(Vote.product_id).subquery()
+
+    rank = func.row_number().over(
+        order_by=(
+            net_score.desc(),
+            upvote_percentage.desc(),
+            latest_upvotes.c.last_upvote_at.desc().nulls_last(),
+            # Deterministic final tie-break so equal products keep a stable order
+            Product.created_at.asc(),
+            Product.id.asc()
+        )
+    )
+
+    return select(
+        Product.id.label('product_id'),
+        rank.label('rank')
+    ).outerjoin(
+        latest_upvotes, latest_upvotes.c.product_id == Product.id
+    ).where(
+        Product.list_id == list_id
+    ).subquery()
+
+
+def rank_list(list_id):
+    """
+    Recalculate product ranks and the total_votes counter for a list.
+
+    Issues exactly two statements, whatever the list size:
+    - one UPDATE ... FROM (ranked aggregate) that writes the rank of the
+      products whose rank changed (only those rows get a new updated_at)
+    - one UPDATE that refreshes lists.total_votes from the product counters
+
+    Does not commit; the caller owns the transaction.
+    """
+    if not isinstance(list_id, uuid.UUID):
+        list_id = uuid.UUID(str(list_id))
+
+    ranked = _ranked_products_subquery(list_id)
+
+    db.session.execute(
+        update(Product)
+        .where(
+            Product.id == ranked.c.product_id,
+            # Skip rows whose rank is unchanged: no write, no WAL, no updated_at bump
+            Product.rank.is_distinct_from(ranked.c.rank)
+        )
+        .values(rank=ranked.c.rank)
+        .execution_options(synchronize_session=False)
+    )
+
+    total_votes = select(
+        func.coalesce(func.sum(
+            func.coalesce(Product.upvotes, 0) + func.coalesce(Product.downvotes, 0)
+        ), 0)
+    ).where(Product.list_id == list_id).scalar_subquery()
+
+    db.session.execute(
+        update(List)
+        .where(List.id == list_id)
+        .values(total_votes=total_votes)
+        .execution_options(synchronize_session=False)
+    )
+
+    # Rows were updated in SQL; make sure loaded objects pick up the new values.
+    # Read the already-loaded state so this never triggers a refresh query itself.
+    for obj in list(db.session.identity_map.values()):
+        loaded = inspect(obj).dict
+        if isinstance(obj, Product) and loaded.get('list_id') == list_id:
+            db.session.expire(obj, ['rank'])
+        elif isinstance(obj, List) and loaded.get('id') == list_id:
+            db.session.expire(obj, ['total_votes'])
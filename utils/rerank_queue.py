@@ -0,0 +1,100 @@
+"""
+Coalescing background re-rank queue
+
+Votes mark their list as dirty instead of re-ranking inline. A single daemon
+worker waits for the coalescing window to pass, then re-ranks every dirty list
+once - so a burst of hundreds of votes on a viral list costs one re-rank.
+
+Coalescing is opt-in (RERANK_COALESCE_SECONDS > 0) because it needs a
+long-running process: on serverless hosts the worker thread is frozen with the
+instance. With the default window of 0, mark_dirty() re-ranks inline.
+"""
+
+import atexit
+import threading
+import time
+from models import db
+from utils.ranking import rank_list
+from utils.response_cache import list_cache
+
+
+class RerankQueue:
+    """Per-list dirty set drained by a background worker thread"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.window = 0.0
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read the coalescing window from config and register shutdown flush"""
+        self.app = app
+        self.window = float(app.config.get('RERANK_COALESCE_SECONDS', 0) or 0)
+        app.extensions['rerank_queue'] = self
+        atexit.register(self.flush)
+
+    @property
+    def is_async(self):
+        """A window of 0 disables the worker and re-ranks inline"""
+        return self.window > 0
+
+    def mark_dirty(self, list_id):
+        """
+        Schedule a re-rank for a list.
+
+        Returns True if the re-rank was deferred to the worker, False if it
+        already ran synchronously (coalescing disabled).
+        """
+        if not self.is_async:
+            self._rerank(list_id)
+            return False
+
+        with self._lock:
+            self._dirty.add(list_id)
+            self._ensure_worker()
+        self._wakeup.set()
+        return True
+
+    def flush(self):
+        """Re-rank every dirty list right now (used on shutdown)"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        for list_id in dirty:
+            self._rerank_in_context(list_id)
+
+    def _ensure_worker(self):
+        # Caller holds self._lock
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(
+                target=self._run, name='rerank-worker', daemon=True
+            )
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            # Let the burst accumulate before draining
+            time.sleep(self.window)
+            self._wakeup.clear()
+            self.flush()
+
+    def _rerank_in_context(self, list_id):
+        with self.app.app_context():
+            self._rerank(list_id)
+
+    def _rerank(self, list_id):
+        try:
+            rank_list(list_id)
+            db.session.commit()
+            list_cache.invalidate(list_id)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error updating ranking for list {list_id}: {e}")
+
+
+rerank_queue = RerankQueue()
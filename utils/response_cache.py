@@ -0,0 +1,212 @@
+"""
+Versioned response cache
+
+Serialized responses are cached under a key made of the entity id and a
+per-entity version number. Invalidating an entity just bumps its version, so
+a response built from data read before the change can never be served after
+it - even if it is written to the cache late.
+
+Backends:
+- 'none': caching disabled. The default unless a Redis URL is configured,
+  because a per-process cache can serve stale data on multi-worker hosts.
+- 'memory': in-process LRU. Invalidation is local to the process, so with
+  several workers other processes may serve an entry until its TTL.
+- 'redis': shared across processes (the default when LIST_CACHE_REDIS_URL or
+  REDIS_URL is set). Requires the optional `redis` package.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCacheBackend:
+    """Thread-safe in-process LRU cache with per-entry TTL"""
+
+    def __init__(self, max_entries=1000, max_counters=None):
+        self.max_entries = max_entries
+        self.max_counters = max_counters or max_entries * 10
+        self._entries = OrderedDict()
+        # Versions are drawn from one increasing sequence. When there are too
+        # many, the least recently bumped half is dropped and every dropped or
+        # unseen key reads as the floor: the sequence value at the time of the
+        # prune, which is newer than any version a dropped key held, so a
+        # stale entry can never match it again
+        self._counters = OrderedDict()
+        self._sequence = 0
+        self._floor = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_counter(self, key):
+        with self._lock:
+            return self._counters.get(key, self._floor)
+
+    def incr(self, key):
+        with self._lock:
+            self._sequence += 1
+            self._counters[key] = self._sequence
+            self._counters.move_to_end(key)
+            if len(self._counters) > self.max_counters:
+                for _ in range(len(self._counters) // 2):
+                    self._counters.popitem(last=False)
+                self._floor = self._sequence
+            return self._sequence
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCacheBackend:
+    """Shared cache backed by Redis (values are stored as JSON)"""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError(
+                "LIST_CACHE_BACKEND='redis' requires the redis package (pip install redis)"
+            )
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self._client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        self._client.set(key, json.dumps(value), ex=int(ttl) if ttl else None)
+
+    def get_counter(self, key):
+        raw = self._client.get(key)
+        return int(raw) if raw is not None else 0
+
+    def incr(self, key):
+        return self._client.incr(key)
+
+    def __len__(self):
+        return 0  # Not tracked for a shared backend
+
+
+class ResponseCache:
+    """Cache of serialized responses keyed by (entity id, version)"""
+
+    def __init__(self, namespace, config_prefix, app=None):
+        self.namespace = namespace
+        self.config_prefix = config_prefix
+        self.backend = None
+        self.ttl = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._stats_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Pick the backend from <PREFIX>_BACKEND and related config keys"""
+        prefix = self.config_prefix
+        redis_url = app.config.get(f'{prefix}_REDIS_URL')
+        backend = (app.config.get(f'{prefix}_BACKEND') or ('redis' if redis_url else 'none')).lower()
+        self.ttl = app.config.get(f'{prefix}_TTL_SECONDS') or None
+
+        if backend == 'memory':
+            self.backend = LRUCacheBackend(app.config.get(f'{prefix}_MAX_ENTRIES', 1000))
+        elif backend == 'redis':
+            self.backend = RedisCacheBackend(redis_url)
+        elif backend == 'none':
+            self.backend = None
+        else:
+            raise ValueError(f"Unknown {prefix}_BACKEND: {backend}")
+
+        app.extensions[f'{self.namespace}_cache'] = self
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def _version_key(self, entity_id):
+        return f'{self.namespace}:version:{entity_id}'
+
+    def _entry_key(self, entity_id, version):
+        return f'{self.namespace}:{entity_id}:v{version}'
+
+    def get(self, entity_id, version=None):
+        """Return the cached response for the entity's current version, or None"""
+        if not self.enabled:
+            return None
+        if version is None:
+            version = self.version(entity_id)
+        value = self.backend.get(self._entry_key(entity_id, version))
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def version(self, entity_id):
+        """Current version of an entity; read it before loading data to cache"""
+        if not self.enabled:
+            return 0
+        return self.backend.get_counter(self._version_key(entity_id))
+
+    def set(self, entity_id, value, version):
+        """Store a response built from data read at `version`"""
+        if not self.enabled:
+            return
+        self.backend.set(self._entry_key(entity_id, version), value, self.ttl)
+
+    def invalidate(self, entity_id):
+        """Drop the cached response for an entity by bumping its version"""
+        if not self.enabled or entity_id is None:
+            return
+        self.backend.incr(self._version_key(entity_id))
+        with self._stats_lock:
+            self.invalidations += 1
+
+    def stats(self):
+        """Hit/miss counters for this process"""
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'backend': type(self.backend).__name__ if self.enabled else None,
+                'entries': len(self.backend) if self.enabled else 0,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0
+            }
+
+
+# Cache for GET /lists/<list_id> responses
+list_cache = ResponseCache('list', 'LIST_CACHE')
+
+
+def invalidate_creator_lists(user_id):
+    """Drop cached lists that embed this user as their creator (call after a user edit commits)"""
+    if not list_cache.enabled:
+        return
+    from models import List
+    for (list_id,) in List.query.with_entities(List.id).filter(List.creator_id == user_id):
+        list_cache.invalidate(list_id)
@@ -0,0 +1,176 @@
+"""
+Daily analytics rollups
+
+daily_rollups holds per day x list x product totals of clicks, conversions
+(count, revenue, commission) and votes, so dashboards and analytics read a few
+hundred pre-aggregated rows instead of scanning affiliate_clicks, conversions
+and votes.
+
+The write paths (conversion_webhook, vote_product) call record_rollup() in
+the same transaction as the event they record, and the click writer calls
+record_rollup_batch() in the same transaction as its bulk insert, so the
+rollups never drift from the raw tables. backfill_rollups() rebuilds a day
+range from the raw tables (`python manage.py backfill_rollups`).
+"""
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func, cast, select, Date, text
+from sqlalchemy.dialects.postgresql import insert
+from models import db, DailyRollup, AffiliateClick, Conversion, Vote
+
+ROLLUP_KEY = ('day', 'list_id', 'product_id')
+
+
+def _utc_day(when):
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc)
+    return when.date()
+
+
+def _upsert(stmt, columns):
+    """ON CONFLICT (day, list_id, product_id) add the new values to the existing row"""
+    return stmt.on_conflict_do_update(
+        index_elements=list(ROLLUP_KEY),
+        set_={
+            **{column: getattr(DailyRollup, column) + stmt.excluded[column] for column in columns},
+            'updated_at': datetime.utcnow()
+        }
+    )
+
+
+def record_rollup(when, list_id, product_id, **deltas):
+    """
+    Add deltas (clicks=1, upvotes=-1, revenue=Decimal(...), ...) to the rollup
+    row for the product on the UTC day of `when`. Does not commit.
+    """
+    deltas = {column: delta for column, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    stmt = insert(DailyRollup).values(
+        day=_utc_day(when),
+        list_id=list_id,
+        product_id=product_id,
+        updated_at=datetime.utcnow(),
+        **deltas
+    )
+    db.session.execute(_upsert(stmt, deltas.keys()))
+
+
+def record_rollup_batch(events, **deltas):
+    """
+    Add the same deltas (e.g. clicks=1) once per (when, list_id, product_id)
+    event. See record_rollups(). Does not commit.
+    """
+    record_rollups((when, list_id, product_id, deltas) for when, list_id, product_id in events)
+
+
+def record_rollups(entries):
+    """
+    Add per-event deltas for many (when, list_id, product_id, deltas) entries
+    as one multi-row upsert, with entries pre-summed per rollup row.
+    Does not commit.
+    """
+    rows = {}
+    columns = set()
+    for when, list_id, product_id, deltas in entries:
+        key = (_utc_day(when), list_id, product_id)
+        row = rows.setdefault(key, Counter())
+        row.update(deltas)
+        columns.update(deltas)
+    if not rows:
+        return
+    now = datetime.utcnow()
+    stmt = insert(DailyRollup).values([
+        {
+            **dict(zip(ROLLUP_KEY, key)),
+            **{column: row.get(column, 0) for column in columns},
+            'updated_at': now
+        } for key, row in rows.items()
+    ])
+    db.session.execute(_upsert(stmt, columns))
+
+
+def _in_range(column, start_day, end_day):
+    conditions = [column.isnot(None)]
+    if start_day:
+        conditions.append(column >= start_day)
+    if end_day:
+        conditions.append(column < end_day + timedelta(days=1))
+    return conditions
+
+
+def backfill_rollups(start_day=None, end_day=None):
+    """
+    Rebuild rollups for [start_day, end_day] (dates; None = unbounded) from
+    the raw tables and commit. Returns the number of rollup rows in the range.
+
+    The rollup table is locked for the rebuild, so events recorded
+    concurrently wait and are added on top of the rebuilt rows rather than
+    being counted twice or lost. Surviving votes are attributed to the day
+    they were cast.
+    """
+    db.session.execute(text('LOCK TABLE daily_rollups IN EXCLUSIVE MODE'))
+    db.session.query(DailyRollup).filter(
+        *_in_range(DailyRollup.day, start_day, end_day)
+    ).delete(synchronize_session=False)
+
+    click_day = cast(AffiliateClick.created_at, Date)
+    clicks = select(
+        click_day, AffiliateClick.list_id, AffiliateClick.product_id, func.count()
+    ).where(
+        *_in_range(AffiliateClick.created_at, start_day, end_day)
+    ).group_by(click_day, AffiliateClick.list_id, AffiliateClick.product_id)
+
+    conversion_day = cast(Conversion.converted_at, Date)
+    conversions = select(
+        conversion_day, Conversion.list_id, Conversion.product_id, func.count(),
+        func.coalesce(func.sum(Conversion.revenue), 0),
+        func.coalesce(func.sum(Conversion.commission), 0)
+    ).where(
+        *_in_range(Conversion.converted_at, start_day, end_day)
+    ).group_by(conversion_day, Conversion.list_id, Conversion.product_id)
+
+    vote_day = cast(Vote.created_at, Date)
+    votes = select(
+        vote_day, Vote.list_id, Vote.product_id,
+        func.count().filter(Vote.vote_type == 'up'),
+        func.count().filter(Vote.vote_type == 'down')
+    ).where(
+        *_in_range(Vote.created_at, start_day, end_day)
+    ).group_by(vote_day, Vote.list_id, Vote.product_id)
+
+    for columns, source in (
+        (['clicks'], clicks),
+        (['conversions', 'revenue', 'commission'], conversions),
+        (['upvotes', 'downvotes'], votes),
+    ):
+        stmt = insert(DailyRollup).from_select([*ROLLUP_KEY, *columns], source)
+        db.session.execute(_upsert(stmt, columns))
+
+    row_count = db.session.query(func.count()).select_from(DailyRollup).filter(
+        *_in_range(DailyRollup.day, start_day, end_day)
+    ).scalar()
+    db.session.commit()
+    return row_count
+
+
+def daily_totals(start_day, end_day, list_id=None, product_id=None):
+    """Per-day sums over [start_day, end_day], optionally for one list or product"""
+    query = db.session.query(
+        DailyRollup.day,
+        func.sum(DailyRollup.clicks).label('clicks'),
+        func.sum(DailyRollup.conversions).label('conversions'),
+        func.sum(DailyRollup.revenue).label('revenue'),
+        func.sum(DailyRollup.commission).label('commission'),
+        func.sum(DailyRollup.upvotes).label('upvotes'),
+        func.sum(DailyRollup.downvotes).label('downvotes')
+    ).filter(
+        DailyRollup.day >= start_day,
+        DailyRollup.day <= end_day
+    )
+    if list_id:
+        query = query.filter(DailyRollup.list_id == list_id)
+    if product_id:
+        query = query.filter(DailyRollup.product_id == product_id)
+    return query.group_by(DailyRollup.day).order_by(DailyRollup.day).all()
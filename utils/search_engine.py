@@ -0,0 +1,255 @@
+"""
+Full-text search engine
+
+Matches the generated `search_vector` tsvector columns (GIN indexed) on
+lists, products, categories and retailers, and orders results by ts_rank.
+Queries are parsed with websearch_to_tsquery, so every word must match (after
+English stemming, which folds plurals and possessives: "mens coats" matches
+"Best Men's Coat"), and quoted phrases / -exclusions work as users expect.
+
+Fuzzy mode matches names/titles by pg_trgm word similarity instead, which also
+tolerates typos ("mnes caot") and partial words, using the trigram GIN indexes.
+"""
+
+from sqlalchemy import func, union_all, desc, select, literal
+from collections import defaultdict
+from sqlalchemy.orm import joinedload, selectinload, contains_eager
+from models import db, List, Product, Category, Retailer, ProductLink
+
+SEARCH_CONFIG = 'english'
+
+# How much a list's relevance counts when it only matches through one of its
+# products or its category, relative to matching on its own title/description
+PRODUCT_MATCH_WEIGHT = 0.5
+CATEGORY_MATCH_WEIGHT = 0.3
+
+
+def parse_query(text):
+    """Turn raw user input into a tsquery expression"""
+    return func.websearch_to_tsquery(SEARCH_CONFIG, text)
+
+
+def matches(model, tsquery):
+    """`model.search_vector @@ tsquery` - served by the GIN index"""
+    return model.search_vector.op('@@')(tsquery)
+
+
+def relevance(model, tsquery):
+    return func.ts_rank(model.search_vector, tsquery)
+
+
+def search_lists(tsquery, limit=15):
+    """
+    Approved lists matching the query directly, through a product, or through
+    their category - ranked by the best of those relevance scores, then by
+    popularity (views + votes).
+    """
+    approved = List.status == 'approved'
+
+    direct = db.session.query(
+        List.id.label('list_id'),
+        relevance(List, tsquery).label('relevance')
+    ).filter(approved, matches(List, tsquery))
+
+    via_products = db.session.query(
+        Product.list_id.label('list_id'),
+        (func.max(relevance(Product, tsquery)) * PRODUCT_MATCH_WEIGHT).label('relevance')
+    ).join(
+        List, Product.list_id == List.id
+    ).filter(approved, matches(Product, tsquery)).group_by(Product.list_id)
+
+    via_category = db.session.query(
+        List.id.label('list_id'),
+        (relevance(Category, tsquery) * CATEGORY_MATCH_WEIGHT).label('relevance')
+    ).join(
+        Category, List.category_id == Category.id
+    ).filter(approved, matches(Category, tsquery))
+
+    candidates = union_all(direct, via_products, via_category).subquery()
+    scored = db.session.query(
+        candidates.c.list_id,
+        func.max(candidates.c.relevance).label('relevance')
+    ).group_by(candidates.c.list_id).subquery()
+
+    popularity = func.coalesce(List.view_count, 0) + func.coalesce(List.total_votes, 0)
+
+    return List.query.options(
+        selectinload(List.products)  # to_dict() reports product_count
+    ).join(
+        scored, scored.c.list_id == List.id
+    ).order_by(
+        desc(scored.c.relevance), desc(popularity)
+    ).limit(limit).all()
+
+
+def search_products(tsquery, limit=10):
+    """Products from approved lists, best matches first, with display relations loaded"""
+    return Product.query.join(
+        List, Product.list_id == List.id
+    ).options(
+        contains_eager(Product.list),
+        joinedload(Product.retailer),
+        joinedload(Product.brand),
+        selectinload(Product.product_links).joinedload(ProductLink.retailer)
+    ).filter(
+        List.status == 'approved',
+        matches(Product, tsquery)
+    ).order_by(
+        desc(relevance(Product, tsquery))
+    ).limit(limit).all()
+
+
+def search_categories(tsquery, limit=10):
+    """Categories matching the query, best matches first"""
+    return Category.query.filter(
+        matches(Category, tsquery)
+    ).order_by(
+        desc(relevance(Category, tsquery))
+    ).limit(limit).all()
+
+
+def search_retailers(tsquery, limit=10):
+    """Active retailers matching the query, best matches first"""
+    return Retailer.query.filter(
+        Retailer.is_active == True,
+        matches(Retailer, tsquery)
+    ).order_by(
+        desc(relevance(Retailer, tsquery))
+    ).limit(limit).all()
+
+
+def retailer_products(retailer_ids, per_retailer=10):
+    """
+    Up to `per_retailer` products from approved lists linked to each retailer,
+    best ranked first, in one windowed query (ROW_NUMBER per retailer).
+
+    Returns {retailer_id: [Product, ...]} with list, retailer, brand and
+    product links already loaded, so serializing them issues no more queries.
+    """
+    if not retailer_ids:
+        return {}
+
+    # One row per (retailer, product) even if a product has several links there
+    pairs = db.session.query(
+        ProductLink.retailer_id, ProductLink.product_id
+    ).filter(
+        ProductLink.retailer_id.in_(retailer_ids)
+    ).distinct().subquery()
+
+    ranked = db.session.query(
+        pairs.c.retailer_id,
+        pairs.c.product_id,
+        func.row_number().over(
+            partition_by=pairs.c.retailer_id,
+            order_by=(Product.rank.asc().nulls_last(), Product.id)
+        ).label('position')
+    ).join(
+        Product, Product.id == pairs.c.product_id
+    ).join(
+        List, Product.list_id == List.id
+    ).filter(
+        List.status == 'approved'  # Only products from approved lists
+    ).subquery()
+
+    rows = db.session.query(Product, ranked.c.retailer_id).join(
+        ranked, ranked.c.product_id == Product.id
+    ).join(
+        List, Product.list_id == List.id
+    ).options(
+        contains_eager(Product.list),
+        joinedload(Product.retailer),
+        joinedload(Product.brand),
+        selectinload(Product.product_links).joinedload(ProductLink.retailer)
+    ).filter(
+        ranked.c.position <= per_retailer
+    ).order_by(
+        ranked.c.retailer_id, ranked.c.position
+    ).all()
+
+    products_by_retailer = defaultdict(list)
+    for product, retailer_id in rows:
+        products_by_retailer[retailer_id].append(product)
+    return products_by_retailer
+
+
+def category_list_counts(categories):
+    """Approved list counts for the given categories, keyed as Category.to_dict expects"""
+    if not categories:
+        return {}
+    counts = db.session.query(
+        List.category_id, func.count(List.id)
+    ).filter(
+        List.category_id.in_([cat.id for cat in categories]),
+        List.status == 'approved'
+    ).group_by(List.category_id).all()
+    return {str(category_id): count for category_id, count in counts}
+
+
+def use_fuzzy_threshold(threshold):
+    """
+    Set pg_trgm.word_similarity_threshold for the current transaction.
+
+    The `<%` operator compares against this setting, which is what lets the
+    trigram GIN index answer the lookup.
+    """
+    db.session.execute(
+        select(func.set_config('pg_trgm.word_similarity_threshold', str(threshold), True))
+    )
+
+
+def fuzzy_matches(column, text):
+    """`text <% column` - true when text is similar to some part of column"""
+    return literal(text).op('<%')(column)
+
+
+def fuzzy_relevance(column, text):
+    return func.word_similarity(text, column)
+
+
+def fuzzy_search_lists(text, limit=15):
+    """Approved lists whose title is similar to the text, closest first"""
+    return List.query.options(
+        selectinload(List.products)  # to_dict() reports product_count
+    ).filter(
+        List.status == 'approved',
+        fuzzy_matches(List.title, text)
+    ).order_by(
+        desc(fuzzy_relevance(List.title, text)),
+        desc(func.coalesce(List.view_count, 0) + func.coalesce(List.total_votes, 0))
+    ).limit(limit).all()
+
+
+def fuzzy_search_products(text, limit=10):
+    """Products from approved lists whose name is similar to the text"""
+    return Product.query.join(
+        List, Product.list_id == List.id
+    ).options(
+        contains_eager(Product.list),
+        joinedload(Product.retailer),
+        joinedload(Product.brand),
+        selectinload(Product.product_links).joinedload(ProductLink.retailer)
+    ).filter(
+        List.status == 'approved',
+        fuzzy_matches(Product.name, text)
+    ).order_by(
+        desc(fuzzy_relevance(Product.name, text))
+    ).limit(limit).all()
+
+
+def fuzzy_search_categories(text, limit=10):
+    """Categories whose name is similar to the text (small table, no index needed)"""
+    return Category.query.filter(
+        fuzzy_matches(Category.name, text)
+    ).order_by(
+        desc(fuzzy_relevance(Category.name, text))
+    ).limit(limit).all()
+
+
+def fuzzy_search_retailers(text, limit=10):
+    """Active retailers whose name is similar to the text"""
+    return Retailer.query.filter(
+        Retailer.is_active == True,
+        fuzzy_matches(Retailer.name, text)
+    ).order_by(
+        desc(fuzzy_relevance(Retailer.name, text))
+    ).limit(limit).all()
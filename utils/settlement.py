@@ -0,0 +1,155 @@
+"""
+Payout settlement
+
+Marking conversions paid used to load every payout and its user and add the
+amounts to the balances in Python, one conversion per call.
+transition_conversions() moves any number of conversions (by id or by network
+external_id) to approved, paid or cancelled, with the cascading payout status
+changes, in one transaction and a handful of statements. Paying a batch is:
+
+1. SELECT ... FOR UPDATE of the conversions, checked against TRANSITIONS
+   (a cancelled conversion can't be paid)
+2. UPDATE conversions SET status = 'paid' for the allowed ones
+3. UPDATE payouts ... RETURNING moving their payouts pending -> processing ->
+   paid, recorded in the balance ledger (utils/ledger.py: one ledger INSERT,
+   one user_balances upsert)
+4. one UPDATE users ... FROM (VALUES ...) adding the paid amounts, summed per
+   user and payout type, to cashback_balance / total_payout
+
+Only payouts still 'processing' are paid and conversions already paid are
+left unchanged, so paying a conversion twice (or concurrently) never credits
+a balance twice.
+"""
+
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import update, values, column, func, or_, and_, Numeric
+from sqlalchemy.dialects.postgresql import UUID
+from models import db, Conversion, User
+from utils.ledger import move_payouts
+
+
+def credit_payouts(conversion_ids, now):
+    """
+    Pay the conversions' 'processing' payouts and add the amounts to their
+    users' balances. Returns {user_id: {'payouts', 'cashback', 'creator'}}
+    for the users credited. Does not commit.
+    """
+    credited = {}
+    for payout in move_payouts(conversion_ids, 'processing', 'paid', paid_at=now):
+        totals = credited.setdefault(
+            payout.user_id, {'payouts': 0, 'cashback': Decimal('0'), 'creator': Decimal('0')}
+        )
+        totals['payouts'] += 1
+        if payout.payout_type in ('cashback', 'creator'):
+            totals[payout.payout_type] += payout.amount
+    if not credited:
+        return credited
+
+    amounts = values(
+        column('user_id', UUID(as_uuid=True)),
+        column('cashback', Numeric(12, 2)),
+        column('creator', Numeric(12, 2)),
+        name='credited'
+    ).data([(user_id, totals['cashback'], totals['creator']) for user_id, totals in credited.items()])
+    db.session.execute(
+        update(User)
+        .where(User.id == amounts.c.user_id)
+        .values(
+            cashback_balance=func.coalesce(User.cashback_balance, 0) + amounts.c.cashback,
+            total_payout=func.coalesce(User.total_payout, 0) + amounts.c.creator
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return credited
+
+
+def _totals(credited):
+    return {
+        'payouts': sum(totals['payouts'] for totals in credited.values()),
+        'users': len(credited),
+        'cashback': sum((totals['cashback'] for totals in credited.values()), Decimal('0')),
+        'creator': sum((totals['creator'] for totals in credited.values()), Decimal('0'))
+    }
+
+
+# Target status -> statuses a conversion may move to it from
+TRANSITIONS = {
+    'approved': {'pending'},
+    'paid': {'pending', 'approved'},
+    'cancelled': {'pending', 'approved'}
+}
+
+
+def transition_conversions(target, conversion_ids=(), network=None, external_ids=()):
+    """
+    Move conversions, given by id and/or by the network's external_id, to
+    `target` and cascade to their payouts. Commits.
+
+    - approved: pending payouts become processing
+    - paid: pending payouts become processing, then every processing payout
+      is paid and credited to its user
+    - cancelled: pending and processing payouts become failed
+
+    Returns the ids moved ('transitioned'), the ids already at the target
+    ('unchanged'), the ids whose status doesn't allow the move ('invalid'),
+    the requested ids/external_ids that don't exist ('not_found'), and the
+    number of payouts changed ('payouts') with the amounts credited.
+    """
+    conversion_ids = set(conversion_ids)
+    external_ids = set(external_ids)
+    conditions = []
+    if conversion_ids:
+        conditions.append(Conversion.id.in_(conversion_ids))
+    if network and external_ids:
+        conditions.append(and_(Conversion.network == network, Conversion.external_id.in_(external_ids)))
+    if not conditions:
+        raise ValueError('No conversions given')
+
+    # Lock the rows so concurrent transitions of the same conversions serialize
+    found = db.session.query(
+        Conversion.id, Conversion.external_id, Conversion.network, Conversion.status
+    ).filter(or_(*conditions)).with_for_update().all()
+
+    allowed = TRANSITIONS[target]
+    outcome = {'transitioned': [], 'unchanged': [], 'invalid': []}
+    for conversion in found:
+        if conversion.status == target:
+            outcome['unchanged'].append(conversion.id)
+        elif (conversion.status or 'pending') in allowed:
+            outcome['transitioned'].append(conversion.id)
+        else:
+            outcome['invalid'].append(conversion.id)
+
+    found_external = {conversion.external_id for conversion in found if conversion.network == network}
+    outcome['not_found'] = (
+        [str(conversion_id) for conversion_id in conversion_ids - {conversion.id for conversion in found}] +
+        [external_id for external_id in external_ids - found_external]
+    )
+
+    moving = outcome['transitioned']
+    now = datetime.utcnow()
+    payouts = {'payouts': 0, 'users': 0, 'cashback': Decimal('0'), 'creator': Decimal('0')}
+    if moving:
+        changes = {'status': target}
+        if target == 'approved':
+            changes['approved_at'] = now
+        elif target == 'paid':
+            changes['approved_at'] = func.coalesce(Conversion.approved_at, now)
+            changes['paid_at'] = now
+        db.session.execute(
+            update(Conversion).where(Conversion.id.in_(moving)).values(**changes)
+            .execution_options(synchronize_session=False)
+        )
+
+        if target in ('approved', 'paid'):
+            payouts['payouts'] = len(move_payouts(moving, 'pending', 'processing'))
+        if target == 'paid':
+            payouts = _totals(credit_payouts(moving, now))
+        elif target == 'cancelled':
+            payouts['payouts'] = sum(
+                len(move_payouts(moving, status, 'failed')) for status in ('pending', 'processing')
+            )
+
+    db.session.commit()
+    return {**outcome, **payouts}
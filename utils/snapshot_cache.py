@@ -0,0 +1,106 @@
+"""
+Stale-while-revalidate snapshot cache
+
+Holds the last computed payload of an expensive builder function (e.g. the
+admin dashboard). Within <PREFIX>_TTL_SECONDS the snapshot is served as is.
+After that it is still served immediately while one background thread
+rebuilds it, for up to <PREFIX>_MAX_STALE_SECONDS more; beyond that (or when
+there is no snapshot yet) the caller rebuilds it inline.
+
+Builds are single-flight: concurrent callers never compute the payload twice
+at the same time - they wait for the build in progress and reuse its result.
+The snapshot lives in process memory, so each worker keeps its own.
+"""
+
+import threading
+import time
+
+
+class SnapshotCache:
+    """Single-flight, stale-while-revalidate cache for one computed payload"""
+
+    def __init__(self, name, build, config_prefix, app=None):
+        self.name = name
+        self.build = build
+        self.config_prefix = config_prefix
+        self.app = None
+        self.ttl = 0.0
+        self.max_stale = 0.0
+        self._snapshot = None  # (payload, built_at monotonic)
+        self._build_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._refreshing = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.ttl = float(app.config.get(f'{self.config_prefix}_TTL_SECONDS', 0) or 0)
+        self.max_stale = float(app.config.get(f'{self.config_prefix}_MAX_STALE_SECONDS', 0) or 0)
+        app.extensions[f'{self.name}_snapshot'] = self
+
+    @property
+    def enabled(self):
+        """A TTL of 0 disables caching; every call builds a fresh payload"""
+        return self.ttl > 0
+
+    def get(self, force=False):
+        """
+        Return (payload, age_seconds).
+
+        force=True skips the cached snapshot and rebuilds inline (still
+        single-flight).
+        """
+        if not self.enabled:
+            return self.build(), 0.0
+
+        snapshot = self._snapshot
+        if snapshot is not None and not force:
+            age = time.monotonic() - snapshot[1]
+            if age <= self.ttl:
+                return snapshot[0], age
+            if age <= self.ttl + self.max_stale:
+                self._refresh_in_background()
+                return snapshot[0], age
+
+        return self._build_inline()
+
+    def _build_inline(self):
+        waiting_since = time.monotonic()
+        with self._build_lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot[1] >= waiting_since:
+                # Another caller built it while we waited for the lock
+                return snapshot[0], time.monotonic() - snapshot[1]
+            payload = self.build()
+            self._snapshot = (payload, time.monotonic())
+            return payload, 0.0
+
+    def _refresh_in_background(self):
+        with self._state_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(
+            target=self._background_refresh, name=f'{self.name}-snapshot-refresh', daemon=True
+        ).start()
+
+    def _background_refresh(self):
+        try:
+            with self.app.app_context():
+                with self._build_lock:
+                    snapshot = self._snapshot
+                    if snapshot is not None and time.monotonic() - snapshot[1] <= self.ttl:
+                        return  # Rebuilt inline while this thread was starting
+                    payload = self.build()
+                    self._snapshot = (payload, time.monotonic())
+        except Exception as e:
+            # Keep serving the stale snapshot; the next request retries
+            print(f"Error refreshing {self.name} snapshot: {e}")
+        finally:
+            with self._state_lock:
+                self._refreshing = False
+
+    def invalidate(self):
+        """Drop the snapshot so the next call rebuilds it inline"""
+        self._snapshot = None
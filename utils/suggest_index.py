@@ -0,0 +1,167 @@
+"""
+In-memory prefix index for search-as-you-type suggestions
+
+Approved list titles, category names and active retailer names are kept in a
+sorted array of normalized keys - one key per word position, so "coa" finds
+"Best Men's Coats" as well as "Coats & Jackets". A lookup is a bisect plus a
+short scan; no database access.
+
+The index is built on first use and updated in place when lists are approved,
+rejected or edited and when retailers are created. Each process keeps its own
+copy, so it is also rebuilt once it is older than SUGGEST_INDEX_MAX_AGE_SECONDS
+to pick up changes made by other workers.
+"""
+
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from models import db, List, Category, Retailer
+
+KINDS = ('lists', 'categories', 'retailers')
+
+# Upper bound on keys examined per lookup, so one-letter prefixes stay cheap
+MAX_SCAN = 500
+
+
+def normalize(text):
+    """Lowercase, drop apostrophes ("men's" -> "mens") and collapse punctuation to spaces"""
+    text = (text or '').lower().replace("'", '').replace('’', '')
+    return ' '.join(re.split(r'[^a-z0-9]+', text)).strip()
+
+
+def _keys_for(label):
+    """Every word-suffix of the normalized label: 'best mens coats', 'mens coats', 'coats'"""
+    words = normalize(label).split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+class SuggestIndex:
+    """Sorted-array prefix index over list titles, category names and retailer names"""
+
+    def __init__(self, app=None):
+        self.max_age = 0
+        self._entries = {}  # (kind, id) -> suggestion dict
+        self._keys = []     # sorted (key, kind, id)
+        self._built_at = None
+        self._lock = threading.RLock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_age = float(app.config.get('SUGGEST_INDEX_MAX_AGE_SECONDS', 0) or 0)
+        app.extensions['suggest_index'] = self
+
+    @property
+    def is_stale(self):
+        if self._built_at is None:
+            return True
+        return bool(self.max_age) and time.monotonic() - self._built_at > self.max_age
+
+    def rebuild(self):
+        """Load every suggestible row (three narrow queries) and swap the index in"""
+        entries = {}
+        for list_id, title, slug, view_count, total_votes in db.session.query(
+            List.id, List.title, List.slug, List.view_count, List.total_votes
+        ).filter(List.status == 'approved'):
+            entries[('lists', str(list_id))] = self._suggestion(
+                list_id, title, slug, (view_count or 0) + (total_votes or 0)
+            )
+        for category_id, name, slug in db.session.query(Category.id, Category.name, Category.slug):
+            entries[('categories', str(category_id))] = self._suggestion(category_id, name, slug)
+        for retailer_id, name, slug in db.session.query(
+            Retailer.id, Retailer.name, Retailer.slug
+        ).filter(Retailer.is_active == True):
+            entries[('retailers', str(retailer_id))] = self._suggestion(retailer_id, name, slug)
+
+        keys = sorted(
+            (key, kind, entity_id)
+            for (kind, entity_id), suggestion in entries.items()
+            for key in _keys_for(suggestion['label'])
+        )
+        with self._lock:
+            self._entries = entries
+            self._keys = keys
+            self._built_at = time.monotonic()
+        return len(entries)
+
+    @staticmethod
+    def _suggestion(entity_id, label, slug, weight=0):
+        return {'id': str(entity_id), 'label': label, 'slug': slug, 'weight': weight}
+
+    def _add(self, kind, entity_id, label, slug, weight=0):
+        if self._built_at is None:
+            return  # Not built yet; the first lookup loads everything
+        entity_id = str(entity_id)
+        with self._lock:
+            self._remove(kind, entity_id)
+            self._entries[(kind, entity_id)] = self._suggestion(entity_id, label, slug, weight)
+            for key in _keys_for(label):
+                insort(self._keys, (key, kind, entity_id))
+
+    def _remove(self, kind, entity_id):
+        entity_id = str(entity_id)
+        with self._lock:
+            suggestion = self._entries.pop((kind, entity_id), None)
+            if suggestion is None:
+                return
+            for key in _keys_for(suggestion['label']):
+                position = bisect_left(self._keys, (key, kind, entity_id))
+                if position < len(self._keys) and self._keys[position] == (key, kind, entity_id):
+                    del self._keys[position]
+
+    def sync_list(self, lst):
+        """Add an approved list (or refresh its title), or drop it if no longer approved"""
+        if lst.status == 'approved':
+            self._add('lists', lst.id, lst.title, lst.slug, (lst.view_count or 0) + (lst.total_votes or 0))
+        else:
+            self._remove('lists', lst.id)
+
+    def sync_retailer(self, retailer):
+        if retailer.is_active:
+            self._add('retailers', retailer.id, retailer.name, retailer.slug)
+        else:
+            self._remove('retailers', retailer.id)
+
+    def suggest(self, prefix, limit=5):
+        """
+        Suggestions whose title/name has a word starting with `prefix`.
+
+        Returns {'lists': [...], 'categories': [...], 'retailers': [...]}, each
+        ordered by whether the label itself starts with the prefix, then by
+        weight (list popularity), then alphabetically.
+        """
+        prefix = normalize(prefix)
+        results = {kind: [] for kind in KINDS}
+        if not prefix:
+            return results
+        if self.is_stale:
+            self.rebuild()
+
+        with self._lock:
+            matches = {}
+            position = bisect_left(self._keys, (prefix,))
+            for key, kind, entity_id in self._keys[position:position + MAX_SCAN]:
+                if not key.startswith(prefix):
+                    break
+                suggestion = self._entries[(kind, entity_id)]
+                starts_label = normalize(suggestion['label']) == key
+                previous = matches.get((kind, entity_id))
+                if previous is None or (starts_label and not previous[0]):
+                    matches[(kind, entity_id)] = (starts_label, suggestion)
+
+        ranked = sorted(
+            matches.items(),
+            key=lambda item: (not item[1][0], -item[1][1]['weight'], item[1][1]['label'].lower())
+        )
+        for (kind, _), (_, suggestion) in ranked:
+            if len(results[kind]) < limit:
+                results[kind].append({
+                    'id': suggestion['id'],
+                    'label': suggestion['label'],
+                    'slug': suggestion['slug']
+                })
+        return results
+
+
+suggest_index = SuggestIndex()
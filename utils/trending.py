@@ -0,0 +1,150 @@
+"""
+Trending list snapshot
+
+Trending is scored from recent vote activity with exponential time decay: a
+vote cast one half-life ago counts half as much as a vote cast now. The
+snapshot (with each list's top 4 products already serialized) is rebuilt by
+refresh_trending(), so GET /lists/trending is a single indexed read.
+
+Rebuilds are serialized with a Postgres advisory lock: a reader that finds the
+snapshot stale only rebuilds if no other rebuild is running, and otherwise
+serves the rows it has. The time of the last rebuild is kept in
+trending_refreshes, so an empty snapshot (no approved lists) still counts as
+fresh.
+"""
+
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, desc, literal, select
+from sqlalchemy.orm import joinedload
+from models import db, List, Product, ProductLink, Vote, TrendingList, TrendingRefresh
+import json
+import math
+
+# Votes older than this many half-lives contribute < 0.1% and are ignored
+DECAY_HORIZON_HALF_LIVES = 10
+
+# pg_advisory_xact_lock key serializing snapshot rebuilds
+REBUILD_LOCK_KEY = 7316001
+
+
+def _decayed_scores_subquery(half_life_hours, now):
+    """Sum of exp(-ln2 * age / half_life) over each list's recent votes"""
+    age_hours = func.extract('epoch', literal(now) - Vote.created_at) / 3600.0
+    weight = func.exp(-math.log(2) * age_hours / half_life_hours)
+    horizon = now - timedelta(hours=half_life_hours * DECAY_HORIZON_HALF_LIVES)
+
+    return db.session.query(
+        Vote.list_id.label('list_id'),
+        func.sum(weight).label('score')
+    ).filter(
+        Vote.created_at >= horizon  # Uses the votes.created_at index
+    ).group_by(Vote.list_id).subquery()
+
+
+def serialize_trending_list(lst):
+    """Serialize a list with category, creator and its top 4 ranked products"""
+    list_dict = lst.to_dict()
+    if lst.category:
+        list_dict['category'] = lst.category.to_dict()
+    if lst.creator:
+        list_dict['creator'] = lst.creator.to_dict()
+
+    # Products are already ordered by rank due to the relationship definition
+    top_products = []
+    for product in lst.products:
+        if product.rank and product.rank <= 4:
+            product_dict = product.to_dict()
+            # Add retailer from first product link if available
+            if product.product_links and product.product_links[0].retailer:
+                product_dict['retailer'] = product.product_links[0].retailer.to_dict()
+            top_products.append(product_dict)
+            if len(top_products) >= 4:
+                break
+
+    list_dict['top_products'] = top_products
+    return list_dict
+
+
+def last_refreshed_at():
+    """When the snapshot was last rebuilt, or None if it never was"""
+    return db.session.query(TrendingRefresh.refreshed_at).filter(TrendingRefresh.id == 1).scalar()
+
+
+def _lock_rebuild(wait):
+    """Take the rebuild lock for this transaction; False if wait is off and another rebuild holds it"""
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return True
+    if wait:
+        db.session.execute(select(func.pg_advisory_xact_lock(REBUILD_LOCK_KEY)))
+        return True
+    return bool(db.session.execute(select(func.pg_try_advisory_xact_lock(REBUILD_LOCK_KEY))).scalar())
+
+
+def refresh_trending(half_life_hours=None, limit=None, wait=True, max_age=None):
+    """
+    Rebuild the trending_lists snapshot.
+
+    Approved lists are ordered by decayed vote score; lists with no recent
+    votes fall back to all-time total_votes so the snapshot is always full.
+    The old snapshot is replaced in the same transaction, so readers never
+    see a partial one.
+
+    With wait=False, returns None at once if another rebuild is running.
+    With max_age (a timedelta), returns None without rebuilding if the
+    snapshot was rebuilt more recently than that by the time the lock is
+    held. Otherwise returns the number of lists in the new snapshot.
+    """
+    half_life_hours = half_life_hours or current_app.config.get('TRENDING_HALF_LIFE_HOURS', 24)
+    limit = limit or current_app.config.get('TRENDING_LIST_LIMIT', 10)
+
+    if not _lock_rebuild(wait):
+        db.session.rollback()
+        return None
+    now = datetime.utcnow()
+    if max_age is not None:
+        refreshed_at = last_refreshed_at()
+        if refreshed_at and now - refreshed_at <= max_age:
+            db.session.rollback()
+            return None
+
+    scores = _decayed_scores_subquery(half_life_hours, now)
+    score = func.coalesce(scores.c.score, 0)
+
+    ranked = db.session.query(
+        List.id, score.label('score')
+    ).outerjoin(
+        scores, scores.c.list_id == List.id
+    ).filter(
+        List.status == 'approved'
+    ).order_by(
+        desc('score'), desc(List.total_votes)
+    ).limit(limit).all()
+
+    score_by_id = {list_id: float(list_score) for list_id, list_score in ranked}
+
+    lists = List.query.options(
+        joinedload(List.category),
+        joinedload(List.creator),
+        joinedload(List.products).joinedload(Product.brand),
+        joinedload(List.products).joinedload(Product.retailer),
+        joinedload(List.products).joinedload(Product.product_links).joinedload(ProductLink.retailer)
+    ).filter(List.id.in_(score_by_id.keys())).all() if score_by_id else []
+    lists_by_id = {lst.id: lst for lst in lists}
+
+    TrendingList.query.delete(synchronize_session=False)
+    for position, (list_id, list_score) in enumerate(ranked, start=1):
+        lst = lists_by_id.get(list_id)
+        if not lst:
+            continue
+        db.session.add(TrendingList(
+            list_id=list_id,
+            position=position,
+            score=score_by_id[list_id],
+            payload=json.dumps(serialize_trending_list(lst)),
+            refreshed_at=now
+        ))
+    db.session.merge(TrendingRefresh(id=1, refreshed_at=now, list_count=len(lists_by_id)))
+
+    db.session.commit()
+    return len(lists_by_id)
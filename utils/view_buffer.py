@@ -0,0 +1,154 @@
+"""
+Buffered list view counting
+
+GET /lists/<list_id> records views here. With VIEW_COUNT_FLUSH_SECONDS > 0,
+per-list deltas accumulate in memory and are written in one batched UPDATE
+every VIEW_COUNT_FLUSH_SECONDS, or sooner once VIEW_COUNT_FLUSH_EVENTS views
+are pending. Anything still buffered is flushed at interpreter exit; a list
+whose deltas fail to flush VIEW_COUNT_FLUSH_MAX_RETRIES times is dropped.
+
+Buffering is opt-in: the default interval of 0 writes every view through,
+which is the only safe setting on serverless hosts (Vercel) where instances
+are frozen or recycled without running the flusher thread or the exit flush.
+"""
+
+import atexit
+import threading
+from collections import Counter
+from sqlalchemy import update, values, column, func, Integer
+from sqlalchemy.dialects.postgresql import UUID
+from models import db, List
+from utils.counters import increment_counters
+
+
+class ViewCountBuffer:
+    """In-process accumulator for list view counts"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.interval = 0.0
+        self.max_events = 0
+        self.max_retries = 0
+        self._pending = Counter()
+        self._attempts = {}
+        self._pending_events = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read flush thresholds from config and register shutdown flush"""
+        self.app = app
+        self.interval = float(app.config.get('VIEW_COUNT_FLUSH_SECONDS', 0) or 0)
+        self.max_events = int(app.config.get('VIEW_COUNT_FLUSH_EVENTS', 0) or 0)
+        self.max_retries = int(app.config.get('VIEW_COUNT_FLUSH_MAX_RETRIES', 3) or 0)
+        app.extensions['view_buffer'] = self
+        atexit.register(self._flush_in_context)
+
+    @property
+    def is_buffered(self):
+        """A flush interval of 0 disables buffering and writes every view through"""
+        return self.interval > 0
+
+    def record(self, list_id):
+        """
+        Count one view of a list and return its view count including it.
+
+        Write-through returns the value from the UPDATE ... RETURNING (None
+        for an unknown list). Buffered reads the stored count plus the views
+        still pending; a flush landing in between can skew that by the
+        flushed delta until the next read.
+        """
+        if not self.is_buffered:
+            new_values = increment_counters(List, list_id, view_count=1)
+            db.session.commit()
+            return new_values['view_count'] if new_values else None
+
+        with self._lock:
+            self._pending[list_id] += 1
+            self._pending_events += 1
+            pending = self._pending[list_id]
+            self._ensure_worker()
+            threshold_reached = self.max_events and self._pending_events >= self.max_events
+        if threshold_reached:
+            self._wakeup.set()
+
+        stored = db.session.query(List.view_count).filter(List.id == list_id).scalar()
+        return (stored or 0) + pending
+
+    def flush(self):
+        """
+        Write all pending deltas in one UPDATE ... FROM (VALUES ...) statement.
+
+        Must be called inside an app context. On failure the deltas are put
+        back for the next flush, up to max_retries times per list.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._pending_events = 0
+        if not pending:
+            return 0
+
+        deltas = values(
+            column('list_id', UUID(as_uuid=True)),
+            column('delta', Integer),
+            name='view_deltas'
+        ).data(list(pending.items()))
+
+        try:
+            db.session.execute(
+                update(List)
+                .where(List.id == deltas.c.list_id)
+                .values(view_count=func.coalesce(List.view_count, 0) + deltas.c.delta)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            dropped = {}
+            with self._lock:
+                for list_id, delta in pending.items():
+                    attempts = self._attempts.get(list_id, 0) + 1
+                    if attempts > self.max_retries:
+                        self._attempts.pop(list_id, None)
+                        dropped[list_id] = delta
+                    else:
+                        self._attempts[list_id] = attempts
+                        self._pending[list_id] += delta
+                        self._pending_events += delta
+            print(f"Error flushing view counts: {e}")
+            if dropped:
+                lost = ', '.join(f'{list_id}: {delta}' for list_id, delta in dropped.items())
+                print(f"Dropped view counts after {self.max_retries} retries: {lost}")
+            return 0
+
+        with self._lock:
+            for list_id in pending:
+                self._attempts.pop(list_id, None)
+        return len(pending)
+
+    def _ensure_worker(self):
+        # Caller holds self._lock
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(
+                target=self._run, name='view-count-flusher', daemon=True
+            )
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            # Wake on the interval, or early when the event threshold is hit
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self._flush_in_context()
+
+    def _flush_in_context(self):
+        if self.app is None:
+            return
+        with self.app.app_context():
+            self.flush()
+
+
+view_buffer = ViewCountBuffer()